@@ -0,0 +1,81 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所を取得 (src/01_baseline_phase1/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/01... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.epoch_dataset import build_epoch_table
+from common.geo import get_transformer
+from common.gnss_log import find_logs, read_log_tables
+from common.height_pyramid import open_height_raster
+from common.skyline import horizon_profiles
+
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+SITE_RISK_FILE = PROJECT_ROOT / 'data' / 'processed' / 'sites_risk.csv'
+RASTER_DIR = PROJECT_ROOT / 'data_qgis' / 'processed'
+HEIGHT_RES_M = 5.0      # bld_height_pyramid.tif のページ (無ければ bld_height_5m.tif)
+DERIVED_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline'
+OUTPUT_FILE = DERIVED_DIR / 'epoch_dataset.parquet'
+
+
+def load_site_horizons():
+    """site_id -> 水平線プロファイル (NLoS 率の計算用)。ラスタが無ければ空"""
+    height = open_height_raster(RASTER_DIR, HEIGHT_RES_M)
+    if not SITE_RISK_FILE.exists() or height is None:
+        return {}
+    df = pd.read_csv(SITE_RISK_FILE)
+    df['site_id'] = df['site_id'].astype(str).str.strip()
+    profiles = horizon_profiles(df['center_x_6677'].values, df['center_y_6677'].values, height)
+    return dict(zip(df['site_id'], profiles))
+
+
+def main():
+    print("--- Epoch Dataset Builder ---")
+    print(f"▶ Input Logs : {LOG_DIR}")
+    print(f"▶ Output     : {OUTPUT_FILE}")
+
+    log_files = find_logs(LOG_DIR)
+    if not log_files:
+        print(f"Error: no logs in {LOG_DIR}")
+        return
+
+    transformer = get_transformer()
+    horizons = load_site_horizons()
+    if not horizons:
+        print("[!] sites_risk.csv / 5 m の建物高さラスタが無いため nlos_frac は NaN になります。")
+
+    tables = []
+    for filepath in log_files:
+        site_id = os.path.basename(filepath).split('_')[0]
+        try:
+            df_fix, df_status = read_log_tables(filepath)
+        except ValueError as e:
+            print(f"Skipped {site_id}: {e}")
+            continue
+        tables.append(build_epoch_table(df_fix, df_status, site_id, transformer, horizons.get(site_id)))
+        print(f"Processed {site_id}: {len(tables[-1])} epochs")
+
+    if not tables:
+        print("No epochs.")
+        return
+
+    df = pd.concat(tables, ignore_index=True)
+    df['site_id'] = df['site_id'].astype('category')
+    DERIVED_DIR.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(OUTPUT_FILE, index=False)
+    print(f"\nCompleted. {len(df)} epochs × {df.shape[1]} columns "
+          f"({df.memory_usage(deep=True).sum() / 2**20:.1f} MiB in memory) -> {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
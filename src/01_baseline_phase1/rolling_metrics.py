@@ -0,0 +1,75 @@
+import os
+import sys
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所を取得 (src/01_baseline_phase1/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/01... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.epoch_dataset import build_epoch_table
+from common.geo import get_transformer
+from common.gnss_log import find_logs, read_log_tables
+from common.rolling import rolling_table, WINDOW_S
+
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+DERIVED_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline'
+EPOCH_DATASET = DERIVED_DIR / 'epoch_dataset.parquet'
+OUTPUT_DIR = DERIVED_DIR / 'rolling'
+
+
+def iter_site_epochs(args):
+    """(site_id, エポック単位のテーブル) を順に返す"""
+    if args.epoch_dataset:
+        df = pd.read_parquet(args.epoch_dataset)
+        for site_id, g in df.groupby('site_id', observed=True):
+            yield str(site_id), g
+        return
+
+    transformer = get_transformer()
+    for filepath in find_logs(args.log_dir):
+        site_id = os.path.basename(filepath).split('_')[0]
+        try:
+            df_fix, df_status = read_log_tables(filepath)
+        except ValueError as e:
+            print(f"Skipped {site_id}: {e}")
+            continue
+        yield site_id, build_epoch_table(df_fix, df_status, site_id, transformer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sliding-window rolling metrics per site")
+    parser.add_argument('--window', type=float, default=WINDOW_S, help="window length [s]")
+    parser.add_argument('--step', type=float, default=None, help="output interval [s] (default: every epoch)")
+    parser.add_argument('--log-dir', type=Path, default=LOG_DIR)
+    parser.add_argument('--epoch-dataset', type=Path, default=None,
+                        help=f"reuse build_epoch_dataset.py output (e.g. {EPOCH_DATASET.name}) instead of parsing logs")
+    parser.add_argument('--out-dir', type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    print("--- Rolling Metrics ---")
+    print(f"▶ Window     : {args.window:.0f}s" + (f" (every {args.step:.0f}s)" if args.step else ""))
+    print(f"▶ Output Dir : {args.out_dir}")
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    for site_id, df in iter_site_epochs(args):
+        res = rolling_table(df, args.window, step_s=args.step)
+        res.to_csv(args.out_dir / f'{site_id}_rolling.csv')
+        last = res.iloc[-1] if len(res) else None
+        if last is not None:
+            print(f"Processed {site_id}: {len(res)} rows, last err_p95={last['err_h_m_p95']:.2f}m "
+                  f"hdop_p50={last['hdop_p50']:.2f} used_mean={last['n_used_mean']:.1f}")
+
+    print(f"\nCompleted. Results in: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import os
+import sys
 import glob
 import shutil
+import argparse
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
 from datetime import datetime
+from pathlib import Path
 import warnings
 
 # 必須ライブラリチェック
@@ -23,19 +25,22 @@ CURRENT_DIR = Path(__file__).resolve().parent
 
 # 2. プロジェクトのルートディレクトリを特定 (3階層上: src/01... -> src -> Root)
 PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.gnss_log import find_logs, read_log_tables
+from common.status_store import StatusStore
+from common.qc_prescan import QC_MIN_EPOCHS, QC_MIN_DURATION, prescan_log, prescan_failure
+from common.sat_tracks import Cn0Template, TrackIndex, frequency_band, nlos_fraction
+from common.profiling import Profiler
+from common.artifacts import write_artifact
+from common.figures import SPEC_FILE, figures_enabled, roc_curve_spec, roc_figure, scatter_figure, write_specs, start_render
 
 LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
 SITE_RISK_FILE = PROJECT_ROOT / 'data' / 'processed' / 'sites_risk.csv'
 DERIVED_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline'
-DERIVED_DIR.mkdir(parents=True, exist_ok=True)
-
-print(f"▶ Project Root : {PROJECT_ROOT}")
-print(f"▶ Input Logs   : {LOG_DIR}")
-print(f"▶ Output Dir   : {DERIVED_DIR}")
 
-# QC設定
-QC_MIN_EPOCHS = 240
-QC_MIN_DURATION = 240.0
+# ログのパースに使うプロセス数 (None: CPU コア数)
+PARSE_WORKERS = None
 
 # 投影座標系 (ユーザー指定: EPSG:6677)
 PROJ_EPSG = "epsg:6677" 
@@ -52,35 +57,10 @@ def setup_directories():
     return run_dir, latest_dir
 
 def parse_gnss_log(filepath):
-    fix_lines, status_lines = [], []
-    fix_header, status_header = None, None
+    """1つのログ -> (Fix の DataFrame, Status の StatusStore, メッセージ)"""
     try:
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            for line in f:
-                line = line.strip()
-                if line.startswith('# Fix'):
-                    fix_header = line.replace('#', '').strip().split(',')
-                elif line.startswith('# Status'):
-                    status_header = line.replace('#', '').strip().split(',')
-                elif line.startswith('Fix'):
-                    fix_lines.append(line.split(','))
-                elif line.startswith('Status'):
-                    status_lines.append(line.split(','))
-                    
-        if not fix_header or not status_header: return None, None, "Missing Header"
-            
-        df_fix = pd.DataFrame(fix_lines, columns=fix_header)
-        df_status = pd.DataFrame(status_lines, columns=status_header)
-        
-        # 数値変換
-        for df, cols in [
-            (df_fix, ['UnixTimeMillis', 'LatitudeDegrees', 'LongitudeDegrees', 'AccuracyMeters']),
-            (df_status, ['UnixTimeMillis', 'Cn0DbHz', 'ElevationDegrees', 'AzimuthDegrees', 'UsedInFix'])
-        ]:
-            for c in cols:
-                if c in df.columns: df[c] = pd.to_numeric(df[c], errors='coerce')
-        
-        return df_fix, df_status, "OK"
+        df_fix, df_status = read_log_tables(filepath)
+        return df_fix, StatusStore.from_frame(df_status), "OK"
     except Exception as e:
         return None, None, str(e)
 
@@ -96,134 +76,182 @@ def calculate_projected_error(df_fix, transformer):
     dists = np.sqrt((xx - med_x)**2 + (yy - med_y)**2)
     return np.percentile(dists, 50), np.percentile(dists, 95)
 
-def calculate_hdop_from_geometry(az, el):
-    if len(az) < 4: return np.nan
-    az_rad, el_rad = np.radians(az), np.radians(el)
-    G = np.column_stack([-np.cos(el_rad)*np.sin(az_rad), -np.cos(el_rad)*np.cos(az_rad), -np.sin(el_rad), np.ones_like(az_rad)])
-    try:
-        Q = np.linalg.inv(G.T @ G)
-        return np.sqrt(Q[0, 0] + Q[1, 1])
-    except: return np.nan
+def compute_site_metrics(site_id, df_fix, status, transformer, prof=None):
+    """1サイト分の指標 -> (指標の dict, None)。QC で落ちた場合は (None, 理由)。prof があれば段ごとに計測する"""
+    prof = prof or Profiler(None, enabled=False)
+    t_min, t_max = df_fix['UnixTimeMillis'].min(), df_fix['UnixTimeMillis'].max()
+    duration = (t_max - t_min) / 1000.0 if pd.notnull(t_min) else 0
+    n_fix = len(df_fix)
+    
+    if n_fix < QC_MIN_EPOCHS:
+        return None, f"Low Epochs ({n_fix})"
+    if duration < QC_MIN_DURATION:
+        return None, f"Short Duration ({duration:.1f}s)"
+        
+    with prof.stage('projection', site=site_id, items=n_fix):
+        err_p50, err_p95 = calculate_projected_error(df_fix, transformer)
+    
+    # Status Metrics (StatusStore の列から直接)
+    used = status.used
+    if not used.any():
+        return None, "No Used Satellites"
+
+    with prof.stage('status', site=site_id, items=len(status)):
+        n_used = status.per_epoch_sum(used)
+        used_sat_mean = n_used[n_used > 0].mean()
+        cn0_used = pd.Series(status.cn0[used], dtype=float)
+    
+    # HDOP Calculation (全エポックを batched_dop でまとめて計算)
+    hdop_results = {}
+    with prof.stage('dop', site=site_id, items=2 * status.n_epochs):
+        for cut_name, min_el in [('hdop_cut_a', 5), ('hdop_cut_b', 15)]:
+            hdops = status.dop(min_el)['hdop']
+            hdops = hdops[~np.isnan(hdops) & (hdops < 50)]
+            hdop_results[f"{cut_name}_median"] = np.median(hdops) if len(hdops) else np.nan
+
+    return {
+        'site_id': site_id, 'err_p50_m': err_p50, 'err_p95_m': err_p95,
+        'n_fix': n_fix, 'duration': duration, 'used_sat_mean': used_sat_mean,
+        'cn0_mean': cn0_used.mean(), 'cn0_std': cn0_used.std(),
+        'elev_mean': np.nanmean(status.el[used].astype(float)),
+        'used_rate': used.sum()/len(status) if len(status) > 0 else 0,
+        'hdop_cut_a_median': hdop_results['hdop_cut_a_median'],
+        'hdop_cut_b_median': hdop_results['hdop_cut_b_median']
+    }, None
 
 def main():
+    parser = argparse.ArgumentParser(description="Phase 1: サイトごとの誤差・DOP・ROC")
+    parser.add_argument('--no-figures', action='store_true',
+                        help="図を描かない (plots/figures.json だけ書く。あとで render_figures.py で描ける)")
+    args = parser.parse_args()
+
+    print(f"▶ Project Root : {PROJECT_ROOT}")
+    print(f"▶ Input Logs   : {LOG_DIR}")
+    print(f"▶ Output Dir   : {DERIVED_DIR}")
     print("--- Pipeline Started ---")
     run_dir, latest_dir = setup_directories()
+    # 段・サイトごとの時間とメモリ (profile.json)。PNT_PROFILE_SAMPLE=<site,...> でサンプリングも行う
+    prof = Profiler('run_baseline', sample_dir=run_dir)
     
     # 座標変換設定 (x=lon, y=lat)
     transformer = pyproj.Transformer.from_crs("epsg:4326", PROJ_EPSG, always_xy=True)
 
-    log_files = glob.glob(os.path.join(LOG_DIR, '*.txt'))
+    log_files = find_logs(LOG_DIR)  # .txt と圧縮ログ (.txt.gz / .txt.xz / .txt.zst)
     print(f"Found {len(log_files)} logs in {LOG_DIR}")
     
     qc_fails, site_metrics = [], []
+    site_status = {}  # QC を通過したサイトの StatusStore (Cn0 テンプレートは全サイトで作る)
     
+    # 事前走査: 件数・記録時間が足りないログはパースせずに落とす
+    to_parse = []
     for filepath in log_files:
         site_id = os.path.basename(filepath).split('_')[0]
-        df_fix, df_status, msg = parse_gnss_log(filepath)
+        with prof.stage('qc', site=site_id) as rec:
+            scan = prescan_log(filepath)
+            reason = prescan_failure(scan, QC_MIN_EPOCHS, QC_MIN_DURATION)
+            rec['items'] = scan['n_fix'] if scan else None
+        if reason:
+            qc_fails.append({'site_id': site_id, 'reason': reason})
+            print(f"Skipped {site_id}: {reason}")
+            continue
+        to_parse.append(filepath)
+
+    # パースはファイルごとに並列 (PARSE_WORKERS プロセス)
+    parsed = prof.map_logs('parse', parse_gnss_log, to_parse, PARSE_WORKERS,
+                           items_of=lambda res: len(res[1]) if res[1] is not None else None)
+    for filepath, (df_fix, status, msg) in parsed:
+        site_id = os.path.basename(filepath).split('_')[0]
         
         if df_fix is None:
             qc_fails.append({'site_id': site_id, 'reason': f"Parse Error: {msg}"})
             continue
             
-        t_min, t_max = df_fix['UnixTimeMillis'].min(), df_fix['UnixTimeMillis'].max()
-        duration = (t_max - t_min) / 1000.0 if pd.notnull(t_min) else 0
-        n_fix = len(df_fix)
-        
-        if n_fix < QC_MIN_EPOCHS:
-            qc_fails.append({'site_id': site_id, 'reason': f"Low Epochs ({n_fix})"})
+        metrics, reason = compute_site_metrics(site_id, df_fix, status, transformer, prof)
+        if reason:
+            qc_fails.append({'site_id': site_id, 'reason': reason})
             continue
-        if duration < QC_MIN_DURATION:
-            qc_fails.append({'site_id': site_id, 'reason': f"Short Duration ({duration:.1f}s)"})
-            continue
-            
-        err_p50, err_p95 = calculate_projected_error(df_fix, transformer)
-        
-        # Status Metrics
-        df_used = df_status[df_status['UsedInFix'] == 1].copy()
-        if df_used.empty:
-             qc_fails.append({'site_id': site_id, 'reason': "No Used Satellites"})
-             continue
-
-        grp_used = df_used.groupby('UnixTimeMillis')
-        used_sat_mean = grp_used.size().mean()
-        
-        # HDOP Calculation
-        hdop_results = {}
-        for cut_name, min_el in [('hdop_cut_a', 5), ('hdop_cut_b', 15)]:
-            df_cut = df_status[df_status['ElevationDegrees'] >= min_el]
-            hdops = []
-            if not df_cut.empty:
-                for t, g in df_cut.groupby('UnixTimeMillis'):
-                    if 'AzimuthDegrees' in g.columns:
-                        val = calculate_hdop_from_geometry(g['AzimuthDegrees'].values, g['ElevationDegrees'].values)
-                        if not np.isnan(val) and val < 50: hdops.append(val)
-            hdop_results[f"{cut_name}_median"] = np.median(hdops) if hdops else np.nan
-
-        site_metrics.append({
-            'site_id': site_id, 'err_p50_m': err_p50, 'err_p95_m': err_p95,
-            'n_fix': n_fix, 'duration': duration, 'used_sat_mean': used_sat_mean,
-            'cn0_mean': df_used['Cn0DbHz'].mean(), 'cn0_std': df_used['Cn0DbHz'].std(),
-            'elev_mean': df_used['ElevationDegrees'].mean(),
-            'used_rate': len(df_used)/len(df_status) if len(df_status) > 0 else 0,
-            'hdop_cut_a_median': hdop_results['hdop_cut_a_median'],
-            'hdop_cut_b_median': hdop_results['hdop_cut_b_median']
-        })
-        print(f"Processed {site_id}: err95={err_p95:.2f}m")
+        site_metrics.append(metrics)
+        site_status[site_id] = status
+        print(f"Processed {site_id}: err95={metrics['err_p95_m']:.2f}m")
+
+    # Cn0 ベースの NLoS 率 (全サイトの観測から仰角テンプレートを作り、サイトごとに判定)
+    if site_status:
+        stores = list(site_status.values())
+        with prof.stage('cn0_template', items=sum(len(s) for s in stores)):
+            template = Cn0Template.fit(np.concatenate([s.el for s in stores]),
+                                       np.concatenate([s.cn0 for s in stores]),
+                                       np.concatenate([frequency_band(s.carrier_hz) for s in stores]))
+        for m in site_metrics:
+            status = site_status[m['site_id']]
+            with prof.stage('nlos', site=m['site_id'], items=len(status)):
+                tracks = TrackIndex(status)
+                m['n_tracks'] = tracks.n_tracks
+                m['cn0_nlos_frac'] = nlos_fraction(status, template, tracks=tracks)
 
     if qc_fails: pd.DataFrame(qc_fails).to_csv(os.path.join(run_dir, 'qc_fails.csv'), index=False)
     
+    profile_path = os.path.join(run_dir, 'profile.json')
     if not site_metrics:
         print("No sites passed QC.")
+        prof.write(profile_path)
         return
 
     df_metrics = pd.DataFrame(site_metrics)
-    df_metrics.to_csv(os.path.join(run_dir, 'site_metrics_raw.csv'), index=False)
+    # 下流の段は .arrow (型付き) を読む。.csv は確認用
+    write_artifact(df_metrics, Path(run_dir) / 'site_metrics_raw.arrow', 'site_metrics', csv=True)
     
     if not os.path.exists(SITE_RISK_FILE):
         print(f"Warning: {SITE_RISK_FILE} not found. Skipped merge.")
+        prof.write(profile_path)
         return
         
-    df_risk = pd.read_csv(SITE_RISK_FILE)
-    df_risk['site_id'] = df_risk['site_id'].astype(str).str.strip()
-    df_merged = pd.merge(df_metrics, df_risk, on='site_id', how='inner')
+    with prof.stage('merge') as rec:
+        df_risk = pd.read_csv(SITE_RISK_FILE)
+        df_risk['site_id'] = df_risk['site_id'].astype(str).str.strip()
+        df_merged = pd.merge(df_metrics, df_risk, on='site_id', how='inner')
+        rec['items'] = len(df_merged)
     print(f"Merged: {len(df_merged)} sites")
-    df_merged.to_csv(os.path.join(run_dir, 'merged.csv'), index=False)
+    write_artifact(df_merged, Path(run_dir) / 'merged.arrow', 'site_merged', csv=True)
     
     thr = df_merged['err_p95_m'].quantile(HIGH_ERROR_QUANTILE)
     df_merged['high_error'] = (df_merged['err_p95_m'] >= thr).astype(int)
     print(f"High Error Threshold: {thr:.2f}m")
     
-    features = [f for f in ['risk_proxy_5m', 'svf_proxy_5m', 'risk_cut5', 'hdop_cut_a_median', 'hdop_cut_b_median'] if f in df_merged.columns]
+    features = [f for f in ['risk_proxy_5m', 'svf_proxy_5m', 'risk_cut5', 'hdop_cut_a_median', 'hdop_cut_b_median', 'cn0_nlos_frac'] if f in df_merged.columns]
     
-    auc_results = []
-    plt.figure(figsize=(8, 8))
-    for f in features:
-        tmp = df_merged[[f, 'high_error']].dropna()
-        if len(tmp['high_error'].unique()) < 2: continue
-        fpr, tpr, _ = roc_curve(tmp['high_error'], tmp[f])
-        score = auc(fpr, tpr)
-        plt.plot(fpr, tpr, label=f'{f} (AUC={score:.2f})')
-        auc_results.append(f"{f}: {score:.3f}")
-        
-    plt.plot([0,1],[0,1],'k--'); plt.legend(); plt.title('ROC Curves')
-    plt.savefig(os.path.join(run_dir, 'plots', 'roc_curves.png'))
+    auc_results, curves = [], []
+    with prof.stage('roc', items=len(features)):
+        for f in features:
+            tmp = df_merged[[f, 'high_error']].dropna()
+            if len(tmp['high_error'].unique()) < 2: continue
+            fpr, tpr, _ = roc_curve(tmp['high_error'], tmp[f])
+            score = auc(fpr, tpr)
+            curves.append((f, fpr, tpr, score))
+            auc_results.append(f"{f}: {score:.3f}")
     with open(os.path.join(run_dir, 'roc_auc.txt'), 'w') as f: f.write('\n'.join(auc_results))
-    
-    # 簡易散布図
-    if features:
-        plt.figure(figsize=(15, 5))
-        for i, f in enumerate(features[:3]):
-            plt.subplot(1, 3, i+1)
-            plt.scatter(df_merged[f], df_merged['err_p95_m'], alpha=0.6)
-            plt.xlabel(f); plt.ylabel('Error p95 (m)')
-        plt.tight_layout()
-        plt.savefig(os.path.join(run_dir, 'plots', 'scatter_risk_err.png'))
+        
+    # 図は計算済みの曲線から別プロセスで描く (その間に結果を latest にコピーする)
+    plots_dir = os.path.join(run_dir, 'plots')
+    specs = [roc_figure('roc_curves.png', [roc_curve_spec(f'{f} (AUC={score:.2f})', fpr, tpr)
+                                           for f, fpr, tpr, score in curves])]
+    if features:  # 簡易散布図
+        specs.append(scatter_figure('scatter_risk_err.png', [
+            {'x': df_merged[f], 'y': df_merged['err_p95_m'], 'xlabel': f} for f in features[:3]], 'Error p95 (m)'))
+    write_specs(os.path.join(plots_dir, SPEC_FILE), specs)
+    job = start_render(specs, plots_dir) if figures_enabled(args.no_figures) else None
 
     # Copy to latest
     for f in glob.glob(os.path.join(run_dir, '*')):
         if os.path.isfile(f): shutil.copy(f, latest_dir)
+
+    if job is not None:
+        with prof.stage('plot', items=len(specs)):
+            job.wait()
+    prof.write(profile_path)
+    prof.report()
+    shutil.copy(profile_path, latest_dir)
     if os.path.exists(os.path.join(latest_dir, 'plots')): shutil.rmtree(os.path.join(latest_dir, 'plots'))
-    shutil.copytree(os.path.join(run_dir, 'plots'), os.path.join(latest_dir, 'plots'))
+    shutil.copytree(plots_dir, os.path.join(latest_dir, 'plots'))
     print(f"\nCompleted. Results in: {latest_dir}")
 
 if __name__ == "__main__":
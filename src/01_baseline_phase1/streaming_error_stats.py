@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所を取得 (src/01_baseline_phase1/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/01... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.error_sketch import ProjectedErrorStats, streaming_projected_error, REL_ACCURACY
+from common.geo import get_transformer
+from common.gnss_log import find_logs
+
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+DERIVED_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline'
+OUTPUT_DIR = DERIVED_DIR / 'streaming_error'
+
+CHUNK_ROWS = 100_000
+
+
+def group_logs_by_site(paths):
+    """ログ (ファイルまたはディレクトリ) -> {site_id: [ファイル, ...]}。同じサイトの複数日ログはまとめる"""
+    files = []
+    for p in paths:
+        p = Path(p)
+        files += find_logs(p) if p.is_dir() else [str(p)]
+    sites = {}
+    for fp in files:
+        sites.setdefault(os.path.basename(fp).split('_')[0], []).append(fp)
+    return sites
+
+
+def merge_sketch_files(paths):
+    """
+    保存済みのスケッチ (JSON) を site_id ごとにマージする (ログは読み直さない)。
+    基準点が違うスケッチ同士の誤差分布は近似になる (ProjectedErrorStats.merge)。マージできないファイルは飛ばす
+    """
+    merged = {}
+    for p in paths:
+        with open(p) as f:
+            d = json.load(f)
+        stats = ProjectedErrorStats.from_dict(d['stats'])
+        try:
+            if d['site_id'] in merged:
+                merged[d['site_id']].merge(stats)
+            else:
+                merged[d['site_id']] = stats
+        except ValueError as e:
+            print(f"Skipped {p}: {e}")
+    return merged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Constant-memory horizontal error percentiles (p50/p95/p99)")
+    parser.add_argument('logs', nargs='*', type=Path, default=[LOG_DIR], help="log files or directories")
+    parser.add_argument('--merge', nargs='+', type=Path, default=None,
+                        help="combine saved sketch JSON files instead of reading logs")
+    parser.add_argument('--ref', nargs=2, type=float, default=None, metavar=('X', 'Y'),
+                        help="common reference point [EPSG:6677] for sketches merged later "
+                             "(default: first-chunk median snapped to a 10 m grid)")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--rel-acc', type=float, default=REL_ACCURACY)
+    parser.add_argument('--out-dir', type=Path, default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    print("--- Streaming Error Statistics ---")
+    print(f"▶ Output Dir : {args.out_dir}")
+    sketch_dir = args.out_dir / 'sketches'
+    sketch_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.merge:
+        results = merge_sketch_files(args.merge)
+    else:
+        transformer = get_transformer()
+        results = {}
+        for site_id, files in group_logs_by_site(args.logs).items():
+            try:
+                results[site_id] = streaming_projected_error(files, transformer, args.chunk_rows, args.rel_acc, args.ref)
+            except ValueError as e:
+                print(f"Skipped {site_id}: {e}")
+
+    rows = []
+    for site_id, stats in sorted(results.items()):
+        with open(sketch_dir / f'{site_id}.json', 'w') as f:
+            json.dump({'site_id': site_id, 'stats': stats.to_dict()}, f)
+        row = {'site_id': site_id, **stats.summary()}
+        rows.append(row)
+        print(f"Processed {site_id}: n={row['n_fix']} err50={row['err_p50_m']:.2f}m "
+              f"err95={row['err_p95_m']:.2f}m err99={row['err_p99_m']:.2f}m")
+
+    if not rows:
+        print("No sites.")
+        return
+    pd.DataFrame(rows).to_csv(args.out_dir / 'error_stats.csv', index=False)
+    print(f"\nCompleted. (relative accuracy ±{args.rel_acc:.1%}) Results in: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
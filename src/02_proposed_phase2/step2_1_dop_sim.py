@@ -1,7 +1,4 @@
-import os
-import glob
-import math
-import csv
+import sys
 import numpy as np
 import pandas as pd
 from pathlib import Path
@@ -14,138 +11,66 @@ CURRENT_DIR = Path(__file__).resolve().parent
 
 # 2. プロジェクトのルートディレクトリを特定 (3階層上: src/02... -> src -> Root)
 PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.gnss_log import find_logs
+from common.profiling import Profiler
+from common.artifacts import write_artifact
+from common.status_store import StatusStore
 
 LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
 OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_dop'
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 OUTPUT_CSV = OUTPUT_DIR / "week3_dop_results.csv"
 
-print(f"▶ Input Logs : {LOG_DIR}")
-print(f"▶ Output CSV : {OUTPUT_CSV}")
-
 # ==========================================
 # 計算エンジン (DOP Simulator)
 # ==========================================
-def calculate_hdop(satellites):
-    """
-    衛星の配置(Azimuth, Elevation)から、幾何学的精度低下率(HDOP)を計算する。
-    HDOPが小さいほど、衛星配置が良い（精度が出やすい）。
-    """
-    if len(satellites) < 4:
-        return np.nan  # 衛星が4機未満なら測位不能
-
-    G = []
-    for az_deg, el_deg in satellites:
-        # 角度をラジアンに変換
-        az = math.radians(az_deg)
-        el = math.radians(el_deg)
-        
-        # 視線ベクトル (East, North, Up)
-        # Azimuthは北基準時計回り前提
-        x = math.cos(el) * math.sin(az)
-        y = math.cos(el) * math.cos(az)
-        z = math.sin(el)
-        
-        # 時刻誤差項(1)を含めた行列
-        G.append([x, y, z, 1])
-    
-    G = np.array(G)
-    
-    try:
-        # (G^T * G) の逆行列を計算
-        Q = np.linalg.inv(G.T @ G)
-        # HDOP = sqrt(Q_east + Q_north) = sqrt(Q[0,0] + Q[1,1])
-        hdop = math.sqrt(Q[0, 0] + Q[1, 1])
-        return hdop
-    except np.linalg.LinAlgError:
-        return np.nan # 特異行列などで計算不能
-
 def parse_and_simulate(filepath):
     """
-    1つのログファイルを読み込み、Cut-A(5度)とCut-B(15度)のHDOPを計算する
+    1つのログファイルを読み込み、Cut-A(5度)とCut-B(15度)のHDOPを計算する。
+    Status は StatusStore (エポックごとの連続区間) に読み込み、全エポックの HDOP を batched_dop でまとめて計算する。
+    HDOPが小さいほど、衛星配置が良い（精度が出やすい）。衛星が4機未満・特異行列のエポックは除く。
     """
-    # データを格納する辞書: time -> list of (az, el)
-    epochs = {}
-    
     print(f"Processing: {filepath.name} ...")
-    
-    with filepath.open("r", encoding="utf-8", errors="ignore") as f:
-        reader = csv.reader(f)
-        header_map = {}
-        
-        for row in reader:
-            if not row: continue
-            
-            # ヘッダー行の解析 (# Status, UnixTimeMillis, ...)
-            if row[0].startswith("#") and "Status" in row[0]:
-                clean_row = [c.strip().replace("#", "").strip() for c in row]
-                try:
-                    type_idx = clean_row.index("Status")
-                    for i, col in enumerate(clean_row[type_idx+1:]):
-                        header_map[col] = type_idx + 1 + i
-                except ValueError:
-                    pass
-                continue
+    site_id = filepath.name.split("_")[0]
 
-            # データ行の解析
-            if row[0].strip() == "Status":
-                try:
-                    idx_time = header_map.get("UnixTimeMillis")
-                    idx_el = header_map.get("ElevationDegrees")
-                    idx_az = header_map.get("AzimuthDegrees")
-                    
-                    if idx_time is None or idx_el is None or idx_az is None:
-                        continue
-                        
-                    t = row[idx_time]
-                    el = float(row[idx_el])
-                    az = float(row[idx_az])
-                    
-                    if t not in epochs:
-                        epochs[t] = []
-                    epochs[t].append((az, el))
-                except (ValueError, IndexError):
-                    continue
+    try:
+        status = StatusStore.from_log(filepath)
+    except ValueError:
+        return {"site_id": site_id, "hdop_cut_a_median": np.nan, "hdop_cut_b_median": np.nan, "valid_epochs": 0}
 
-    # --- シミュレーション実行 ---
-    stats_a = []
-    stats_b = []
-    
-    for t, sats in epochs.items():
-        # Cut-A: 5度以上
-        sats_a = [(az, el) for (az, el) in sats if el >= 5.0]
-        hdop_a = calculate_hdop(sats_a)
-        
-        # Cut-B: 15度以上
-        sats_b = [(az, el) for (az, el) in sats if el >= 15.0]
-        hdop_b = calculate_hdop(sats_b)
-        
-        if not np.isnan(hdop_a): stats_a.append(hdop_a)
-        if not np.isnan(hdop_b): stats_b.append(hdop_b)
+    # 方位角・仰角が読めた観測だけを使う
+    status = status.select(~(np.isnan(status.az) | np.isnan(status.el)))
 
-    return {
-        "site_id": filepath.stem.split("_")[0],
-        "hdop_cut_a_median": np.nanmedian(stats_a) if stats_a else np.nan,
-        "hdop_cut_b_median": np.nanmedian(stats_b) if stats_b else np.nan,
-        "valid_epochs": len(epochs)
-    }
+    res = {"site_id": site_id}
+    for cut_name, min_el in [("hdop_cut_a", 5.0), ("hdop_cut_b", 15.0)]:
+        hdops = status.dop(min_el)["hdop"]
+        hdops = hdops[~np.isnan(hdops)]
+        res[f"{cut_name}_median"] = np.median(hdops) if len(hdops) else np.nan
+    res["valid_epochs"] = int((status.counts > 0).sum())
+    return res
 
 def main():
-    log_files = glob.glob(os.path.join(LOG_DIR, "*.txt"))
+    print(f"▶ Input Logs : {LOG_DIR}")
+    print(f"▶ Output CSV : {OUTPUT_CSV}")
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+
+    # .txt と圧縮ログ (.txt.gz / .txt.xz / .txt.zst)
+    log_files = [Path(f) for f in find_logs(LOG_DIR)]
     
     if not log_files:
-        print("エラー: logs フォルダに .txt ファイルが見つかりません。")
+        print("エラー: logs フォルダにログ (.txt / .txt.gz / .txt.xz / .txt.zst) が見つかりません。")
         return
 
-    results = []
-    for log_file in log_files:
-        path = Path(log_file)
-        res = parse_and_simulate(path)
-        results.append(res)
+    # ファイルごとに並列で処理 (結果はファイル名順)。サイトごとの時間は profile.json に記録
+    prof = Profiler('step2_1_dop_sim', sample_dir=OUTPUT_DIR)
+    results = [res for _, res in prof.map_logs('parse_dop', parse_and_simulate, log_files,
+                                               items_of=lambda res: res['valid_epochs'])]
     
     df = pd.DataFrame(results)
-    df.to_csv(OUTPUT_CSV, index=False)
+    write_artifact(df, OUTPUT_CSV, 'dop_results', csv=True)
+    prof.write(OUTPUT_DIR / 'profile.json')
     
     print("-" * 30)
     print(f"完了！結果を {OUTPUT_CSV} に保存しました。")
@@ -1,9 +1,11 @@
 import os
+import sys
 import glob
 import pandas as pd
 import numpy as np
 from sklearn.metrics import roc_auc_score
 import warnings
+from pathlib import Path
 warnings.filterwarnings("ignore")
 
 # ==========================================
@@ -13,6 +15,10 @@ warnings.filterwarnings("ignore")
 #    src/02_proposed_phase2/step2_2...py -> parent(02) -> parent(src) -> parent(Root)
 CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent.parent 
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.profiling import Profiler
+from common.artifacts import read_artifact, write_artifact, artifact_exists
 
 LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
 # Phase 1 の結果 (data/processed/sites_risk.csv)
@@ -21,17 +27,21 @@ SITE_RISK_FILE = PROJECT_ROOT / 'data' / 'processed' / 'sites_risk.csv'
 
 # Step 2-1 (DOP計算) の結果を読み込む
 # ※さっき step2_1 で出力先に指定した 'experiments/analysis_output/phase2_dop' を見に行く
-DOP_RESULT_FILE = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_dop' / 'week3_dop_results.csv'
+# (.arrow が無ければ同じ名前の .csv を読む)
+DOP_RESULT_FILE = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_dop' / 'week3_dop_results.arrow'
+
+# Phase 1 (run_baseline.py) の誤差指標。無ければ旧構成の場所を順に探す
+METRICS_FILES = [
+    PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline' / 'latest' / 'merged.arrow',
+    Path('week3_analysis/derived/latest/merged.csv'),
+    Path('merged.csv'),
+]
 
 # 3. 出力先のパス
 # 今回の評価結果 (元コードの 'derived' フォルダに相当)
 DERIVED_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_evaluate'
-DERIVED_DIR.mkdir(parents=True, exist_ok=True)
 
 # ==========================================
-print(f"▶ Input Site Risk : {SITE_RISK_FILE}")
-print(f"▶ Input DOP Res   : {DOP_RESULT_FILE}")
-print(f"▶ Output Dir      : {DERIVED_DIR}")
 
 # Safety Metrics用設定
 HIGH_ERROR_QUANTILE = 0.70 # 上位30%を高誤差とする
@@ -90,7 +100,11 @@ def calculate_safety_metrics(df, y_col, score_col, model_name):
     return res
 
 def main():
+    print(f"▶ Input Site Risk : {SITE_RISK_FILE}")
+    print(f"▶ Input DOP Res   : {DOP_RESULT_FILE}")
+    print(f"▶ Output Dir      : {DERIVED_DIR}")
     print("--- Phase 2: Analysis Pipeline (Safety Metrics) ---")
+    prof = Profiler('step2_2_evaluate_methods', sample_dir=DERIVED_DIR)
     
     # 1. ログ読み込み & 誤差データ作成 (merged.csv相当を作る)
     # ※今回は簡易的に既存の merged.csv があればそれを使う、なければ作る
@@ -98,34 +112,33 @@ def main():
     
     # まずログからサイトID抽出 (本来は全ログ処理だが、簡略化のためRiskファイルベースで結合)
     df_risk = pd.read_csv(SITE_RISK_FILE)
+    df_risk['site_id'] = df_risk['site_id'].astype(str).str.strip()
     
-    # 誤差データ（既存の merged.csv または site_metrics_raw.csv があると仮定）
-    # なければ week3_analysis/derived/latest/merged.csv を探す
-    metrics_path = 'week3_analysis/derived/latest/merged.csv'
-    if not os.path.exists(metrics_path):
-        # ルートにある場合
-        metrics_path = 'merged.csv'
-    
-    if os.path.exists(metrics_path):
+    # 誤差データ (Phase 1 の merged.csv)
+    metrics_path = next((p for p in METRICS_FILES if artifact_exists(p)), None)
+    if metrics_path is not None:
         print(f"Loading metrics from: {metrics_path}")
-        df_metrics = pd.read_csv(metrics_path)
+        df_metrics = read_artifact(metrics_path, 'site_merged')
     else:
         print("Error: merged.csv (Phase 1 result) not found. Run Phase 1 first.")
         return
 
-    # HDOPデータ結合
-    if os.path.exists(DOP_RESULT_FILE):
-        df_dop = pd.read_csv(DOP_RESULT_FILE)
-        df_metrics = pd.merge(df_metrics, df_dop[['site_id', 'hdop_cut_a_median']], on='site_id', how='left')
+    with prof.stage('merge') as rec:
+        # HDOPデータ結合 (Phase 1 の merged.csv にも同名の列があるので Step 2-1 の値で置き換える)
+        if artifact_exists(DOP_RESULT_FILE):
+            df_dop = read_artifact(DOP_RESULT_FILE, 'dop_results', columns=['site_id', 'hdop_cut_a_median'])
+            df_metrics = df_metrics.drop(columns=['hdop_cut_a_median'], errors='ignore')
+            df_metrics = pd.merge(df_metrics, df_dop, on='site_id', how='left')
 
-    # 今回のリスクデータと結合
-    # カラム重複を防ぐ
-    cols_to_use = [c for c in df_risk.columns if c not in df_metrics.columns or c == 'site_id']
-    df_merged = pd.merge(df_metrics, df_risk[cols_to_use], on='site_id', how='inner')
+        # 今回のリスクデータと結合
+        # カラム重複を防ぐ
+        cols_to_use = [c for c in df_risk.columns if c not in df_metrics.columns or c == 'site_id']
+        df_merged = pd.merge(df_metrics, df_risk[cols_to_use], on='site_id', how='inner')
+        rec['items'] = len(df_merged)
     
     # 保存
     os.makedirs(DERIVED_DIR, exist_ok=True)
-    df_merged.to_csv(os.path.join(DERIVED_DIR, 'merged_analysis2_final.csv'), index=False)
+    write_artifact(df_merged, DERIVED_DIR / 'merged_analysis2_final.arrow', 'site_merged', csv=True)
 
     # 2. 評価実行
     # Ground Truth定義
@@ -143,10 +156,11 @@ def main():
         ('hdop_cut_a_median', 'Benchmark (HDOP)')
     ]
     
-    for col, name in targets:
-        if col in df_merged.columns:
-            res = calculate_safety_metrics(df_merged, 'high_error', col, name)
-            if res: results.append(res)
+    with prof.stage('roc', items=len(targets)):
+        for col, name in targets:
+            if col in df_merged.columns:
+                res = calculate_safety_metrics(df_merged, 'high_error', col, name)
+                if res: results.append(res)
             
     # 結果表示
     res_df = pd.DataFrame(results)
@@ -156,6 +170,7 @@ def main():
     # ファイル保存
     with open(os.path.join(DERIVED_DIR, 'final_results.txt'), 'w') as f:
         f.write(res_df.to_markdown(index=False))
+    prof.write(DERIVED_DIR / 'profile.json')
     print(f"\nResults saved to {DERIVED_DIR}/final_results.txt")
 
 if __name__ == "__main__":
@@ -0,0 +1,140 @@
+import sys
+import glob
+import argparse
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/02_proposed_phase2/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/02... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.almanac import load_almanacs, utc_to_gps_seconds, satellite_ecef, azel
+from common.dop import batched_dop
+from common.geo import get_transformer, PROJ_EPSG, WGS84_EPSG
+from common.height_pyramid import open_height_raster
+from common.skyline import horizon_profiles, horizon_mask
+
+ALMANAC_DIR = PROJECT_ROOT / 'data' / 'raw' / 'almanac'     # YUMA 形式 (*.alm / *.txt)
+SITE_FILE = PROJECT_ROOT / 'data' / 'processed' / 'sites_risk.csv'
+RASTER_DIR = PROJECT_ROOT / 'data_qgis' / 'processed'
+HEIGHT_RES_M = 5.0          # bld_height_pyramid.tif のページ (無ければ bld_height_5m.tif)
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_dop_predict'
+
+# 予測条件
+LOCAL_UTC_OFFSET_H = 9      # JST
+STEP_SEC = 30               # 予測の時間間隔
+MASK_DEG = 5.0              # Cut-A と同じ仰角マスク
+SITE_HEIGHT_M = 40.0        # 楕円体高 (渋谷付近の概値。仰角への影響は無視できる)
+CHUNK_EPOCHS = 240          # 1回の配列演算で処理するエポック数 (メモリ上限)
+HDOP_WARN = 2.0             # サマリで「HDOP が悪い時間帯」とみなす値
+
+
+def load_sites(path):
+    """site_id と緯度経度を返す。(lat, lon) 列が無ければ center_x_6677 / center_y_6677 から逆変換"""
+    df = pd.read_csv(path)
+    df['site_id'] = df['site_id'].astype(str).str.strip()
+    if {'lat', 'lon'} <= set(df.columns):
+        return df
+    inv = get_transformer(PROJ_EPSG, WGS84_EPSG)
+    df['lon'], df['lat'] = inv.transform(df['center_x_6677'].values, df['center_y_6677'].values)
+    return df
+
+
+def predict_dop(alm, lat, lon, times_utc, mask_deg=MASK_DEG, profiles=None, chunk=CHUNK_EPOCHS):
+    """
+    サイト × 時刻の HDOP / PDOP / 可視衛星数を予測する。
+    profiles (P, n_az) を渡すと、建物による水平線マスクも適用する。
+    """
+    gps_t = utc_to_gps_seconds(times_utc)
+    n_site, n_time = len(lat), len(gps_t)
+    out = {k: np.full((n_site, n_time), np.nan) for k in ('hdop', 'pdop')}
+    out['n_sats'] = np.zeros((n_site, n_time), dtype=np.int16)
+
+    for t0 in range(0, n_time, chunk):
+        sl = slice(t0, t0 + chunk)
+        az, el = azel(satellite_ecef(alm, gps_t[sl]), lat, lon, SITE_HEIGHT_M)  # (P, T, S)
+        if profiles is not None:
+            mask = horizon_mask(az, el, profiles, mask_deg)
+        else:
+            mask = el >= mask_deg
+        res = batched_dop(az, el, mask)
+        out['hdop'][:, sl] = res['hdop']
+        out['pdop'][:, sl] = res['pdop']
+        out['n_sats'][:, sl] = res['n_sats']
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict site x time HDOP/PDOP from a local YUMA almanac")
+    parser.add_argument('--almanac', nargs='*', type=Path, help="YUMA almanac file(s) (default: data/raw/almanac/*)")
+    parser.add_argument('--sites', type=Path, default=SITE_FILE, help="CSV with site_id and lat/lon or center_x_6677/center_y_6677")
+    parser.add_argument('--date', default=None, help="local date (JST) to predict, e.g. 2026-01-12 (default: today)")
+    parser.add_argument('--step', type=int, default=STEP_SEC, help="time step in seconds")
+    parser.add_argument('--mask-deg', type=float, default=MASK_DEG)
+    parser.add_argument('--no-horizon', action='store_true', help="use only the elevation mask (ignore buildings)")
+    args = parser.parse_args()
+
+    alm_files = args.almanac or sorted(glob.glob(str(ALMANAC_DIR / '*.alm')) + glob.glob(str(ALMANAC_DIR / '*.txt')))
+    if not alm_files:
+        print(f"エラー: アルマナックが見つかりません ({ALMANAC_DIR})。YUMA 形式のファイルを置いてください。")
+        return
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    print(f"▶ Almanac    : {[str(p) for p in alm_files]}")
+    print(f"▶ Sites      : {args.sites}")
+    print(f"▶ Output Dir : {OUTPUT_DIR}")
+
+    alm = load_almanacs(alm_files)
+    sites = load_sites(args.sites)
+
+    date = np.datetime64(args.date or str(np.datetime64('today', 'D')), 'D')
+    start_utc = date.astype('datetime64[s]') - np.timedelta64(LOCAL_UTC_OFFSET_H, 'h')
+    times_utc = start_utc + np.arange(0, 86400, args.step).astype('timedelta64[s]')
+    times_local = times_utc + np.timedelta64(LOCAL_UTC_OFFSET_H, 'h')
+    print(f"[*] {len(alm['prn'])} satellites × {len(sites)} sites × {len(times_utc)} epochs ({date} JST)")
+
+    profiles = None
+    if not args.no_horizon:
+        height = open_height_raster(RASTER_DIR, HEIGHT_RES_M)
+        if {'center_x_6677', 'center_y_6677'} <= set(sites.columns) and height is not None:
+            profiles = horizon_profiles(sites['center_x_6677'].values, sites['center_y_6677'].values, height)
+            print(f"[*] Skyline mask from {height.path.name} page {height.page} "
+                  f"({height.res_x:g} m, max horizon {profiles.max():.1f}°)")
+        else:
+            print("[!] 建物高さラスタまたはサイトの投影座標が無いため、仰角マスクのみ適用します。")
+
+    res = predict_dop(alm, sites['lat'].values, sites['lon'].values, times_utc, args.mask_deg, profiles)
+
+    columns = pd.DatetimeIndex(times_local).strftime('%H:%M:%S')
+    for key in ('hdop', 'pdop'):
+        mat = pd.DataFrame(res[key], index=sites['site_id'], columns=columns)
+        mat.to_csv(OUTPUT_DIR / f'predicted_{key}_{date}.csv')
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # 一日中4機未満のサイトは NaN
+        summary = pd.DataFrame({
+            'site_id': sites['site_id'],
+            'hdop_median': np.nanmedian(res['hdop'], axis=1),
+            'hdop_p95': np.nanpercentile(res['hdop'], 95, axis=1),
+            'pdop_median': np.nanmedian(res['pdop'], axis=1),
+            'frac_hdop_gt_warn': np.mean(~(res['hdop'] <= HDOP_WARN), axis=1),
+            'n_sats_mean': res['n_sats'].mean(axis=1),
+        })
+    summary.to_csv(OUTPUT_DIR / f'predicted_dop_summary_{date}.csv', index=False)
+
+    print("-" * 30)
+    print(f"完了！結果を {OUTPUT_DIR} に保存しました。")
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
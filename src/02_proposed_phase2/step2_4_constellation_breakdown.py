@@ -0,0 +1,86 @@
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/02_proposed_phase2/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/02... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.constellation import signal_stats, subset_dop
+from common.gnss_log import find_logs
+from common.profiling import Profiler
+from common.status_store import StatusStore
+
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_constellation'
+
+MIN_EL = 5.0  # Cut-A と同じ仰角マスク
+
+
+def analyze_log(filepath):
+    """1つのログ -> (信号ごとの統計, 組み合わせごとの DOP)。ヘッダが無ければ None"""
+    site_id = Path(filepath).name.split('_')[0]
+    try:
+        status = StatusStore.from_log(filepath)
+    except ValueError:
+        return None
+    sig = signal_stats(status)
+    dop = subset_dop(status, min_el=MIN_EL)
+    sig.insert(0, 'site_id', site_id)
+    dop.insert(0, 'site_id', site_id)
+    return sig, dop
+
+
+def main():
+    print("--- Constellation Breakdown ---")
+    print(f"▶ Input Logs : {LOG_DIR}")
+    print(f"▶ Output Dir : {OUTPUT_DIR}")
+
+    log_files = find_logs(LOG_DIR)
+    if not log_files:
+        print(f"Error: no logs in {LOG_DIR}")
+        return
+
+    prof = Profiler('step2_4_constellation_breakdown', sample_dir=OUTPUT_DIR)
+    sig_tables, dop_tables = [], []
+    for filepath, res in prof.map_logs('constellation', analyze_log, log_files,
+                                       items_of=lambda res: int(res[0].loc[res[0]['band'] == 'ALL', 'n_obs'].sum()) if res else None):
+        if res is None:
+            print(f"Skipped {Path(filepath).name}: Missing Header")
+            continue
+        sig_tables.append(res[0])
+        dop_tables.append(res[1])
+        all_row = res[1][res[1]['subset'] == 'ALL'].iloc[0]
+        print(f"Processed {all_row['site_id']}: HDOP(ALL)={all_row['hdop_median']:.2f}, "
+              f"{res[0]['constellation'].nunique()} constellations")
+
+    if not sig_tables:
+        print("No logs processed.")
+        return
+
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    df_sig = pd.concat(sig_tables, ignore_index=True)
+    df_dop = pd.concat(dop_tables, ignore_index=True)
+    df_sig.to_csv(OUTPUT_DIR / 'constellation_signal_stats.csv', index=False)
+    df_dop.to_csv(OUTPUT_DIR / 'subset_dop.csv', index=False)
+
+    # サイトごとに1行 (sites_risk.csv と結合しやすい形)
+    wide = df_dop.pivot(index='site_id', columns='subset', values='hdop_median')
+    wide.columns = [f'hdop_{c.lower().replace("+", "_")}' for c in wide.columns]
+    wide.reset_index().to_csv(OUTPUT_DIR / 'subset_hdop_wide.csv', index=False)
+    prof.write(OUTPUT_DIR / 'profile.json')
+
+    print("\n" + df_dop.groupby('subset', sort=False)[['availability', 'n_sats_mean', 'hdop_median']]
+          .median().to_string(float_format=lambda v: f"{v:.2f}"))
+    print(f"\nCompleted. Results in: {OUTPUT_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,117 +1,136 @@
-import pandas as pd
+import sys
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 from sklearn.metrics import roc_curve, auc, roc_auc_score
 from pathlib import Path
 
+# ==========================================
+# 設定
+# ==========================================
+# スクリプトの場所を基準にパスを解決 (実行ディレクトリに依存しない)
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.profiling import Profiler
+from common.artifacts import read_arrays, artifact_exists
+from common.figures import figures_enabled, roc_curve_spec, roc_figure, write_specs, start_render
+
+# Phase 2 (step2_2) の結果。無ければ旧構成 (このスクリプトと同じ場所) の CSV を使う
+INPUT_FILES = [
+    PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_evaluate' / 'merged_analysis2_final.arrow',
+    CURRENT_DIR / 'phase2_final_merged.csv',
+]
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase3_validation'
+FIGURE_SPEC_FILE = OUTPUT_DIR / 'figures_roc.json'   # 図の仕様 (計算済みの曲線。render_figures.py で描ける)
+
 def main():
+    parser = argparse.ArgumentParser(description="Phase 3: ROC 曲線の比較図")
+    parser.add_argument('--no-figures', action='store_true', help="図を描かず、figures_roc.json だけ書く")
+    args = parser.parse_args()
+
     # ---------------------------------------------------------
     # 1. データ読み込み
     # ---------------------------------------------------------
-    # スクリプトの場所を基準にパスを解決 (実行ディレクトリに依存しない)
-    current_dir = Path(__file__).resolve().parent
-    csv_path = current_dir / 'phase2_final_merged.csv'
-
-    if not csv_path.exists():
-        print(f"[Error] File not found: {csv_path}")
-        print("Please place 'phase2_final_merged.csv' in the same directory as this script.")
+    csv_path = next((p for p in INPUT_FILES if artifact_exists(p)), None)
+    if csv_path is None:
+        print(f"[Error] File not found: {INPUT_FILES[0]}")
+        print("Run Phase 2 (step2_2_evaluate_methods.py) first.")
         return
+    print(f"Loading: {csv_path}")
 
-    df = pd.read_csv(csv_path)
+    # 使うのは数値の3列だけなので、DataFrame にせずファイルのバッファをそのまま読む
+    cols = read_arrays(csv_path, 'site_merged', ['err_p95_m', 'risk_proxy_5m', 'hdop_cut_a_median'])
+    prof = Profiler('generate_final_roc_curves', sample_dir=OUTPUT_DIR)
 
     # ---------------------------------------------------------
     # 2. 正解ラベル (Ground Truth) の定義
     # ---------------------------------------------------------
     # 上位30% (70% quantile) を高誤差(High Error)とする
-    thr = df['err_p95_m'].quantile(0.70)
-    y_true = (df['err_p95_m'] >= thr).astype(int)
+    thr = np.nanquantile(cols['err_p95_m'], 0.70)
+    y_true = (cols['err_p95_m'] >= thr).astype(int)
     
     print(f"Threshold: {thr:.2f}m")
     print(f"Positives (High Error): {y_true.sum()}")
     print(f"Negatives (Low Error) : {len(y_true) - y_true.sum()}")
 
-    # ---------------------------------------------------------
-    # 3. 各指標のROCデータ準備
-    # ---------------------------------------------------------
+    with prof.stage('roc', items=3):
+        # ---------------------------------------------------------
+        # 3. 各指標のROCデータ準備
+        # ---------------------------------------------------------
     
-    # (A) Phase 2 (Combined) - 実データ
-    # -----------------------------------------------------
-    score_p2 = df['risk_proxy_5m']
-    # AUCが0.5未満なら反転 (Low score = High Risk の場合に対応)
-    if roc_auc_score(y_true, score_p2) < 0.5:
-        score_p2 = -score_p2
+        # (A) Phase 2 (Combined) - 実データ
+        # -----------------------------------------------------
+        score_p2 = cols['risk_proxy_5m']
+        # AUCが0.5未満なら反転 (Low score = High Risk の場合に対応)
+        if roc_auc_score(y_true, score_p2) < 0.5:
+            score_p2 = -score_p2
     
-    fpr_p2, tpr_p2, _ = roc_curve(y_true, score_p2)
-    auc_p2 = auc(fpr_p2, tpr_p2)
+        fpr_p2, tpr_p2, _ = roc_curve(y_true, score_p2)
+        auc_p2 = auc(fpr_p2, tpr_p2)
 
-    # (B) Benchmark (HDOP) - 実データ
-    # -----------------------------------------------------
-    score_hdop = df['hdop_cut_a_median']
-    if roc_auc_score(y_true, score_hdop) < 0.5:
-        score_hdop = -score_hdop
+        # (B) Benchmark (HDOP) - 実データ
+        # -----------------------------------------------------
+        score_hdop = cols['hdop_cut_a_median']
+        if roc_auc_score(y_true, score_hdop) < 0.5:
+            score_hdop = -score_hdop
         
-    fpr_hdop, tpr_hdop, _ = roc_curve(y_true, score_hdop)
-    auc_hdop = auc(fpr_hdop, tpr_hdop)
+        fpr_hdop, tpr_hdop, _ = roc_curve(y_true, score_hdop)
+        auc_hdop = auc(fpr_hdop, tpr_hdop)
 
-    # (C) Phase 1 (risk_proxy) - 再現データ (Simulation)
-    # -----------------------------------------------------
-    # Phase 1 の実測AUC (0.677) を再現するためのスコア分布を生成
-    # N=45 のデータセット特性(階段状の挙動)に合わせてシミュレーション
-    target_auc_p1 = 0.677
-    n_pos = np.sum(y_true == 1)
+        # (C) Phase 1 (risk_proxy) - 再現データ (Simulation)
+        # -----------------------------------------------------
+        # Phase 1 の実測AUC (0.677) を再現するためのスコア分布を生成
+        # N=45 のデータセット特性(階段状の挙動)に合わせてシミュレーション
+        target_auc_p1 = 0.677
+        n_pos = np.sum(y_true == 1)
     
-    np.random.seed(42) # 再現性のため固定
+        np.random.seed(42) # 再現性のため固定
     
-    # Positive用スコア生成
-    pos_scores = np.sort(np.random.uniform(0.5, 1.0, n_pos))
+        # Positive用スコア生成
+        pos_scores = np.sort(np.random.uniform(0.5, 1.0, n_pos))
     
-    # Negative用スコア設定: 目標AUCになるようなランク位置に挿入
-    target_rank_idx = int(round(target_auc_p1 * n_pos))
-    split_idx = n_pos - target_rank_idx
-    neg_score = pos_scores[split_idx] - 0.001
+        # Negative用スコア設定: 目標AUCになるようなランク位置に挿入
+        target_rank_idx = int(round(target_auc_p1 * n_pos))
+        split_idx = n_pos - target_rank_idx
+        neg_score = pos_scores[split_idx] - 0.001
     
-    # 全スコア配列の構築
-    s_p1 = np.zeros(len(y_true))
-    s_p1[y_true == 1] = pos_scores
-    s_p1[y_true == 0] = neg_score
+        # 全スコア配列の構築
+        s_p1 = np.zeros(len(y_true))
+        s_p1[y_true == 1] = pos_scores
+        s_p1[y_true == 0] = neg_score
     
-    fpr_p1, tpr_p1, _ = roc_curve(y_true, s_p1)
-    auc_p1 = auc(fpr_p1, tpr_p1)
+        fpr_p1, tpr_p1, _ = roc_curve(y_true, s_p1)
+        auc_p1 = auc(fpr_p1, tpr_p1)
 
     # ---------------------------------------------------------
-    # 4. プロット作成
+    # 4. プロット (曲線は計算済み。描画は別プロセスの Agg で行う)
     # ---------------------------------------------------------
-    plt.figure(figsize=(10, 9))
-
-    # Phase 2 (赤・実線・太め)
-    plt.plot(fpr_p2, tpr_p2, color='#d62728', lw=3, 
-             label=f'Phase 2 (Combined) (AUC = {auc_p2:.3f})')
-
-    # HDOP (緑・一点鎖線)
-    plt.plot(fpr_hdop, tpr_hdop, color='#2ca02c', lw=2, linestyle='-.', 
-             label=f'Benchmark (HDOP) (AUC = {auc_hdop:.3f})')
-
-    # Phase 1 (青・破線)
-    plt.plot(fpr_p1, tpr_p1, color='#1f77b4', lw=2, linestyle='--', 
-             label=f'Phase 1 (risk_proxy) (AUC ≈ {auc_p1:.3f})')
-
-    # 対角線 (ランダム予測)
-    plt.plot([0, 1], [0, 1], 'k--', lw=1, alpha=0.4)
-
-    # 装飾
-    plt.xlim([-0.05, 1.05])
-    plt.ylim([-0.05, 1.05])
-    plt.xlabel('False Positive Rate (1 - Specificity)', fontsize=12)
-    plt.ylabel('True Positive Rate (Sensitivity)', fontsize=12)
-    plt.title('ROC Curve Comparison: Improvement by Infrastructure Integration', fontsize=14)
-    plt.legend(loc='lower right', fontsize=11)
-    plt.grid(True, linestyle=':', alpha=0.6)
+    curves = [
+        # Phase 2 (赤・実線・太め)
+        roc_curve_spec(f'Phase 2 (Combined) (AUC = {auc_p2:.3f})', fpr_p2, tpr_p2, color='#d62728', lw=3),
+        # HDOP (緑・一点鎖線)
+        roc_curve_spec(f'Benchmark (HDOP) (AUC = {auc_hdop:.3f})', fpr_hdop, tpr_hdop,
+                       color='#2ca02c', lw=2, linestyle='-.'),
+        # Phase 1 (青・破線)
+        roc_curve_spec(f'Phase 1 (risk_proxy) (AUC ≈ {auc_p1:.3f})', fpr_p1, tpr_p1,
+                       color='#1f77b4', lw=2, linestyle='--'),
+    ]
+    spec = roc_figure(
+        'roc_comparison_final.png', curves, figsize=(10, 9), dpi=300,
+        title='ROC Curve Comparison: Improvement by Infrastructure Integration', title_fontsize=14,
+        diagonal={'color': 'k', 'linestyle': '--', 'lw': 1, 'alpha': 0.4},  # 対角線 (ランダム予測)
+        xlabel='False Positive Rate (1 - Specificity)', ylabel='True Positive Rate (Sensitivity)', label_fontsize=12,
+        legend={'loc': 'lower right', 'fontsize': 11}, grid=True, lim_pad=0.05, tight=True)
+    write_specs(FIGURE_SPEC_FILE, [spec])
 
-    # 保存
-    output_filename = current_dir / 'roc_comparison_final.png'
-    plt.savefig(output_filename, dpi=300, bbox_inches='tight')
-    print(f"Plot saved to: {output_filename}")
-    # plt.show() # 必要ならコメントアウトを外す
+    if figures_enabled(args.no_figures):
+        with prof.stage('plot', items=1):
+            (output_filename, _), = start_render([spec], OUTPUT_DIR).wait()
+        print(f"Plot saved to: {output_filename}")
+    else:
+        print(f"Figure spec saved to: {FIGURE_SPEC_FILE} (render with src/render_figures.py)")
+    prof.write(OUTPUT_DIR / 'profile_roc.json')
 
 if __name__ == "__main__":
     main()
@@ -1,8 +1,10 @@
+import sys
+import argparse
 import pandas as pd
 import numpy as np
 from sklearn.metrics import roc_auc_score
-from sklearn.utils import resample
 import warnings
+from pathlib import Path
 warnings.filterwarnings("ignore")
 
 # ==========================================
@@ -13,25 +15,37 @@ warnings.filterwarnings("ignore")
 #    src/03_statistical_validation/script.py -> parent(03) -> parent(src) -> parent(Root)
 CURRENT_DIR = Path(__file__).resolve().parent
 PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.profiling import Profiler
+from common.artifacts import read_artifact
+from common.auc_stats import batched_auc, paired_permutation_test
+from common.resampling import SITE_MODES, site_resampler
 
 # 2. 入力データのパス設定
 #    Phase 2 (step2_2) の出力結果があるフォルダを指定
-#    (experiments/analysis_output/phase2_evaluate/merged_analysis2_final.csv)
+#    (experiments/analysis_output/phase2_evaluate/merged_analysis2_final.arrow, 無ければ .csv)
 INPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_evaluate'
-DATA_FILE = INPUT_DIR / "merged_analysis2_final.csv"
+DATA_FILE = INPUT_DIR / "merged_analysis2_final.arrow"
 
 # 3. 検証結果の出力先 (experiments/analysis_output/phase3_validation)
 #    ※ 検証結果も隔離して保存します
 OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase3_validation'
-OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
 # ==========================================
-print(f"▶ Input Data : {DATA_FILE}")
-print(f"▶ Output Dir : {OUTPUT_DIR}")
 
 HIGH_ERROR_QUANTILE = 0.70
 N_BOOTSTRAP = 1000
 
+# リサンプルの方法 (common.resampling.SITE_MODES)。サイトは class ごとに 15 地点ずつ、500 m の AOI に
+# 集まっているので、i.i.d. の復元抽出では近いサイトの相関を無視して信頼度を高く見積もる
+BOOTSTRAP_MODES = SITE_MODES
+DEFAULT_MODES = ['iid', 'stratified', 'spatial']
+BLOCK_M = 100.0
+
+# 並べ替え検定 (サイトごとに Phase2 モデルと HDOP のスコアを入れ替える) の回数
+N_PERMUTATION = 100_000
+
 # 評価対象のモデル定義 (pipeline_analysis2.py の MODELS と同じ順序・構成)
 MODELS = {
     "Phase2 (Combined)": "risk_proxy_5m",
@@ -89,15 +103,52 @@ def calculate_safety_metrics(df, y_col, score_col, model_name):
             
     return res
 
+def bootstrap_auc_diffs(df, n_boot=N_BOOTSTRAP, mode='iid', block_m=BLOCK_M, seed=0):
+    """
+    サイトをリサンプルして、Phase2 各モデルと HDOP の AUC の差 (Proposed - Benchmark) を集める。
+    リサンプルは添字の行列でまとめて作り、閾値・AUC (反転込み) も行列のまま計算する。
+    高誤差の閾値はリサンプルごとに計算し直す。陽性・陰性がそろわないリサンプルは除く。
+    """
+    resampler = site_resampler(df, mode, block_m)
+    err = df['err_p95_m'].to_numpy(dtype=float)
+    scores = {name: df[col].to_numpy(dtype=float) for name, col in MODELS.items()}
+    rng = np.random.default_rng(seed)
+
+    # 差分を格納する辞書 (Proposed - Benchmark)
+    diffs = {name: [] for name in MODELS if name != "Benchmark (HDOP)"}
+    for idx in resampler.iter_samples(n_boot, rng):
+        e = err[idx]
+        y = e >= np.quantile(e, HIGH_ERROR_QUANTILE, axis=1, keepdims=True)
+        # 反転ロジック (AUC < 0.5 なら反転) は calculate_safety_metrics と同じ
+        auc = {name: batched_auc(y, s[idx]) for name, s in scores.items()}
+        auc = {name: np.maximum(a, 1.0 - a) for name, a in auc.items()}
+        for name in diffs:
+            d = auc[name] - auc["Benchmark (HDOP)"]
+            diffs[name].append(d[~np.isnan(d)])
+    return {name: np.concatenate(d) for name, d in diffs.items()}
+
 # ---------------------------------------------------------
 # メイン処理
 # ---------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description="Phase 3: Phase2 各モデルと HDOP の AUC の差のブートストラップ検定")
+    parser.add_argument('--modes', nargs='+', choices=BOOTSTRAP_MODES, default=DEFAULT_MODES)
+    parser.add_argument('--n-boot', type=int, default=N_BOOTSTRAP)
+    parser.add_argument('--block-m', type=float, default=BLOCK_M, help="spatial の格子セルの一辺 [m]")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--n-perm', type=int, default=N_PERMUTATION,
+                        help="並べ替え検定の回数 (サイト数が 20 以下なら全通りを数える)")
+    parser.add_argument('--perm-workers', type=int, default=1, help="並べ替え検定のプロセス数")
+    args = parser.parse_args()
+
+    print(f"▶ Input Data : {DATA_FILE}")
+    print(f"▶ Output Dir : {OUTPUT_DIR}")
     print("--- Bootstrap Analysis (All Models) ---")
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
     # 1. データ読み込み
     try:
-        df = pd.read_csv(DATA_FILE)
+        df = read_artifact(DATA_FILE, 'site_merged')
     except FileNotFoundError:
         print(f"Error: {DATA_FILE} not found.")
         return
@@ -117,60 +168,69 @@ def main():
     print("-" * len(header))
 
     original_results = {}
+    flipped = {}
 
     for name, col in MODELS.items():
         res = calculate_safety_metrics(df, 'high_error', col, name)
         if res:
             original_results[name] = res['AUC'] # ブートストラップ比較用に保存
+            flipped[name] = res['Flipped']
             print(f"| {name:<18} | {col:<18} | {res['AUC']:0.6f} | {str(res['Flipped']):<7} | {res['Rank(A11)']:>9} | {res['Rank(A06)']:>9} |")
     print("-" * len(header))
 
-    # 3. Bootstrap 実行 (Phase2 各モデル vs HDOP)
-    print(f"\n[Running Bootstrap n={N_BOOTSTRAP} ...]")
-    
-    # 差分を格納する辞書 (Proposed - Benchmark)
-    diffs = {
-        "Phase2 (Combined)": [],
-        "Phase2 (Horizon)": [],
-        "Phase2 (Overhead)": []
-    }
-    
-    for i in range(N_BOOTSTRAP):
-        boot = resample(df, random_state=i)
-        
-        # 閾値再計算
-        thr_boot = boot['err_p95_m'].quantile(HIGH_ERROR_QUANTILE)
-        boot['high_error'] = (boot['err_p95_m'] >= thr_boot).astype(int)
-        
-        if len(boot['high_error'].unique()) < 2: continue
-
-        # Benchmark (HDOP) の計算
-        res_hdop = calculate_safety_metrics(boot, 'high_error', MODELS["Benchmark (HDOP)"], "Benchmark (HDOP)")
-        if not res_hdop: continue
-        auc_hdop = res_hdop['AUC']
-        
-        # Proposed 各モデルの計算と差分記録
-        for name in diffs.keys():
-            res_prop = calculate_safety_metrics(boot, 'high_error', MODELS[name], name)
-            if res_prop:
-                diffs[name].append(res_prop['AUC'] - auc_hdop)
-
-    # 4. 統計検定結果の出力
-    print("\n=== Final Statistical Results (p-value: Proposed > HDOP) ===")
-    
-    for name, diff_list in diffs.items():
-        if len(diff_list) == 0:
-            print(f"{name}: No valid bootstrap samples.")
-            continue
-            
-        # p-value: 差分が0以下の割合
-        p_val = np.mean([d <= 0 for d in diff_list])
-        
-        # オリジナルの差分
-        orig_diff = original_results.get(name, 0) - original_results.get("Benchmark (HDOP)", 0)
-        
-        sig_mark = "✅" if p_val < 0.05 else " "
-        print(f"{name:<18} | Diff: {orig_diff:+.4f} | p-value: {p_val:.4f} {sig_mark}")
+    prof = Profiler('run_bootstrap_test', sample_dir=OUTPUT_DIR)
+
+    # 3. 対応のある並べ替え検定 (H0: サイトごとに Phase2 モデルと HDOP のスコアは入れ替え可能)
+    #    スコアの向きは上の表 (Flipped) と同じにそろえる
+    print(f"\n=== Paired Permutation Test (H0: AUC(Proposed) = AUC(HDOP), n_perm={args.n_perm}) ===")
+    y = df['high_error'].to_numpy()
+    oriented = {name: df[col].to_numpy(dtype=float) * (-1.0 if flipped.get(name) else 1.0)
+                for name, col in MODELS.items()}
+    perm_rows = []
+    with prof.stage('permutation', items=args.n_perm):
+        for name in MODELS:
+            if name == "Benchmark (HDOP)" or name not in flipped or "Benchmark (HDOP)" not in flipped:
+                continue
+            res = paired_permutation_test(y, oriented[name], oriented["Benchmark (HDOP)"],
+                                          n_perm=args.n_perm, seed=args.seed, workers=args.perm_workers)
+            sig_mark = "✅" if res['p_value'] < 0.05 else " "
+            print(f"{name:<18} | Diff: {res['diff']:+.4f} | p-value: {res['p_value']:.4f} {sig_mark} "
+                  f"({'exact' if res['exact'] else 'Monte Carlo'}, {res['n_perm']} permutations)")
+            perm_rows.append({"Model": name, "Diff_vs_HDOP": res['diff'], "p_value": res['p_value'],
+                              "n_perm": res['n_perm'], "exact": res['exact'], "n_sites": res['n_sites']})
+    pd.DataFrame(perm_rows).to_csv(OUTPUT_DIR / 'permutation_results.csv', index=False)
+
+    rows = []
+    for mode in args.modes:
+        # 3. Bootstrap 実行 (Phase2 各モデル vs HDOP)
+        print(f"\n[Running Bootstrap mode={mode} n={args.n_boot} ...]")
+        with prof.stage(f'bootstrap_{mode}', items=args.n_boot):
+            diffs = bootstrap_auc_diffs(df, args.n_boot, mode=mode, block_m=args.block_m, seed=args.seed)
+
+        # 4. 統計検定結果の出力 (p-value はブートストラップの差が 0 以下の割合。検定は上の並べ替え検定)
+        print(f"\n=== Final Statistical Results [{mode}] (p-value: Proposed > HDOP) ===")
+        for name, diff_list in diffs.items():
+            if len(diff_list) == 0:
+                print(f"{name}: No valid bootstrap samples.")
+                continue
+
+            # p-value: 差分が0以下の割合
+            p_val = np.mean(diff_list <= 0)
+            ci_low, ci_high = np.percentile(diff_list, [2.5, 97.5])
+
+            # オリジナルの差分
+            orig_diff = original_results.get(name, 0) - original_results.get("Benchmark (HDOP)", 0)
+
+            sig_mark = "✅" if p_val < 0.05 else " "
+            print(f"{name:<18} | Diff: {orig_diff:+.4f} | 95% CI: [{ci_low:+.4f}, {ci_high:+.4f}] "
+                  f"| p-value: {p_val:.4f} {sig_mark}")
+            rows.append({"Mode": mode, "Model": name, "AUC": original_results.get(name), "Diff_vs_HDOP": orig_diff,
+                         "CI_low": ci_low, "CI_high": ci_high, "p_value": p_val, "n_boot": len(diff_list)})
+
+    # パイプライン (run_pipeline.py) の下流やあとで見返すために保存
+    pd.DataFrame(rows).to_csv(OUTPUT_DIR / 'bootstrap_results.csv', index=False)
+    prof.write(OUTPUT_DIR / 'profile_bootstrap.json')
+    print(f"\nResults saved to {OUTPUT_DIR / 'bootstrap_results.csv'}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,192 @@
+import os
+import sys
+import argparse
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. ルートディレクトリの取得
+#    src/03_statistical_validation/script.py -> parent(03) -> parent(src) -> parent(Root)
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.profiling import Profiler
+from common.artifacts import read_artifact
+from common.auc_stats import auc_score, batched_auc
+from common.resampling import SITE_MODES, site_resampler
+from common.fusion import L2, fit_logistic, stratified_group_folds, n_folds, cv_predict
+
+# 2. 入力 (Phase 2 の結果) と出力先
+DATA_FILE = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase2_evaluate' / 'merged_analysis2_final.arrow'
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase3_validation'
+
+# ==========================================
+
+HIGH_ERROR_QUANTILE = 0.70
+
+# 組み合わせる特徴量 (表に無い列は使わない)
+FEATURES = ['risk_proxy_5m', 'risk_horizon', 'overhead_score', 'hdop_cut_a_median',
+            'cn0_mean', 'cn0_nlos_frac', 'used_sat_mean']
+BENCHMARK = 'hdop_cut_a_median'
+
+N_BOOTSTRAP = 200   # 外側のブートストラップの回数
+N_REPEATS = 5       # 内側の層別交差検証の繰り返し回数
+N_FOLDS = 5
+WORKERS = None      # ブートストラップを分けるプロセス数 (None: CPU コア数、1 以下なら主プロセスで順に実行)
+
+
+def high_error_labels(err):
+    """(..., n) の誤差 -> 行ごとに上位 30% を 1 とするラベル (run_bootstrap_test と同じ定義)"""
+    return (err >= np.quantile(err, HIGH_ERROR_QUANTILE, axis=-1, keepdims=True)).astype(int)
+
+
+def oriented_auc(y, s):
+    """calculate_safety_metrics と同じく、AUC < 0.5 なら反転した値"""
+    a = auc_score(y, s)
+    return max(a, 1.0 - a)
+
+
+def make_folds(y, groups, n_repeats, k, rng):
+    """(繰り返し, 件数) の fold 番号と fold 数 (交差検証できなければ None)"""
+    k = n_folds(y, groups, k)
+    if k < 2:
+        return None, k
+    return np.stack([stratified_group_folds(y, groups, k, rng) for _ in range(n_repeats)]), k
+
+
+def cv_auc(X, y, folds, k, l2, beta0):
+    """繰り返しごとの out-of-fold 予測の AUC の平均と、最後の係数 (次の warm start 用)"""
+    aucs = []
+    for f in folds:
+        pred, beta0 = cv_predict(X, y, f, k, l2, beta0)
+        ok = ~np.isnan(pred)
+        aucs.append(auc_score(y[ok], pred[ok]))
+    return float(np.nanmean(aucs)), beta0
+
+
+def evaluate_shard(X, y, idx, folds, ks, l2, beta0):
+    """
+    ブートストラップの一部 (idx: (m, n) のサイトの添字) について、各リサンプルの交差検証 AUC を返す。
+    fold (folds: (m, 繰り返し, n)) は主プロセスで作ったものを使う。係数はリサンプル間で引き継ぐ。
+    """
+    out = np.full(len(idx), np.nan)
+    for b in range(len(idx)):
+        if ks[b] < 2:
+            continue
+        out[b], beta0 = cv_auc(X[idx[b]], y[b], folds[b], ks[b], l2, beta0)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="リスク指標を組み合わせたスコアの交差検証 (ブートストラップの中で入れ子に実行)")
+    parser.add_argument('--input', type=Path, default=DATA_FILE)
+    parser.add_argument('--features', nargs='+', default=FEATURES)
+    parser.add_argument('--mode', choices=SITE_MODES, default='iid', help="外側のブートストラップの方法")
+    parser.add_argument('--block-m', type=float, default=100.0)
+    parser.add_argument('--n-boot', type=int, default=N_BOOTSTRAP)
+    parser.add_argument('--repeats', type=int, default=N_REPEATS)
+    parser.add_argument('--folds', type=int, default=N_FOLDS)
+    parser.add_argument('--l2', type=float, default=L2)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"▶ Input Data : {args.input}")
+    print(f"▶ Output Dir : {OUTPUT_DIR}")
+    print("--- Learned Fusion (Logistic, Repeated Stratified CV in Bootstrap) ---")
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    prof = Profiler('run_fusion_cv', sample_dir=OUTPUT_DIR)
+
+    try:
+        df = read_artifact(args.input, 'site_merged')
+    except FileNotFoundError:
+        print(f"Error: {args.input} not found.")
+        return
+    features = [f for f in args.features if f in df.columns]
+    X = df[features].to_numpy(dtype=float)
+    err = df['err_p95_m'].to_numpy(dtype=float)
+    y = high_error_labels(err)
+    rng = np.random.default_rng(args.seed)
+    print(f"[*] Loaded {len(df)} sites, features: {', '.join(features)}")
+
+    # 1. 全サイトでの当てはめ (係数は標準化した特徴量に対する値)
+    with prof.stage('fit', items=len(df)):
+        model = fit_logistic(X, y, args.l2)
+    coef = pd.DataFrame({'feature': ['(intercept)'] + features, 'coef_std': model.beta})
+    coef.to_csv(OUTPUT_DIR / 'fusion_coefficients.csv', index=False)
+    print("\n[Coefficients (standardized features)]")
+    print(coef.to_string(index=False))
+
+    # 2. 元のデータでの繰り返し交差検証
+    folds, k = make_folds(y, np.arange(len(df)), args.repeats, args.folds, rng)
+    if folds is None:
+        print(f"Error: too few high/low error sites for {args.folds}-fold CV (n={len(df)}).")
+        prof.write(OUTPUT_DIR / 'profile_fusion.json')
+        return
+    with prof.stage('cv', items=args.repeats * k):
+        auc_cv, _ = cv_auc(X, y, folds, k, args.l2, model.beta)
+    auc_apparent = auc_score(y, model.predict(X))
+    auc_hdop = oriented_auc(y, df[BENCHMARK].to_numpy(dtype=float)) if BENCHMARK in df else np.nan
+
+    # 3. 外側のブートストラップ (リサンプル・ラベル・fold は先にまとめて作る)
+    with prof.stage('folds', items=args.n_boot):
+        idx = site_resampler(df, args.mode, args.block_m).sample(args.n_boot, rng)
+        y_boot = high_error_labels(err[idx])
+        ks = np.zeros(args.n_boot, dtype=int)
+        folds_boot = np.zeros((args.n_boot, args.repeats, len(df)), dtype=np.int64)
+        for b in range(args.n_boot):
+            f, ks[b] = make_folds(y_boot[b], idx[b], args.repeats, args.folds, rng)
+            if f is not None:
+                folds_boot[b] = f
+
+    workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+    shards = np.array_split(np.arange(args.n_boot), max(workers, 1) * 4)
+    tasks = [(X, y_boot[s], idx[s], folds_boot[s], ks[s], args.l2, model.beta) for s in shards if len(s)]
+    with prof.stage('nested_cv', items=args.n_boot * args.repeats * args.folds):
+        if workers <= 1:
+            parts = [evaluate_shard(*t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                parts = list(ex.map(evaluate_shard, *zip(*tasks)))
+    boot_cv = np.concatenate(parts)
+
+    # 同じリサンプルでの HDOP の AUC (反転込み)
+    if BENCHMARK in df:
+        a = batched_auc(y_boot, df[BENCHMARK].to_numpy(dtype=float)[idx])
+        boot_hdop = np.maximum(a, 1.0 - a)
+    else:
+        boot_hdop = np.full(args.n_boot, np.nan)
+    ok = ~np.isnan(boot_cv)
+    diff = (boot_cv - boot_hdop)[ok & ~np.isnan(boot_hdop)]
+
+    # 4. 結果
+    ci_low, ci_high = np.percentile(boot_cv[ok], [2.5, 97.5]) if ok.any() else (np.nan, np.nan)
+    d_low, d_high = np.percentile(diff, [2.5, 97.5]) if len(diff) else (np.nan, np.nan)
+    share = float(np.mean(diff <= 0)) if len(diff) else np.nan
+    print(f"\n=== Fused Score [{args.mode}, {args.repeats}x{k}-fold CV, n_boot={int(ok.sum())}] ===")
+    print(f"Apparent AUC (fit on all sites) : {auc_apparent:.4f}")
+    print(f"CV AUC                          : {auc_cv:.4f}  95% CI [{ci_low:.4f}, {ci_high:.4f}]")
+    print(f"Benchmark (HDOP) AUC            : {auc_hdop:.4f}")
+    print(f"CV AUC - HDOP                   : {auc_cv - auc_hdop:+.4f}  95% CI [{d_low:+.4f}, {d_high:+.4f}]"
+          f"  share <= 0: {share:.4f}")
+
+    rows = [{"Model": "Fused (logistic)", "Mode": args.mode, "AUC_apparent": auc_apparent, "AUC_CV": auc_cv,
+             "CI_low": ci_low, "CI_high": ci_high, "Diff_vs_HDOP": auc_cv - auc_hdop,
+             "Diff_CI_low": d_low, "Diff_CI_high": d_high, "share_diff_le_0": share,
+             "n_boot": int(ok.sum()), "repeats": args.repeats, "folds": k}]
+    pd.DataFrame(rows).to_csv(OUTPUT_DIR / 'fusion_cv_results.csv', index=False)
+    prof.write(OUTPUT_DIR / 'profile_fusion.json')
+    prof.report()
+    print(f"\nResults saved to {OUTPUT_DIR / 'fusion_cv_results.csv'}")
+
+
+if __name__ == "__main__":
+    main()
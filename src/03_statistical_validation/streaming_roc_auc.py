@@ -0,0 +1,113 @@
+import sys
+import json
+import argparse
+from pathlib import Path
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. ルートディレクトリの取得
+#    src/03_statistical_validation/script.py -> parent(03) -> parent(src) -> parent(Root)
+CURRENT_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.streaming_roc import (StreamingROC, StreamingHistogram, iter_column_chunks,
+                                  column_ranges, exact_quantile, N_BINS, CHUNK_ROWS)
+from common.figures import SPEC_FILE, figures_enabled, roc_curve_spec, roc_figure, write_specs, start_render
+
+# 入力: エポック単位のテーブル (build_epoch_dataset.py の出力)
+DEFAULT_INPUT = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase1_baseline' / 'epoch_dataset.parquet'
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'analysis_output' / 'phase3_streaming_roc'
+
+HIGH_ERROR_QUANTILE = 0.70  # run_baseline.py と同じ (上位30%を高誤差とする)
+DEFAULT_LABEL_SOURCE = 'err_h_m'
+DEFAULT_FEATURES = ['hdop', 'cn0_mean', 'cn0_min', 'n_used', 'nlos_frac']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-core ROC/AUC with bounded memory")
+    parser.add_argument('--input', type=Path, default=DEFAULT_INPUT,
+                        help=".parquet file or directory of <column>.npy arrays")
+    parser.add_argument('--features', nargs='+', default=DEFAULT_FEATURES)
+    parser.add_argument('--label', default=None, help="existing 0/1 label column (e.g. high_error)")
+    parser.add_argument('--label-from', default=DEFAULT_LABEL_SOURCE,
+                        help="column thresholded at --quantile when --label is not given")
+    parser.add_argument('--quantile', type=float, default=HIGH_ERROR_QUANTILE)
+    parser.add_argument('--bins', type=int, default=N_BINS)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--out-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--no-figures', action='store_true', help="skip plots (plots/figures.json is still written)")
+    args = parser.parse_args()
+
+    if not args.input.exists():
+        print(f"Error: {args.input} not found. Run build_epoch_dataset.py first.")
+        return
+
+    print("--- Streaming ROC/AUC ---")
+    print(f"▶ Input      : {args.input}")
+    print(f"▶ Output Dir : {args.out_dir}")
+
+    features = list(args.features)
+    label_col = args.label or args.label_from
+    columns = features + [label_col]
+
+    # 1パス目: スコアの範囲 (ビンの配置を決める)
+    ranges = column_ranges(args.input, columns, args.chunk_rows)
+
+    # 2パス目 (ラベルを作る場合のみ): 誤差の分位点 (ヒストグラム + 対象ビンの値だけで厳密に)
+    thr = None
+    if args.label is None:
+        hist = StreamingHistogram(*ranges[label_col], n_bins=args.bins)
+        for chunk in iter_column_chunks(args.input, [label_col], args.chunk_rows):
+            hist.update(chunk[label_col])
+        thr = exact_quantile(args.input, label_col, args.quantile, hist, args.chunk_rows)
+        if thr != thr:
+            print(f"Error: {label_col} has no values.")
+            return
+        print(f"High Error Threshold: {thr:.2f}m")
+
+    # 最終パス: ROC の累積
+    accs = {f: StreamingROC(*ranges[f], n_bins=args.bins) for f in features}
+    n_rows = 0
+    for chunk in iter_column_chunks(args.input, columns, args.chunk_rows):
+        y = chunk[label_col].astype(float)
+        if thr is not None:
+            valid = ~(y != y)
+            y = (y >= thr).astype(float)
+            y[~valid] = float('nan')
+        for f in features:
+            accs[f].update(chunk[f], y)
+        n_rows += len(y)
+    print(f"[*] {n_rows} rows accumulated")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+
+    auc_results, details, curves = [], {}, []
+    for f in features:
+        acc = accs[f]
+        score, bound = acc.auc()
+        if score != score:  # 片方のクラスしか無い
+            continue
+        fpr, tpr, _ = acc.curve()
+        curves.append(roc_curve_spec(f'{f} (AUC={score:.2f})', fpr, tpr))
+        auc_results.append(f"{f}: {score:.3f}")
+        details[f] = {'auc': score, 'error_bound': bound, 'n_pos': acc.n_pos, 'n_neg': acc.n_neg}
+        print(f"{f:<12}: AUC={score:.4f} (±{bound:.1e}, pos={acc.n_pos}, neg={acc.n_neg})")
+
+    # 図は別プロセスで描き、その間に数値の結果を書く
+    specs = [roc_figure('roc_curves.png', curves)]
+    write_specs(args.out_dir / 'plots' / SPEC_FILE, specs)
+    job = start_render(specs, args.out_dir / 'plots') if figures_enabled(args.no_figures) else None
+    with open(args.out_dir / 'roc_auc.txt', 'w') as f:
+        f.write('\n'.join(auc_results))
+    with open(args.out_dir / 'roc_auc_streaming.json', 'w') as f:
+        json.dump({'input': str(args.input), 'rows': n_rows, 'bins': args.bins,
+                   'threshold': thr, 'features': details}, f, indent=2)
+    if job is not None:
+        job.wait()
+    print(f"\nCompleted. Results in: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/04_field_tools/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリ (src/04... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.profiling import Profiler
+from common.raster import GeoTiff, DEFAULT_LAYERS
+from common.stages import content_digest
+from common.tiles import TILE_LAYERS, TILE_PX, raster_lonlat_bounds, tiles_in_bounds, tile_path, render_tiles
+
+RASTER_DIR = PROJECT_ROOT / 'data_qgis' / 'processed'
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'tiles'
+
+MIN_ZOOM = 14
+MAX_ZOOM = 18
+TILE_FORMAT = 'png'
+TILES_PER_TASK = 64     # 1回にプロセスへ渡すタイル数 (隣り合うタイルをまとめる)
+WORKERS = None          # None: CPU コア数、1 以下なら主プロセスで順に実行
+MANIFEST = 'manifest.json'
+RAMP_PERCENTILES = (1, 99)   # range が None のレイヤの色の範囲
+
+
+def value_range(spec, tif):
+    """ramp の色の範囲 [最小, 最大] (spec に無ければラスタの値のパーセンタイル)"""
+    if spec['style'] != 'ramp':
+        return None
+    if spec['range'] is not None:
+        return list(spec['range'])
+    a = np.asarray(tif.as_array(), dtype=float)
+    ok = ~np.isnan(a) if tif.nodata is None else ~np.isnan(a) & (a != tif.nodata)
+    if not ok.any():
+        return [0.0, 1.0]
+    lo, hi = np.percentile(a[ok], RAMP_PERCENTILES)
+    return [float(lo), float(hi)]
+
+
+def load_manifest(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def export_layer(layer, raster_dir, out_root, zooms, fmt, workers, force, prof):
+    spec = TILE_LAYERS[layer]
+    paths = {name: raster_dir / DEFAULT_LAYERS[name] for name in spec['rasters']
+             if (raster_dir / DEFAULT_LAYERS[name]).exists()}
+    if not paths:
+        print(f"[{layer}] skipped: {', '.join(DEFAULT_LAYERS[n] for n in spec['rasters'])} not found")
+        return
+    first = GeoTiff(next(iter(paths.values())))
+    out_dir = out_root / layer
+    manifest_path = out_dir / MANIFEST
+
+    # ズーム範囲は settings に入れない (範囲を変えても、両方にあるズームのタイルは前回のハッシュで差分更新する)
+    settings = {'format': fmt, 'tile_px': TILE_PX,
+                'range': value_range(spec, first), 'style': json.loads(json.dumps(spec))}
+    sources = {name: content_digest(p) for name, p in paths.items()}
+    old = load_manifest(manifest_path)
+    tiles = tiles_in_bounds(raster_lonlat_bounds(first), zooms)
+    old_tiles = old.get('tiles', {})
+
+    if not force and old.get('settings') == settings and old.get('sources') == sources and \
+            set(old_tiles) == {f"{z}/{x}/{y}" for z, x, y in tiles} and all(
+            tile_path(out_dir, *map(int, k.split('/')), fmt).exists() for k, d in old_tiles.items() if d):
+        print(f"[{layer}] up to date ({len(tiles)} tiles)")
+        return
+
+    # 色・範囲などが変わったら全タイル、ラスタだけが変わったら値の変わったタイルだけ書き直す
+    old_digests = old_tiles if not force and old.get('settings') == settings else {}
+    chunks = [tiles[i:i + TILES_PER_TASK] for i in range(0, len(tiles), TILES_PER_TASK)]
+    tasks = [(layer, paths, c, {f"{z}/{x}/{y}": old_digests.get(f"{z}/{x}/{y}") for z, x, y in c},
+              out_dir, fmt, settings['range']) for c in chunks]
+
+    digests, written, removed = {}, 0, 0
+    with prof.stage(layer, items=len(tiles)):
+        if workers <= 1 or len(tasks) == 1:
+            results = [render_tiles(*t) for t in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as ex:
+                results = list(ex.map(render_tiles, *zip(*tasks)))
+    for d, w, r in results:
+        digests.update(d)
+        written += w
+        removed += r
+
+    # 範囲から外れたタイル (ズーム範囲を狭めた場合など) と、形式を変えた場合の前の形式のタイルを消す
+    old_fmt = old.get('settings', {}).get('format', fmt)
+    for key, d in old_tiles.items():
+        if d and (key not in digests or old_fmt != fmt):
+            path = tile_path(out_dir, *map(int, key.split('/')), old_fmt)
+            if path.exists():
+                path.unlink()
+                removed += 1
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps({'settings': settings, 'zooms': list(zooms), 'sources': sources,
+                                         'tiles': digests}))
+    n_tiles = sum(1 for d in digests.values() if d)
+    print(f"[{layer}] {n_tiles} tiles (z{zooms[0]}-{zooms[-1]}): {written} written, {removed} removed, "
+          f"{n_tiles - written} unchanged")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="リスクラスタを XYZ タイル (Web メルカトル) に書き出す (変更のあったタイルだけ更新)")
+    parser.add_argument('--raster-dir', type=Path, default=RASTER_DIR)
+    parser.add_argument('--out-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--layers', nargs='+', choices=list(TILE_LAYERS), default=list(TILE_LAYERS))
+    parser.add_argument('--zoom', type=int, nargs=2, default=[MIN_ZOOM, MAX_ZOOM], metavar=('MIN', 'MAX'))
+    parser.add_argument('--format', choices=['png', 'webp'], default=TILE_FORMAT)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--force', action='store_true', help="前回の結果を無視して全タイルを書き直す")
+    args = parser.parse_args()
+
+    print(f"▶ Rasters    : {args.raster_dir}")
+    print(f"▶ Output Dir : {args.out_dir}  ({{layer}}/{{z}}/{{x}}/{{y}}.{args.format})")
+    zooms = list(range(args.zoom[0], args.zoom[1] + 1))
+    workers = (os.cpu_count() or 1) if args.workers is None else args.workers
+    prof = Profiler('export_tiles')
+    for layer in args.layers:
+        export_layer(layer, args.raster_dir, args.out_dir, zooms, args.format, workers, args.force, prof)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    prof.write(args.out_dir / 'profile_tiles.json')
+    prof.report()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/04_field_tools/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリ (src/04... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.dop import IncrementalDOP
+from common.epoch_dataset import HDOP_MIN_EL
+from common.geo import get_transformer
+from common.qc_prescan import QC_MIN_EPOCHS, QC_MIN_DURATION
+from common.rolling import RollingMetrics
+
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+
+POLL_S = 1.0            # 追記の確認間隔
+REPORT_S = 10.0         # 途中経過の表示間隔
+IDLE_TIMEOUT_S = 30.0   # この時間追記が無ければ記録終了とみなし、QC 未達なら FAIL
+WINDOW_S = 60.0         # HDOP・衛星数・Cn0 のローリング窓
+GRID_CELL_M = 0.05      # 誤差統計用の位置グリッド (分位点の誤差はセルの対角程度)
+READ_LIMIT = 4 << 20    # 1回に読む最大バイト数 (大きな既存ログの追いつき用)
+
+STATUS_FIELDS = ("UnixTimeMillis", "AzimuthDegrees", "ElevationDegrees", "Cn0DbHz", "UsedInFix",
+                 "ConstellationType", "Svid", "CarrierFrequencyHz")
+ROLL_METRICS = {'hdop': ('p50',), 'n_used': ('mean',), 'cn0_mean': ('mean',)}
+
+
+def _weighted_quantiles(values, weights, qs):
+    order = np.argsort(values)
+    v, cum = values[order], np.cumsum(weights[order])
+    idx = np.searchsorted(cum, np.asarray(qs) * cum[-1], side='left')
+    return v[np.minimum(idx, len(v) - 1)]
+
+
+# ==========================================
+# サイトごとの状態 (追記分だけを反映)
+# ==========================================
+class SiteState:
+    def __init__(self, site_id, path, window_s=WINDOW_S):
+        self.site_id, self.path, self.window_s = site_id, Path(path), window_s
+        self.offset, self.partial = 0, b""
+        self.last_growth = time.monotonic()
+        self.fix_idx = self.status_idx = None   # ヘッダ -> 列番号
+
+        # Fix: エポック数・期間・位置グリッド
+        self.n_fix = 0
+        self.t_first = self.t_last = None
+        self.ref = None
+        self.grid = Counter()
+
+        # Status: 進行中のエポック (時刻が変わったら確定する)
+        self.epoch_t, self.epoch_rows = None, []
+        self.n_status_epochs = 0
+        self.n_used_total = 0
+        self.dop = IncrementalDOP(min_el=HDOP_MIN_EL)
+        self.roll = RollingMetrics(window_s, ROLL_METRICS)
+        self.rolling = {}
+
+        self.verdict, self.reason = "PENDING", ""
+        self.ended = False
+
+    def reset(self):
+        """ファイルが書き直されたとき、集計を空に戻す (先頭から読み直す)"""
+        self.__init__(self.site_id, self.path, self.window_s)
+
+    # --- 行の取り込み ---
+    def feed(self, data, transformer):
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()  # 書きかけの最終行は次回に回す
+        fixes, epochs = [], []
+        for raw in lines:
+            line = raw.decode("utf-8", errors="ignore").strip()
+            if self._header(line):
+                continue
+            elif line.startswith("Fix") and self.fix_idx:
+                row = self._values(line, self.fix_idx, ("UnixTimeMillis", "LatitudeDegrees", "LongitudeDegrees"))
+                if row is not None:
+                    fixes.append(row)
+            elif line.startswith("Status") and self.status_idx:
+                row = self._values(line, self.status_idx, STATUS_FIELDS)
+                if row is None:
+                    continue
+                if self.epoch_t is not None and row[0] != self.epoch_t:
+                    epochs.append(self.epoch_rows)
+                    self.epoch_rows = []
+                self.epoch_t = row[0]
+                self.epoch_rows.append(row)
+        if fixes:
+            self._add_fixes(np.asarray(fixes), transformer)
+        if epochs:
+            self._add_epochs(epochs)
+
+    def _header(self, line):
+        """'# Fix' / '# Status' のヘッダ行なら列番号を覚えて True"""
+        if line.startswith("# Fix"):
+            self.fix_idx = self._index(line)
+        elif line.startswith("# Status"):
+            self.status_idx = self._index(line)
+        else:
+            return False
+        return True
+
+    def skip_to_end(self):
+        """
+        既存の内容を飛ばし、これから追記される行だけを読むようにする (--from-end)。
+        列の並びは先頭のコメント (#) 行にしか無いので、そこだけは読んでおく
+        """
+        with open(self.path, "rb") as f:
+            for raw in f:
+                line = raw.decode("utf-8", errors="ignore").strip()
+                if line and not line.startswith("#"):
+                    break
+                self._header(line)
+            self.offset = f.seek(0, 2)
+
+    def flush_epoch(self):
+        """進行中の Status エポックを確定する (次の時刻の行が来ないまま記録が終わったとき)"""
+        if self.epoch_rows:
+            self._add_epochs([self.epoch_rows])
+        self.epoch_t, self.epoch_rows = None, []
+
+    @staticmethod
+    def _index(line):
+        idx = {}
+        for i, c in enumerate(line.replace("#", "").strip().split(",")):
+            idx.setdefault(c.strip(), i)
+        return idx
+
+    @staticmethod
+    def _values(line, idx, names):
+        parts = line.split(",")
+        try:
+            return [float(parts[idx[n]]) if idx.get(n) is not None and parts[idx[n]] else np.nan for n in names]
+        except (IndexError, ValueError):
+            return None
+
+    def _add_fixes(self, fx, transformer):
+        fx = fx[~np.isnan(fx).any(axis=1)]
+        if not len(fx):
+            return
+        self.n_fix += len(fx)
+        self.t_first = fx[0, 0] if self.t_first is None else min(self.t_first, fx[:, 0].min())
+        self.t_last = fx[:, 0].max() if self.t_last is None else max(self.t_last, fx[:, 0].max())
+        xx, yy = transformer.transform(fx[:, 2], fx[:, 1])
+        if self.ref is None:
+            self.ref = (float(np.median(xx)), float(np.median(yy)))
+        ix = np.floor((np.asarray(xx) - self.ref[0]) / GRID_CELL_M).astype(np.int64)
+        iy = np.floor((np.asarray(yy) - self.ref[1]) / GRID_CELL_M).astype(np.int64)
+        self.grid.update(zip(ix.tolist(), iy.tolist()))
+
+    def _add_epochs(self, epochs):
+        """確定したエポックを反映する。HDOP は衛星の出入りだけを rank-1 更新する"""
+        n_max = max(len(rows) for rows in epochs)
+        arr = np.full((len(epochs), n_max, len(STATUS_FIELDS)), np.nan)
+        for i, rows in enumerate(epochs):
+            arr[i, :len(rows)] = rows
+        az, el, cn0, used = arr[..., 1], arr[..., 2], arr[..., 3], arr[..., 4] == 1
+        hdop = np.empty(len(epochs))
+        for i, rows in enumerate(epochs):
+            keys = [tuple(r[5:]) for r in rows]  # (ConstellationType, Svid, CarrierFrequencyHz)
+            hdop[i] = self.dop.update(keys, az[i, :len(rows)], el[i, :len(rows)])["hdop"]
+        n_used = used.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            cn0_mean = np.where(used, cn0, 0.0).sum(axis=1) / n_used
+        for i in range(len(epochs)):
+            self.rolling = self.roll.update(arr[i, 0, 0], {"hdop": hdop[i], "n_used": n_used[i],
+                                                           "cn0_mean": cn0_mean[i]})
+        self.n_status_epochs += len(epochs)
+        self.n_used_total += int(n_used.sum())
+
+    # --- 指標と QC 判定 ---
+    @property
+    def duration(self):
+        return (self.t_last - self.t_first) / 1000.0 if self.t_first is not None else 0.0
+
+    def error_stats(self):
+        """位置グリッドから中央値位置と水平誤差の p50 / p95"""
+        if not self.grid:
+            return np.nan, np.nan
+        cells = np.array(list(self.grid.keys()), dtype=float)
+        w = np.array(list(self.grid.values()), dtype=float)
+        xs, ys = (cells[:, 0] + 0.5) * GRID_CELL_M, (cells[:, 1] + 0.5) * GRID_CELL_M
+        cx = _weighted_quantiles(xs, w, [0.5])[0]
+        cy = _weighted_quantiles(ys, w, [0.5])[0]
+        p50, p95 = _weighted_quantiles(np.hypot(xs - cx, ys - cy), w, [0.5, 0.95])
+        return float(p50), float(p95)
+
+    def qc_failure(self):
+        """run_baseline.py と同じ順で QC 未達の理由を返す (通過なら None)"""
+        if not (self.fix_idx and self.status_idx):
+            return "Parse Error: Missing Header"
+        if self.n_fix < QC_MIN_EPOCHS:
+            return f"Low Epochs ({self.n_fix})"
+        if self.duration < QC_MIN_DURATION:
+            return f"Short Duration ({self.duration:.1f}s)"
+        if self.n_used_total == 0:
+            return "No Used Satellites"
+        return None
+
+    def update_verdict(self, idle):
+        """判定 (PENDING / PASS / FAIL) が変わったら True"""
+        reason = self.qc_failure()
+        if reason is None:
+            verdict = "PASS"
+        elif idle:
+            verdict = "FAIL"
+        else:
+            verdict = "PENDING"
+        changed = verdict != self.verdict
+        self.verdict, self.reason = verdict, reason or ""
+        return changed
+
+    def summary(self):
+        p50, p95 = self.error_stats()
+        return {
+            "site_id": self.site_id, "verdict": self.verdict, "reason": self.reason,
+            "n_fix": self.n_fix, "duration_s": round(self.duration, 1),
+            "err_p50_m": p50, "err_p95_m": p95,
+            "used_sat_mean": self.n_used_total / self.n_status_epochs if self.n_status_epochs else np.nan,
+            "hdop_p50_window": self.rolling.get("hdop_p50", np.nan),
+            "used_sat_mean_window": self.rolling.get("n_used_mean", np.nan),
+            "cn0_mean_window": self.rolling.get("cn0_mean_mean", np.nan),
+        }
+
+
+# ==========================================
+# 追記の読み込み (非同期)
+# ==========================================
+def read_appended(path, offset):
+    """offset 以降の追記分 (bytes) と新しい offset。ファイルが縮んだら先頭から読み直す"""
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        truncated = size < offset
+        if truncated:
+            offset = 0
+        f.seek(offset)
+        data = f.read(min(size - offset, READ_LIMIT))
+    return data, offset + len(data), truncated
+
+
+class LiveTail:
+    def __init__(self, paths, args):
+        self.paths, self.args = paths, args
+        self.transformer = get_transformer()
+        self.sites = {}  # path -> SiteState
+        self.events = open(args.events, "a") if args.events else None
+
+    def emit(self, event, state):
+        rec = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "event": event, **state.summary()}
+        print(f"[{rec['time']}] {event:<7} {state.site_id:<6} {rec['verdict']:<7} "
+              f"n={rec['n_fix']:<5} dur={rec['duration_s']:>6.1f}s "
+              f"err50={rec['err_p50_m']:.2f}m err95={rec['err_p95_m']:.2f}m "
+              f"used={rec['used_sat_mean']:.1f} hdop={rec['hdop_p50_window']:.2f}"
+              + (f"  ({rec['reason']})" if rec["reason"] and rec["verdict"] != "PENDING" else ""))
+        if self.events:
+            self.events.write(json.dumps(rec, default=float) + "\n")
+            self.events.flush()
+
+    def discover(self):
+        """対象のファイル (ディレクトリ内に新しく現れたログも含む) を追加する"""
+        for p in self.paths:
+            files = glob.glob(str(Path(p) / "*.txt")) if Path(p).is_dir() else [str(p)]
+            for fp in files:
+                if fp not in self.sites and Path(fp).exists():
+                    state = SiteState(Path(fp).name.split("_")[0], fp, self.args.window)
+                    if self.args.from_end:
+                        state.skip_to_end()
+                    self.sites[fp] = state
+                    asyncio.get_running_loop().create_task(self.follow(state))
+                    print(f"Following {fp}")
+
+    async def follow(self, state):
+        while True:
+            try:
+                data, offset, truncated = await asyncio.to_thread(read_appended, state.path, state.offset)
+            except FileNotFoundError:
+                data, offset, truncated = b"", state.offset, False
+            if truncated:
+                print(f"[!] {state.path.name} was truncated; re-reading from the start")
+                state.reset()
+            state.offset = offset
+            if data:
+                state.feed(data, self.transformer)
+                state.last_growth = time.monotonic()
+            idle = time.monotonic() - state.last_growth > self.args.idle_timeout
+            if idle and not state.ended:
+                state.flush_epoch()  # 記録終了: 最後のエポックも QC と END の値に含める
+            if state.update_verdict(idle):
+                self.emit(state.verdict, state)
+            if idle and not state.ended and state.verdict == "PASS":
+                self.emit("END", state)  # 記録終了時の最終値
+            state.ended = idle
+            if len(data) < READ_LIMIT:
+                await asyncio.sleep(self.args.poll)
+
+    async def run(self):
+        last_report = time.monotonic()
+        while True:
+            self.discover()
+            await asyncio.sleep(self.args.poll)
+            if time.monotonic() - last_report >= self.args.report:
+                last_report = time.monotonic()
+                for state in self.sites.values():
+                    if state.verdict == "PENDING":
+                        self.emit("status", state)
+            if self.args.exit_when_done and self.sites and \
+                    all(s.ended and s.verdict != "PENDING" for s in self.sites.values()):
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow growing GNSS Logger files and report QC live")
+    parser.add_argument("paths", nargs="*", type=Path, default=[LOG_DIR], help="log files or directories")
+    parser.add_argument("--poll", type=float, default=POLL_S)
+    parser.add_argument("--report", type=float, default=REPORT_S, help="status interval for pending sites [s]")
+    parser.add_argument("--idle-timeout", type=float, default=IDLE_TIMEOUT_S)
+    parser.add_argument("--window", type=float, default=WINDOW_S, help="rolling window for HDOP/used/Cn0 [s]")
+    parser.add_argument("--from-end", action="store_true", help="skip existing content (only new lines)")
+    parser.add_argument("--events", type=Path, default=None, help="append JSON-lines events to this file")
+    parser.add_argument("--exit-when-done", action="store_true",
+                        help="stop once every site has a final verdict and has gone idle")
+    args = parser.parse_args()
+
+    print("--- Live Tail ---")
+    print(f"▶ Watching : {', '.join(str(p) for p in args.paths)}")
+    print(f"▶ QC       : >= {QC_MIN_EPOCHS} epochs, >= {QC_MIN_DURATION:.0f}s, used satellites > 0")
+    try:
+        asyncio.run(LiveTail(args.paths, args).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
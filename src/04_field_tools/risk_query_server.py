@@ -0,0 +1,333 @@
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/04_field_tools/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリ (src/04... -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.geo import get_transformer
+from common.raster import RasterStack, DEFAULT_CACHE_BYTES
+from common.risk_class import fill_risk_class
+from common.route_risk import RouteScorer, routes_from_latlon
+
+RASTER_DIR = PROJECT_ROOT / 'data_qgis' / 'processed'
+
+HOST = "127.0.0.1"
+PORT = 8765
+MAX_BATCH_POINTS = 100_000     # 1リクエストあたりの最大点数
+MAX_BATCH_ROUTES = 10_000      # 1リクエストあたりの最大経路数
+LATENCY_WINDOW = 10_000        # p50/p99 を計算する直近リクエスト数
+MAX_BODY_BYTES = 16 << 20
+THREAD_PATHS = {"/risk", "/risk/batch", "/route"}   # ラスタを読むパス (イベントループの外のスレッドで処理する)
+JSON_CHUNK = 2_000             # 応答の JSON を何件ずつ変換するか (_dumps)
+
+
+# ==========================================
+# 計測 (レイテンシ・リクエスト数)
+# ==========================================
+class LatencyStats:
+    """直近 LATENCY_WINDOW 件のレイテンシから p50/p99 を計算する"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self.requests = 0
+        self.points = 0
+        self.errors = 0
+
+    def record(self, seconds, n_points):
+        self._samples.append(seconds)
+        self.requests += 1
+        self.points += n_points
+
+    def summary(self):
+        res = {"requests": self.requests, "points": self.points, "errors": self.errors}
+        if self._samples:
+            ms = np.asarray(self._samples) * 1000.0
+            res["latency_ms"] = {
+                "p50": float(np.percentile(ms, 50)),
+                "p99": float(np.percentile(ms, 99)),
+                "max": float(ms.max()),
+                "window": len(ms),
+            }
+        return res
+
+
+# ==========================================
+# 問い合わせ処理
+# ==========================================
+class RiskQueryService:
+    def __init__(self, raster_dir=RASTER_DIR, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.stack = RasterStack(raster_dir, cache_bytes=cache_bytes)
+        self.routes = RouteScorer(raster_dir)
+        self.transformer = get_transformer()  # EPSG:4326 -> 6677 (プロセスで1つ)
+        self.stats = LatencyStats()
+        # 大きなリクエストは別スレッドで処理する。タイルキャッシュ (OrderedDict) はスレッド間で共有しないよう排他する
+        self._lock = threading.Lock()
+
+    def query(self, lat, lon):
+        """緯度経度の配列 -> 1点ごとの dict のリスト (列ごとに tolist してから組み立てる)"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        xx, yy = self.transformer.transform(lon, lat)
+        xx, yy = np.atleast_1d(xx), np.atleast_1d(yy)
+        with self._lock:
+            values = fill_risk_class(self.stack.sample_xy(xx, yy))
+
+        columns = {"lat": lat, "lon": lon, "x_6677": np.asarray(xx, dtype=float), "y_6677": np.asarray(yy, dtype=float)}
+        columns.update(values)
+        records = _records(columns)
+        if "risk_class" in values:
+            for rec in records:
+                if rec["risk_class"] is not None:
+                    rec["risk_class"] = int(rec["risk_class"])
+        return records
+
+    def score_routes(self, routes_latlon, with_segments=False):
+        """[(lat, lon), ...] の経路リスト -> 経路ごと (と区間ごと) の指標"""
+        vertices, offsets = routes_from_latlon(routes_latlon)
+        with self._lock:
+            route_m, seg_m = self.routes.score_packed(vertices, offsets)
+        res = {"routes": _records(route_m)}
+        if with_segments:
+            res["segments"] = _records(seg_m)
+        return res
+
+    def status(self):
+        return {
+            "layers": list(self.stack.layers),
+            "missing_layers": self.stack.missing,
+            "cache": self.stack.cache.stats(),
+            **self.stats.summary(),
+        }
+
+
+# ==========================================
+# HTTP (asyncio, 標準ライブラリのみ)
+# ==========================================
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+def _records(columns):
+    """dict of ndarray -> JSON 用の dict のリスト (NaN は null)"""
+    keys = list(columns)
+    rows = zip(*(columns[k].tolist() for k in keys))
+    return [{k: (None if v != v else v) for k, v in zip(keys, row)} for row in rows]
+
+
+def _parse_points(payload):
+    """{"points": [[lat, lon], ...]} または {"lat": [...], "lon": [...]} を受け付ける"""
+    if "points" in payload:
+        pts = np.asarray(payload["points"], dtype=float).reshape(-1, 2)
+        return pts[:, 0], pts[:, 1]
+    return np.asarray(payload["lat"], dtype=float), np.asarray(payload["lon"], dtype=float)
+
+
+def handle_request(service, method, target, body):
+    """(status, dict, 点数) を返す"""
+    url = urlsplit(target)
+
+    if url.path == "/risk":
+        if method != "GET":
+            raise HttpError(405, "use GET /risk?lat=..&lon=..")
+        qs = parse_qs(url.query)
+        try:
+            lat, lon = float(qs["lat"][0]), float(qs["lon"][0])
+        except (KeyError, ValueError):
+            raise HttpError(400, "lat and lon are required")
+        return 200, service.query(lat, lon)[0], 1
+
+    if url.path == "/risk/batch":
+        if method != "POST":
+            raise HttpError(405, "use POST /risk/batch")
+        try:
+            lat, lon = _parse_points(json.loads(body or b"{}"))
+        except (KeyError, ValueError, TypeError):
+            raise HttpError(400, 'body must be {"points": [[lat, lon], ...]}')
+        if len(lat) != len(lon):
+            raise HttpError(400, "lat and lon must have the same length")
+        if len(lat) > MAX_BATCH_POINTS:
+            raise HttpError(413, f"at most {MAX_BATCH_POINTS} points per request")
+        return 200, {"results": service.query(lat, lon)}, len(lat)
+
+    if url.path == "/route":
+        if method != "POST":
+            raise HttpError(405, "use POST /route")
+        try:
+            payload = json.loads(body or b"{}")
+            routes = payload["routes"]
+        except (KeyError, ValueError, TypeError):
+            raise HttpError(400, 'body must be {"routes": [[[lat, lon], ...], ...]}')
+        if len(routes) > MAX_BATCH_ROUTES:
+            raise HttpError(413, f"at most {MAX_BATCH_ROUTES} routes per request")
+        try:
+            res = service.score_routes(routes, bool(payload.get("segments", False)))
+        except ValueError as e:
+            raise HttpError(400, str(e))
+        return 200, res, len(routes)
+
+    if url.path == "/stats":
+        return 200, service.status(), 0
+
+    if url.path == "/health":
+        return 200, {"status": "ok"}, 0
+
+    raise HttpError(404, f"unknown path: {url.path}")
+
+
+async def _read_request(reader):
+    """1リクエスト分を読む。接続が閉じられたら None"""
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        k, _, v = h.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HttpError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+def _dumps(payload):
+    """
+    json.dumps と同じ文字列を返す。長いリストは JSON_CHUNK 件ずつ変換する
+    (json.dumps は1回の呼び出しの間 GIL を手放さないので、10万点を一度に変換するとイベントループが止まる)
+    """
+    if not isinstance(payload, dict):
+        return json.dumps(payload, ensure_ascii=False)
+    parts = []
+    for key, value in payload.items():
+        if isinstance(value, list) and len(value) > JSON_CHUNK:
+            chunks = (json.dumps(value[i:i + JSON_CHUNK], ensure_ascii=False)[1:-1]
+                      for i in range(0, len(value), JSON_CHUNK))
+            text = "[" + ", ".join(chunks) + "]"
+        else:
+            text = json.dumps(value, ensure_ascii=False)
+        parts.append(json.dumps(str(key), ensure_ascii=False) + ": " + text)
+    return "{" + ", ".join(parts) + "}"
+
+
+def _response(status, payload, keep_alive):
+    data = _dumps(payload).encode("utf-8")
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + data
+
+
+def _handle_and_encode(service, method, target, body, keep_alive):
+    """リクエストを処理して応答のバイト列にする。戻り値は (応答, 点の数)"""
+    try:
+        status, payload, n_points = handle_request(service, method, target, body)
+    except HttpError as e:
+        status, payload, n_points = e.status, {"error": str(e)}, 0
+        service.stats.errors += 1
+    except Exception as e:
+        status, payload, n_points = 500, {"error": str(e)}, 0
+        service.stats.errors += 1
+    return _response(status, payload, keep_alive), n_points
+
+
+def make_handler(service):
+    async def handle(reader, writer):
+        try:
+            while True:
+                try:
+                    req = await _read_request(reader)
+                except HttpError as e:
+                    writer.write(_response(e.status, {"error": str(e)}, False))
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if req is None:
+                    break
+
+                method, target, headers, body = req
+                keep_alive = headers.get("connection", "").lower() != "close"
+                t0 = time.perf_counter()
+                if urlsplit(target).path in THREAD_PATHS:
+                    # 最大 MAX_BATCH_POINTS 点の処理と JSON 化の間も他の接続 (/health, /stats) を止めないよう、
+                    # イベントループの外のスレッドで実行する
+                    data, n_points = await asyncio.to_thread(
+                        _handle_and_encode, service, method, target, body, keep_alive)
+                else:
+                    data, n_points = _handle_and_encode(service, method, target, body, keep_alive)
+                service.stats.record(time.perf_counter() - t0, n_points)
+
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    return handle
+
+
+async def serve(host=HOST, port=PORT, raster_dir=RASTER_DIR, cache_bytes=DEFAULT_CACHE_BYTES):
+    service = RiskQueryService(raster_dir, cache_bytes)
+    server = await asyncio.start_server(make_handler(service), host, port)
+
+    print(f"▶ Raster Dir : {raster_dir}")
+    print(f"▶ Layers     : {list(service.stack.layers)} (missing: {service.stack.missing})")
+    print(f"▶ Listening  : http://{host}:{port}  (GET /risk, POST /risk/batch, POST /route, GET /stats)")
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GNSS risk query service (asyncio HTTP)")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--raster-dir", type=Path, default=RASTER_DIR)
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_CACHE_BYTES / 2**20,
+                        help="tile cache size limit in MiB")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.raster_dir, int(args.cache_mb * 2**20)))
+    except KeyboardInterrupt:
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import sys
+import argparse
+from pathlib import Path
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/benchmarks/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/benchmarks -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.synth_log import write_synthetic_log, CONSTELLATION_CODES
+
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'synthetic_logs'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GNSS Logger 形式の合成ログを作る (ベンチマーク・動作確認用)")
+    parser.add_argument('--out-dir', type=Path, default=OUTPUT_DIR)
+    parser.add_argument('--sites', type=int, default=4, help="作成するサイト数 (S01, S02, ...)")
+    parser.add_argument('--duration', type=float, default=330.0, help="記録時間 [s]")
+    parser.add_argument('--rate', type=float, default=1.0, help="エポックの頻度 [Hz]")
+    parser.add_argument('--sats', type=int, default=24, help="衛星数 (仰角 > 0 の衛星だけ記録される)")
+    parser.add_argument('--constellations', default='GPS,GLONASS,QZSS,BEIDOU,GALILEO',
+                        help="カンマ区切り (GPS, SBAS, GLONASS, QZSS, BEIDOU, GALILEO, IRNSS)")
+    parser.add_argument('--single-freq', action='store_true', help="L5 帯の信号を入れない")
+    parser.add_argument('--short', type=int, default=0, help="QC で落ちる短いログ (100 s) の数")
+    parser.add_argument('--compress', choices=['gz', 'xz'], default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        consts = [CONSTELLATION_CODES[c.strip().upper()] for c in args.constellations.split(',') if c.strip()]
+    except KeyError as e:
+        parser.error(f"unknown constellation: {e.args[0]}")
+
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    suffix = '.txt' + (f'.{args.compress}' if args.compress else '')
+    jobs = [(f'S{i + 1:02d}_gnss_log_2026_01_10{suffix}', args.duration) for i in range(args.sites)]
+    jobs += [(f'Q{i + 1:02d}_gnss_log_short{suffix}', 100.0) for i in range(args.short)]
+
+    for i, (name, duration) in enumerate(jobs):
+        info = write_synthetic_log(args.out_dir / name, duration_s=duration, rate_hz=args.rate, n_sats=args.sats,
+                                   constellations=consts, dual_freq=not args.single_freq, seed=args.seed + i)
+        print(f"{name}: {info['n_epochs']} epochs, {info['n_status']} status rows")
+    print(f"\nCompleted. Logs in: {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import warnings
+import subprocess
+import contextlib
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/benchmarks/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src/benchmarks -> src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.synth_log import write_synthetic_log
+from common.qc_prescan import prescan_log, prescan_failure
+from common.streaming_roc import StreamingROC
+from common.raster import RasterStack, local_max
+from common.auc_stats import paired_permutation_test
+from common.geo import get_transformer
+
+RASTER_DIR = PROJECT_ROOT / 'data_qgis' / 'processed'
+OUTPUT_DIR = PROJECT_ROOT / 'experiments' / 'benchmarks'
+
+# ケースごとの大きさ (ログは記録時間 [s]、それ以外は件数・辺の長さ)
+LOG_DURATIONS = [330, 1800, 7200]          # 5.5 分 (実測と同じ) / 30 分 / 2 時間
+AUC_SIZES = [1_000, 100_000, 1_000_000]     # スコアの件数 (サイト単位〜エポック単位)
+BOOT_SITES = [45, 200, 1000]                # サイト数 (実測は 45)
+GRID_SIZES = [100, 1024, 4096]              # 高さラスタの一辺のセル数 (実測の AOI は 100)
+POINT_SIZES = [1_000, 100_000, 1_000_000]   # サンプリングする点の数
+N_BOOT = 1000                               # ブートストラップの反復回数
+N_PERM = 100_000                            # 並べ替え検定の回数
+REPEAT = 3
+
+
+def load_script(path, name):
+    """番号付きフォルダのスクリプトをモジュールとして読み込む (読み込み時の表示は捨てる)"""
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    with contextlib.redirect_stdout(io.StringIO()):
+        spec.loader.exec_module(module)
+    return module
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ==========================================
+# ベンチマークのケース
+# 各ケースは (大きさ) -> (計測する関数, 処理件数, 件数の単位) を返す
+# ==========================================
+class Context:
+    """合成ログ・パース結果を大きさごとに1度だけ作って使い回す"""
+
+    def __init__(self, work_dir, n_sats, n_boot):
+        self.work_dir = Path(work_dir)
+        self.n_sats = n_sats
+        self.n_boot = n_boot
+        self._logs, self._parsed = {}, {}
+        self.baseline = load_script(PROJECT_ROOT / 'src' / '01_baseline_phase1' / 'run_baseline.py', 'run_baseline')
+        self.bootstrap = load_script(PROJECT_ROOT / 'src' / '03_statistical_validation' / 'run_bootstrap_test.py',
+                                     'run_bootstrap_test')
+
+    def log(self, duration):
+        if duration not in self._logs:
+            path = self.work_dir / f'B01_gnss_log_{duration}s.txt'
+            write_synthetic_log(path, duration_s=duration, n_sats=self.n_sats, seed=duration)
+            self._logs[duration] = path
+        return self._logs[duration]
+
+    def parsed(self, duration):
+        if duration not in self._parsed:
+            df_fix, status, msg = self.baseline.parse_gnss_log(self.log(duration))
+            if df_fix is None:
+                raise RuntimeError(f"synthetic log could not be parsed: {msg}")
+            self._parsed[duration] = (df_fix, status)
+        return self._parsed[duration]
+
+
+def case_parse(ctx, duration):
+    path = ctx.log(duration)
+    n = len(ctx.parsed(duration)[1])
+    return (lambda: ctx.baseline.parse_gnss_log(path)), n, 'status_rows'
+
+
+def case_qc(ctx, duration):
+    path = ctx.log(duration)
+    n = len(ctx.parsed(duration)[0])
+
+    def run():
+        prescan_failure(prescan_log(path), ctx.baseline.QC_MIN_EPOCHS, ctx.baseline.QC_MIN_DURATION)
+    return run, n, 'fix_rows'
+
+
+def case_projection(ctx, duration):
+    df_fix, _ = ctx.parsed(duration)
+    transformer = get_transformer()
+    return (lambda: ctx.baseline.calculate_projected_error(df_fix, transformer)), len(df_fix), 'fix_rows'
+
+
+def case_dop(ctx, duration):
+    _, status = ctx.parsed(duration)
+
+    def run():
+        status.dop(5)
+        status.dop(15)
+    return run, status.n_epochs, 'epochs'
+
+
+def case_site_metrics(ctx, duration):
+    df_fix, status = ctx.parsed(duration)
+    transformer = get_transformer()
+    return (lambda: ctx.baseline.compute_site_metrics('B01', df_fix, status, transformer)), len(status), 'status_rows'
+
+
+def _scores(n, seed=0):
+    rng = np.random.default_rng(seed)
+    y = rng.random(n) < 0.3
+    s = rng.normal(0, 1, n) + 0.8 * y
+    return s, y.astype(int)
+
+
+def case_auc_exact(ctx, n):
+    from sklearn.metrics import roc_auc_score
+    s, y = _scores(n)
+    return (lambda: roc_auc_score(y, s)), n, 'scores'
+
+
+def case_auc_streaming(ctx, n):
+    s, y = _scores(n)
+
+    def run():
+        roc = StreamingROC(s.min(), s.max())
+        roc.update(s, y)
+        roc.auc()
+    return run, n, 'scores'
+
+
+def _site_table(n, seed=0):
+    """ブートストラップ用の合成サイト表 (run_bootstrap_test の MODELS の列、class と 500 m 四方の座標を持つ)"""
+    rng = np.random.default_rng(seed)
+    err = rng.lognormal(1.5, 0.6, n)
+    z = (np.log(err) - 1.5) / 0.6
+    return pd.DataFrame({
+        'site_id': [f'B{i:04d}' for i in range(n)],
+        'class': np.array(['open', 'street', 'alley'])[np.arange(n) % 3],
+        'center_x_6677': rng.uniform(-12270, -11770, n),
+        'center_y_6677': rng.uniform(-38070, -37570, n),
+        'err_p95_m': err,
+        'risk_proxy_5m': z + rng.normal(0, 0.8, n),
+        'risk_horizon': z + rng.normal(0, 1.0, n),
+        'overhead_score': (rng.random(n) < 0.1) * rng.random(n),
+        'hdop_cut_a_median': 0.8 + 0.1 * z + rng.normal(0, 0.3, n),
+    })
+
+
+def case_bootstrap(ctx, n_sites):
+    df = _site_table(n_sites)
+    return (lambda: ctx.bootstrap.bootstrap_auc_diffs(df, ctx.n_boot)), ctx.n_boot, 'resamples'
+
+
+def case_bootstrap_spatial(ctx, n_sites):
+    df = _site_table(n_sites)
+    return (lambda: ctx.bootstrap.bootstrap_auc_diffs(df, ctx.n_boot, mode='stratified_spatial')), ctx.n_boot, 'resamples'
+
+
+def case_permutation(ctx, n_sites):
+    df = _site_table(n_sites)
+    y = (df['err_p95_m'] >= df['err_p95_m'].quantile(0.7)).to_numpy()
+    a, b = df['risk_proxy_5m'].to_numpy(), df['hdop_cut_a_median'].to_numpy()
+    return (lambda: paired_permutation_test(y, a, b, n_perm=N_PERM)), N_PERM, 'permutations'
+
+
+def case_raster_local_max(ctx, side):
+    rng = np.random.default_rng(side)
+    grid = np.where(rng.random((side, side)) < 0.4, rng.uniform(3, 200, (side, side)), 0.0).astype(np.float32)
+    return (lambda: local_max(grid)), side * side, 'cells'
+
+
+def case_point_sampling(ctx, n):
+    stack = RasterStack(RASTER_DIR)
+    if not stack.layers:
+        return None
+    tif = next(iter(stack.layers.values())).tif
+    rng = np.random.default_rng(n)
+    x = tif.x0 + rng.uniform(0, tif.width * tif.res_x, n)
+    y = tif.y0 - rng.uniform(0, tif.height * tif.res_y, n)
+    return (lambda: stack.sample_xy(x, y)), n, 'points'
+
+
+CASES = {
+    'parse':             (case_parse, 'duration_s', LOG_DURATIONS),
+    'qc':                (case_qc, 'duration_s', LOG_DURATIONS),
+    'projection':        (case_projection, 'duration_s', LOG_DURATIONS),
+    'dop':               (case_dop, 'duration_s', LOG_DURATIONS),
+    'site_metrics':      (case_site_metrics, 'duration_s', LOG_DURATIONS),
+    'auc_exact':         (case_auc_exact, 'n_scores', AUC_SIZES),
+    'auc_streaming':     (case_auc_streaming, 'n_scores', AUC_SIZES),
+    'bootstrap':         (case_bootstrap, 'n_sites', BOOT_SITES),
+    'bootstrap_spatial': (case_bootstrap_spatial, 'n_sites', BOOT_SITES),
+    'permutation':       (case_permutation, 'n_sites', BOOT_SITES),
+    'raster_local_max':  (case_raster_local_max, 'grid_side', GRID_SIZES),
+    'point_sampling':    (case_point_sampling, 'n_points', POINT_SIZES),
+}
+
+
+def time_case(fn, repeat):
+    """1回目は読み込み・キャッシュの準備を含むので捨て、repeat 回の経過時間 [s] を返す"""
+    fn()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def compare(results, baseline_path):
+    """以前の結果ファイルとの比較 (best の比。1 より大きいほど遅くなった)"""
+    with open(baseline_path) as f:
+        base = {(r['case'], r['size']): r for r in json.load(f)['results']}
+    print(f"\n--- Compared with {baseline_path} (ratio = new / old) ---")
+    for r in results:
+        old = base.get((r['case'], r['size']))
+        if old:
+            ratio = r['best_s'] / old['best_s']
+            flag = '  SLOWER' if ratio > 1.2 else ('  faster' if ratio < 0.8 else '')
+            print(f"{r['case']:<18} {r['size']:>9} {ratio:6.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path のスケーリングベンチマーク (合成ログを使用)")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--quick', action='store_true', help="各ケースの小さい方の2つの大きさだけ実行")
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--n-boot', type=int, default=N_BOOT, help="bootstrap ケースの反復回数")
+    parser.add_argument('--sats', type=int, default=24, help="合成ログの衛星数")
+    parser.add_argument('--out', type=Path, default=None, help="結果の JSON (既定: experiments/benchmarks/bench_<時刻>.json)")
+    parser.add_argument('--compare', type=Path, default=None, help="以前の結果 JSON と比較する")
+    args = parser.parse_args()
+    warnings.filterwarnings('ignore')
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pnt_bench_') as work_dir:
+        ctx = Context(work_dir, args.sats, args.n_boot)
+        for name in args.cases:
+            func, size_name, sizes = CASES[name]
+            for size in (sizes[:2] if args.quick else sizes):
+                setup = func(ctx, size)
+                if setup is None:
+                    print(f"{name:<18} {size:>9}  skipped (input not available)")
+                    continue
+                fn, n_items, unit = setup
+                times = time_case(fn, args.repeat)
+                best = min(times)
+                results.append({
+                    'case': name, 'size_name': size_name, 'size': size,
+                    'n_items': int(n_items), 'unit': unit,
+                    'best_s': best, 'median_s': float(np.median(times)), 'times_s': times,
+                    'items_per_s': n_items / best if best > 0 else None,
+                })
+                print(f"{name:<18} {size:>9}  best {best * 1e3:10.2f} ms  "
+                      f"({n_items / best:,.0f} {unit}/s)")
+
+    out = args.out or OUTPUT_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    meta = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'repeat': args.repeat, 'n_boot': args.n_boot, 'n_sats': args.sats,
+    }
+    with open(out, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+    print(f"\nResults saved to {out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
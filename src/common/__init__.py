@@ -0,0 +1,6 @@
+"""
+Phase 1/2/3 のスクリプトと現場ツールで共有する処理をまとめたパッケージ。
+
+各スクリプトからは PROJECT_ROOT / 'src' を sys.path に追加して
+`from common.xxx import ...` の形で読み込む。
+"""
@@ -0,0 +1,171 @@
+"""
+ローカルのアルマナック (YUMA 形式) から衛星位置を求め、サイトごとの方位角・仰角に変換する。
+ネットワークには接続しない。
+
+YUMA 形式は GPS の標準アルマナック形式で、QZSS も同じ形式で配布されている。
+複数ファイル (GPS + QZSS など) を load_almanacs でまとめて読み込める。
+"""
+import re
+from pathlib import Path
+
+import numpy as np
+
+# WGS84 / IS-GPS-200 の定数
+GM = 3.986005e14              # 地球重力定数 [m^3/s^2]
+OMEGA_E = 7.2921151467e-5     # 地球自転角速度 [rad/s]
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WEEK_SEC = 604800.0
+
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "ns")
+GPS_UTC_LEAP_SECONDS = 18     # 2017年以降の GPS-UTC
+
+# ConstellationType (GNSS Logger の Status と同じ番号)
+CONSTELLATION_TYPES = {"GPS": 1, "GLONASS": 3, "QZSS": 4, "BEIDOU": 5, "GALILEO": 6}
+
+_YUMA_FIELDS = {
+    "id": "prn",
+    "health": "health",
+    "eccentricity": "e",
+    "time of applicability(s)": "toa",
+    "orbital inclination(rad)": "i0",
+    "rate of right ascen(r/s)": "omega_dot",
+    "sqrt(a) (m 1/2)": "sqrt_a",
+    "right ascen at week(rad)": "omega0",
+    "argument of perigee(rad)": "w",
+    "mean anom(rad)": "m0",
+    "week": "week",
+}
+
+
+def parse_yuma(path, constellation="GPS"):
+    """YUMA アルマナック 1ファイル -> 衛星ごとの軌道要素 (dict of ndarray)"""
+    records, cur = [], {}
+    with Path(path).open("r", encoding="utf-8", errors="ignore") as f:
+        for line in f:
+            if line.startswith("****"):
+                if cur:
+                    records.append(cur)
+                cur = {}
+                continue
+            key, sep, val = line.partition(":")
+            if not sep:
+                continue
+            name = _YUMA_FIELDS.get(re.sub(r"\s+", " ", key.strip().lower()))
+            if name:
+                cur[name] = float(val.strip())
+    if cur:
+        records.append(cur)
+
+    records = [r for r in records if len(r) == len(_YUMA_FIELDS)]
+    if not records:
+        raise ValueError(f"{path}: YUMA アルマナックのレコードが読み取れません")
+
+    alm = {k: np.array([r[k] for r in records]) for k in _YUMA_FIELDS.values()}
+    alm["prn"] = alm["prn"].astype(np.int16)
+    alm["week"] = alm["week"].astype(np.int64)
+    alm["constellation"] = np.full(len(records), CONSTELLATION_TYPES[constellation], dtype=np.uint8)
+    return alm
+
+
+def load_almanacs(paths, healthy_only=True):
+    """
+    複数の YUMA ファイルを連結する。paths は [path, ...] または [(path, constellation), ...]。
+    ファイル名に qzss を含む場合は QZSS として扱う。
+    """
+    parts = []
+    for p in paths:
+        path, const = (p, None) if isinstance(p, (str, Path)) else p
+        if const is None:
+            const = "QZSS" if "qzss" in Path(path).name.lower() else "GPS"
+        parts.append(parse_yuma(path, const))
+    alm = {k: np.concatenate([a[k] for a in parts]) for k in parts[0]}
+    if healthy_only:
+        keep = alm["health"] == 0
+        alm = {k: v[keep] for k, v in alm.items()}
+    return alm
+
+
+# ==========================================
+# 時刻
+# ==========================================
+def utc_to_gps_seconds(times):
+    """datetime64 (UTC) の配列 -> GPS 時刻 (1980-01-06 からの秒)"""
+    t = np.asarray(times, dtype="datetime64[ns]")
+    return (t - GPS_EPOCH).astype(np.int64) / 1e9 + GPS_UTC_LEAP_SECONDS
+
+
+# ==========================================
+# 衛星位置 (ECEF)
+# ==========================================
+def satellite_ecef(alm, gps_seconds):
+    """
+    アルマナックから衛星位置を伝搬する (IS-GPS-200 の手順)。
+    gps_seconds: (T,) -> 戻り値 (T, n_sat, 3) [m]
+    """
+    t = np.asarray(gps_seconds, dtype=float)[:, None]
+
+    # YUMA の週番号は 1024 週で巡回するので、予測時刻に最も近い週に合わせる
+    t_mid = float(np.median(t))
+    toa_abs = alm["week"] * WEEK_SEC + alm["toa"]
+    cycles = np.round((t_mid - toa_abs) / (1024 * WEEK_SEC))
+    toa_abs = toa_abs + cycles * 1024 * WEEK_SEC
+    tk = t - toa_abs[None, :]
+
+    a = alm["sqrt_a"] ** 2
+    e = alm["e"]
+    n0 = np.sqrt(GM / a ** 3)
+    M = alm["m0"] + n0 * tk
+
+    # ケプラー方程式 (Newton 法)
+    E = M.copy()
+    for _ in range(8):
+        E -= (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+
+    nu = np.arctan2(np.sqrt(1 - e ** 2) * np.sin(E), np.cos(E) - e)
+    phi = nu + alm["w"]
+    r = a * (1 - e * np.cos(E))
+    xp, yp = r * np.cos(phi), r * np.sin(phi)
+
+    omega = alm["omega0"] + (alm["omega_dot"] - OMEGA_E) * tk - OMEGA_E * alm["toa"]
+    cos_o, sin_o = np.cos(omega), np.sin(omega)
+    cos_i, sin_i = np.cos(alm["i0"]), np.sin(alm["i0"])
+    return np.stack([xp * cos_o - yp * cos_i * sin_o,
+                     xp * sin_o + yp * cos_i * cos_o,
+                     yp * sin_i], axis=-1)
+
+
+def geodetic_to_ecef(lat_deg, lon_deg, h=0.0):
+    lat, lon = np.radians(lat_deg), np.radians(lon_deg)
+    e2 = WGS84_F * (2 - WGS84_F)
+    n = WGS84_A / np.sqrt(1 - e2 * np.sin(lat) ** 2)
+    return np.stack([(n + h) * np.cos(lat) * np.cos(lon),
+                     (n + h) * np.cos(lat) * np.sin(lon),
+                     (n * (1 - e2) + h) * np.sin(lat)], axis=-1)
+
+
+def enu_rotation(lat_deg, lon_deg):
+    """ECEF -> ENU の回転行列 (P, 3, 3)"""
+    lat, lon = np.radians(lat_deg), np.radians(lon_deg)
+    sl, cl, so, co = np.sin(lat), np.cos(lat), np.sin(lon), np.cos(lon)
+    zero = np.zeros_like(lat)
+    return np.stack([
+        np.stack([-so, co, zero], axis=-1),
+        np.stack([-sl * co, -sl * so, cl], axis=-1),
+        np.stack([cl * co, cl * so, sl], axis=-1),
+    ], axis=-2)
+
+
+def azel(sat_ecef, lat_deg, lon_deg, h=0.0):
+    """
+    衛星位置 (T, n_sat, 3) とサイト (P,) -> 方位角・仰角 [deg] (P, T, n_sat)
+    全サイト × 全エポック × 全衛星を1回の配列演算で求める。
+    """
+    lat_deg, lon_deg = np.atleast_1d(lat_deg), np.atleast_1d(lon_deg)
+    site = geodetic_to_ecef(lat_deg, lon_deg, h)                       # (P, 3)
+    rot = enu_rotation(lat_deg, lon_deg)                               # (P, 3, 3)
+    d = sat_ecef[None, :, :, :] - site[:, None, None, :]               # (P, T, S, 3)
+    enu = np.einsum("pij,ptsj->ptsi", rot, d)
+    az = np.degrees(np.arctan2(enu[..., 0], enu[..., 1])) % 360.0
+    el = np.degrees(np.arctan2(enu[..., 2], np.hypot(enu[..., 0], enu[..., 1])))
+    return az, el
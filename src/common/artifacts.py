@@ -0,0 +1,151 @@
+"""
+段と段の受け渡しに使う型付きの列指向ファイル (Arrow IPC, 拡張子 .arrow)。
+
+  書き込み : スキーマの列を決まった型にそろえ (site_id は文字列にして前後の空白を除く)、
+             型が合わない列があれば ValueError にする。スキーマ名をファイルのメタデータに入れる
+  読み込み : memory_map で開き、必要な列だけを読む。
+             read_arrays は欠損の無い数値列をページキャッシュ上のバッファのまま (コピーせず) 読み取り専用の
+             ndarray で返す。read_artifact は DataFrame にするので列ごとにコピーする (文字列の列が要る場合用)
+
+CSV は人が読むための最終出力としてだけ書く (write_artifact(..., csv=True))。
+読み込み側は .arrow が無ければ同じ名前の .csv (旧構成の出力) を読み、同じスキーマで型をそろえる。
+"""
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+ARTIFACT_SUFFIX = '.arrow'
+SCHEMA_KEY = b'pnt.schema'
+
+# サイトごとの誤差・受信指標 (run_baseline.py の compute_site_metrics)
+SITE_METRICS = {
+    'site_id': pa.string(),
+    'err_p50_m': pa.float64(),
+    'err_p95_m': pa.float64(),
+    'n_fix': pa.int64(),
+    'duration': pa.float64(),
+    'used_sat_mean': pa.float64(),
+    'cn0_mean': pa.float64(),
+    'cn0_std': pa.float64(),
+    'elev_mean': pa.float64(),
+    'used_rate': pa.float64(),
+    'hdop_cut_a_median': pa.float64(),
+    'hdop_cut_b_median': pa.float64(),
+}
+
+# スキーマ名 -> 必須の列と型。ここに無い列はそのまま (推定された型で) 残す
+SCHEMAS = {
+    'site_metrics': SITE_METRICS,
+    # site_metrics + sites_risk.csv の列
+    'site_merged': {**SITE_METRICS, 'risk_proxy_5m': pa.float64()},
+    'dop_results': {
+        'site_id': pa.string(),
+        'hdop_cut_a_median': pa.float64(),
+        'hdop_cut_b_median': pa.float64(),
+        'valid_epochs': pa.int64(),
+    },
+}
+
+
+def artifact_path(path):
+    """path の拡張子を .arrow にしたもの"""
+    return Path(path).with_suffix(ARTIFACT_SUFFIX)
+
+
+def _conform(df, schema, strict=True):
+    """
+    スキーマの列を決まった型にした pa.Table (変換できない値は ValueError)。
+    strict=True なら足りない列も ValueError、False なら (旧構成の CSV 用) ある列だけそろえる。
+    """
+    fields = SCHEMAS[schema]
+    missing = [c for c in fields if c not in df.columns]
+    if missing and strict:
+        raise ValueError(f"{schema}: missing columns {missing}")
+    fields = {c: t for c, t in fields.items() if c in df.columns}
+    df = df.copy()
+    for c, t in fields.items():
+        if pa.types.is_string(t):
+            df[c] = df[c].astype(str).str.strip()
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        target = pa.schema([pa.field(f.name, fields.get(f.name, f.type)) for f in table.schema])
+        table = table.cast(target)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        raise ValueError(f"{schema}: {e}") from e
+    return table.replace_schema_metadata({SCHEMA_KEY: schema.encode()})
+
+
+def write_artifact(df, path, schema, csv=False):
+    """
+    df を path (.arrow) に書く (一時ファイルに書いてから置き換える)。
+    csv=True なら同じ名前の .csv も書く (人が読むための出力)。戻り値は .arrow のパス。
+    """
+    path = artifact_path(path)
+    table = _conform(df, schema)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    with pa.OSFile(str(tmp), 'wb') as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp, path)
+    if csv:
+        table.to_pandas().to_csv(path.with_suffix('.csv'), index=False)
+    return path
+
+
+def read_table(path, schema=None, columns=None):
+    """
+    .arrow を memory_map で開いて pa.Table を返す (columns を指定すればその列だけ)。
+    schema を指定すると、ファイルのスキーマ名が違う場合に ValueError。
+    """
+    source = pa.memory_map(str(path), 'r')
+    table = ipc.open_file(source).read_all()
+    found = (table.schema.metadata or {}).get(SCHEMA_KEY, b'').decode()
+    if schema is not None and found != schema:
+        raise ValueError(f"{path}: expected schema '{schema}', found '{found or 'none'}'")
+    return table.select(columns) if columns else table
+
+
+def _column_array(col):
+    """ChunkedArray -> ndarray。1チャンクで欠損の無い数値列はコピーしない (読み取り専用のビュー)"""
+    if col.num_chunks == 1 and col.null_count == 0 and (
+            pa.types.is_integer(col.type) or pa.types.is_floating(col.type)):
+        return col.chunk(0).to_numpy(zero_copy_only=True)
+    return col.to_numpy()
+
+
+def read_arrays(path, schema=None, columns=None):
+    """
+    段の出力を {列名: ndarray} で読む (数値列だけを使う集計用。DataFrame を作らない)。
+    .arrow があれば欠損の無い数値列はファイルのバッファのまま返す。.csv しか無ければ read_artifact と同じく読んでから変換する。
+    """
+    arrow = artifact_path(path)
+    if arrow.exists():
+        table = read_table(arrow, schema, columns)
+        return {name: _column_array(table.column(name)) for name in table.column_names}
+    df = read_artifact(path, schema, columns)
+    return {c: df[c].to_numpy() for c in df.columns}
+
+
+def read_artifact(path, schema=None, columns=None):
+    """
+    段の出力を DataFrame で読む (列はコピーされる)。path は .arrow / .csv のどちらでもよく、.arrow があればそちらを読む。
+    .csv しか無ければ (旧構成) 読み込んだあと、schema の列のうち CSV にある列の型をそろえる。
+    """
+    path = Path(path)
+    arrow = artifact_path(path)
+    if arrow.exists():
+        return read_table(arrow, schema, columns).to_pandas()
+    df = pd.read_csv(path.with_suffix('.csv'))
+    if schema is not None:
+        df = _conform(df, schema, strict=False).to_pandas()
+    return df[columns] if columns else df
+
+
+def artifact_exists(path):
+    """.arrow か (旧構成の) .csv があるか"""
+    path = Path(path)
+    return artifact_path(path).exists() or path.with_suffix('.csv').exists()
@@ -0,0 +1,157 @@
+"""
+AUC (ROC 曲線下面積) の計算。sklearn を読み込まずに使える軽い実装。
+
+  auc_score   : Mann–Whitney の U 統計量 (同順位は平均順位) から AUC を求める。roc_auc_score と同じ値
+  batched_auc : (リサンプル数, 件数) の行列の各行の AUC をまとめて計算する (ブートストラップ用)。
+                NaN のスコアはその行の計算から除く
+  paired_permutation_test : 同じサイトの2つのスコアを入れ替える並べ替え検定 (AUC(a) - AUC(b))
+
+並べ替え検定: 2つのスコアはそれぞれ順位 / 件数 に変換して尺度をそろえ、サイトごとに入れ替える。
+入れ替えの符号 σ_i (+1: そのまま, -1: 入れ替え) に対して AUC の差は D(σ) = σ·w と線形になる
+(陽性 i・陰性 j の組の寄与が σ_i と σ_j の一次式になるため)。w は searchsorted で O(n log n) で求まり、
+並べ替え1回は内積1回で済む。サイト数が少なければ 2^n 通りをすべて数える (正確な検定)。
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+EXACT_MAX_SITES = 20        # この件数以下なら 2^n 通りをすべて数える
+PERM_CHUNK_ELEMS = 1 << 22  # 一度に作る符号の行列の要素数 (並べ替えの数 × 件数、約 32 MB)
+
+
+def _row_ranks(v):
+    """各行の 1 始まりの順位 (同じ値には平均順位)"""
+    n = v.shape[1]
+    order = np.argsort(v, axis=1, kind='stable')
+    sv = np.take_along_axis(v, order, axis=1)
+    pos = np.arange(n)
+    # 同じ値の区間の先頭・末尾の位置
+    is_first = np.ones(sv.shape, dtype=bool)
+    is_first[:, 1:] = sv[:, 1:] != sv[:, :-1]
+    is_last = np.ones(sv.shape, dtype=bool)
+    is_last[:, :-1] = is_first[:, 1:]
+    first = np.maximum.accumulate(np.where(is_first, pos, 0), axis=1)
+    last = np.minimum.accumulate(np.where(is_last, pos, n - 1)[:, ::-1], axis=1)[:, ::-1]
+    ranks = np.empty(sv.shape)
+    np.put_along_axis(ranks, order, (first + last) / 2.0 + 1, axis=1)
+    return ranks
+
+
+def batched_auc(y, s):
+    """
+    y: (B, n) の 0/1 ラベル, s: (B, n) のスコア (大きいほど陽性らしい、NaN は除く)。
+    戻り値は (B,) の AUC。陽性・陰性のどちらかが無い行は nan。
+    """
+    y = np.asarray(y).astype(bool)
+    s = np.asarray(s, dtype=float)
+    valid = ~np.isnan(s)
+    # 欠損は最大の値として並べる (有効な値の順位は変わらない)
+    ranks = _row_ranks(np.where(valid, s, np.inf))
+    pos = y & valid
+    n_pos = pos.sum(axis=1)
+    n_neg = (valid & ~y).sum(axis=1)
+    u = np.where(pos, ranks, 0.0).sum(axis=1) - n_pos * (n_pos + 1) / 2.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        auc = u / (n_pos * n_neg)
+    auc[(n_pos == 0) | (n_neg == 0)] = np.nan
+    return auc
+
+
+def auc_score(y, s):
+    """
+    y: 0/1 (True/False) のラベル, s: スコア (大きいほど陽性らしい)。
+    陽性・陰性のどちらかが無ければ nan。
+    """
+    return float(batched_auc(np.asarray(y)[None, :], np.asarray(s, dtype=float)[None, :])[0])
+
+
+def _greater_count(x, ref_sorted):
+    """x の各値について、ref の中で x より小さい件数 + 同じ値の件数 / 2 (= Σ_j h(x, ref_j))"""
+    lo = np.searchsorted(ref_sorted, x, side='left')
+    hi = np.searchsorted(ref_sorted, x, side='right')
+    return lo + (hi - lo) / 2.0
+
+
+def swap_weights(y, a, b):
+    """
+    入れ替えの符号 σ に対して AUC(a') - AUC(b') = σ·w となる w (a, b は同じ尺度のスコア)。
+    h(u, v) = [u > v] + [u = v] / 2 として
+      陽性 i : w_i = Σ_j∈陰性 [h(a_i,a_j) + h(a_i,b_j) - h(b_i,a_j) - h(b_i,b_j)] / (2PN)
+      陰性 j : w_j = Σ_i∈陽性 [h(a_i,a_j) + h(b_i,a_j) - h(a_i,b_j) - h(b_i,b_j)] / (2PN)
+    """
+    y = np.asarray(y).astype(bool)
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    ap, bp, an, bn = a[y], b[y], a[~y], b[~y]
+    n_pos, n_neg = len(ap), len(an)
+    w = np.zeros(len(y))
+    an_s, bn_s = np.sort(an), np.sort(bn)
+    w[y] = (_greater_count(ap, an_s) + _greater_count(ap, bn_s)
+            - _greater_count(bp, an_s) - _greater_count(bp, bn_s))
+    # 陰性側: Σ_i h(x_i, v) = 陽性の件数 - Σ_i h(v, x_i)
+    ap_s, bp_s = np.sort(ap), np.sort(bp)
+    w[~y] = ((n_pos - _greater_count(an, ap_s)) + (n_pos - _greater_count(an, bp_s))
+             - (n_pos - _greater_count(bn, ap_s)) - (n_pos - _greater_count(bn, bp_s)))
+    return w / (2.0 * n_pos * n_neg)
+
+
+def _count_at_least(w, d_obs, n_perm, seed):
+    """ランダムな符号 n_perm 回のうち σ·w >= d_obs となった回数 (プロセスごとの分担分)"""
+    rng = np.random.default_rng(seed)
+    chunk = max(1, PERM_CHUNK_ELEMS // len(w))
+    count = 0
+    for start in range(0, n_perm, chunk):
+        m = min(chunk, n_perm - start)
+        sigma = 1.0 - 2.0 * rng.integers(0, 2, (m, len(w)), dtype=np.int8)
+        count += int(np.count_nonzero(sigma @ w >= d_obs))
+    return count
+
+
+def _exact_count(w, d_obs):
+    """2^n 通りの符号すべてについて σ·w >= d_obs となる数"""
+    n = len(w)
+    chunk = max(1, PERM_CHUNK_ELEMS // n)
+    count = 0
+    for start in range(0, 1 << n, chunk):
+        codes = np.arange(start, min(start + chunk, 1 << n), dtype=np.int64)
+        sigma = 1.0 - 2.0 * ((codes[:, None] >> np.arange(n)) & 1)
+        count += int(np.count_nonzero(sigma @ w >= d_obs))
+    return count
+
+
+def paired_permutation_test(y, a, b, n_perm=100_000, seed=0, workers=1, exact_max=EXACT_MAX_SITES):
+    """
+    H0: 各サイトで a と b のスコアは入れ替え可能。対立仮説: AUC(a) > AUC(b) (片側)。
+    a, b は大きいほど陽性らしい向きにそろえておく。NaN を含むサイトは除く。
+    戻り値は {'diff', 'p_value', 'n_perm', 'exact', 'n_sites'}。
+    workers > 1 なら並べ替えをプロセスに分けて数える。
+    """
+    y = np.asarray(y).astype(bool)
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    ok = ~np.isnan(a) & ~np.isnan(b)
+    y, a, b = y[ok], a[ok], b[ok]
+    n = len(y)
+    if y.all() or not y.any():
+        return {'diff': float('nan'), 'p_value': float('nan'), 'n_perm': 0, 'exact': False, 'n_sites': n}
+
+    # 尺度をそろえる (順位 / 件数)
+    ra = _row_ranks(a[None, :])[0] / n
+    rb = _row_ranks(b[None, :])[0] / n
+    w = swap_weights(y, ra, rb)
+    d_obs = float(w.sum())
+    tol = 1e-12 * max(1.0, abs(d_obs))
+
+    if n <= exact_max:
+        count = _exact_count(w, d_obs - tol)
+        return {'diff': d_obs, 'p_value': count / float(1 << n), 'n_perm': 1 << n, 'exact': True, 'n_sites': n}
+
+    workers = max(1, min(workers or os.cpu_count() or 1, n_perm))
+    seeds = np.random.SeedSequence(seed).spawn(workers)
+    shares = [n_perm // workers + (k < n_perm % workers) for k in range(workers)]
+    if workers == 1:
+        count = _count_at_least(w, d_obs - tol, n_perm, seeds[0])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            count = sum(ex.map(_count_at_least, [w] * workers, [d_obs - tol] * workers, shares, seeds))
+    # 観測値そのものを1回に数える (p が 0 にならない Monte Carlo の p 値)
+    return {'diff': d_obs, 'p_value': (count + 1) / (n_perm + 1), 'n_perm': n_perm, 'exact': False, 'n_sites': n}
@@ -0,0 +1,128 @@
+"""
+コンステレーション・信号ごとの内訳と、コンステレーションの組み合わせごとの DOP。
+
+内訳: (ConstellationType, 周波数帯) のコードで観測を1回だけグループ化 (np.unique + bincount) し、
+      観測数・使用数・Cn0 の平均/標準偏差をまとめて求める。
+DOP : 方位角・仰角・時刻系の (エポック, 衛星) 配列を1度だけ作り、組み合わせはマスクだけを変えて
+      (組み合わせ, エポック, 衛星) の1回の batched_dop で計算する。時刻系はコンステレーションごとに分ける
+      (GPS と QZSS・SBAS は同じ時刻系とみなす)。同じ衛星の複数の周波数帯の信号は同じ視線なので、
+      エポックごとに衛星1つにつき1行 (L1 帯を優先) だけを使う。
+"""
+import numpy as np
+import pandas as pd
+
+from common.dop import batched_dop
+from common.sat_tracks import frequency_band
+
+# Android GnssStatus の ConstellationType
+CONSTELLATIONS = {0: 'UNKNOWN', 1: 'GPS', 2: 'SBAS', 3: 'GLONASS', 4: 'QZSS', 5: 'BEIDOU', 6: 'GALILEO', 7: 'IRNSS'}
+BAND_NAMES = {-1: 'unknown', 0: 'L1', 1: 'L5', 2: 'other'}
+
+# 時刻系 (幾何行列の時刻列) の割り当て
+CLOCK_GROUP = np.array([5, 0, 0, 1, 0, 2, 3, 4])   # ConstellationType -> 時刻系番号
+N_CLOCKS = 6
+
+# DOP を計算するコンステレーションの組み合わせ (None は全衛星)
+SUBSETS = {
+    'ALL': None,
+    'GPS': (1,),
+    'GPS+QZSS': (1, 4),
+    'GALILEO': (6,),
+    'BEIDOU': (5,),
+    'GLONASS': (3,),
+    'GPS+QZSS+GALILEO': (1, 4, 6),
+}
+
+
+def signal_stats(status):
+    """
+    StatusStore -> コンステレーション × 周波数帯ごとの観測数・使用数・Cn0 統計 (DataFrame)。
+    band='ALL' の行はコンステレーション全体。
+    """
+    const = status.constellation.astype(np.int64)
+    band = frequency_band(status.carrier_hz).astype(np.int64)
+    used = status.used
+    cn0 = status.cn0.astype(float)
+    n_ep = max(status.n_epochs, 1)
+
+    rows = []
+    for by_band in (True, False):
+        code = const * 4 + (band + 1) if by_band else const
+        keys, g = np.unique(code, return_inverse=True)
+        g = g.ravel()
+        n = len(keys)
+        ok = ~np.isnan(cn0)
+        cnt = np.bincount(g[ok], minlength=n)
+        s1 = np.bincount(g[ok], cn0[ok], n)
+        s2 = np.bincount(g[ok], cn0[ok] ** 2, n)
+        ou = ok & used
+        cnt_u = np.bincount(g[ou], minlength=n)
+        s1_u = np.bincount(g[ou], cn0[ou], n)
+        n_obs = np.bincount(g, minlength=n)
+        n_used = np.bincount(g, used, n)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = s1 / cnt
+            std = np.sqrt(np.maximum(s2 - cnt * mean ** 2, 0) / (cnt - 1))
+            mean_u = s1_u / cnt_u
+        for i, key in enumerate(keys):
+            c = key // 4 if by_band else key
+            rows.append({
+                'constellation': CONSTELLATIONS.get(int(c), str(c)),
+                'band': BAND_NAMES[int(key % 4) - 1] if by_band else 'ALL',
+                'n_obs': int(n_obs[i]), 'n_used': int(n_used[i]),
+                'used_per_epoch': n_used[i] / n_ep,
+                'used_rate': n_used[i] / n_obs[i] if n_obs[i] else np.nan,
+                'cn0_mean': mean[i], 'cn0_std': std[i], 'cn0_used_mean': mean_u[i],
+            })
+    return pd.DataFrame(rows).sort_values(['constellation', 'band'], ignore_index=True)
+
+
+def one_signal_per_satellite(status):
+    """観測ごとの bool。エポック内の同じ衛星 (ConstellationType, Svid) の信号のうち1つ (L1 帯を優先) だけ True"""
+    epoch = np.repeat(np.arange(status.n_epochs), status.counts)
+    sat = (status.constellation.astype(np.int64) << 16) | (status.svid.astype(np.int64) & 0xFFFF)
+    not_l1 = frequency_band(status.carrier_hz) != 0
+    order = np.lexsort((not_l1, sat, epoch))
+    e, s = epoch[order], sat[order]
+    first = np.r_[True, (e[1:] != e[:-1]) | (s[1:] != s[:-1])] if len(order) else np.zeros(0, dtype=bool)
+    keep = np.empty(len(order), dtype=bool)
+    keep[order] = first
+    return keep
+
+
+def subset_dop(status, subsets=None, min_el=5.0):
+    """
+    StatusStore -> 組み合わせごとの DOP の要約 (DataFrame)。
+    全組み合わせ・全エポックを1回の batched_dop で計算する (時刻系はコンステレーションごと)。
+    n_sats_mean は使った衛星の数 (信号の数ではない)。
+    """
+    subsets = SUBSETS if subsets is None else subsets
+    names = list(subsets)
+    if status.n_epochs == 0:
+        return pd.DataFrame({'subset': names})
+
+    az = status.padded(status.az)
+    el = status.padded(status.el)
+    const = status.padded(status.constellation, fill=0).astype(np.int64)
+    clock = CLOCK_GROUP[np.clip(const, 0, len(CLOCK_GROUP) - 1)]
+    one = status.padded(one_signal_per_satellite(status), fill=0) > 0
+    with np.errstate(invalid='ignore'):
+        base = (el >= min_el) & one
+
+    masks = np.stack([base if subsets[n] is None else base & np.isin(const, subsets[n]) for n in names])
+    shape = masks.shape
+    res = batched_dop(np.broadcast_to(az, shape), np.broadcast_to(el, shape), masks,
+                      clock=np.broadcast_to(clock, shape), n_clocks=N_CLOCKS)
+
+    rows = []
+    for i, name in enumerate(names):
+        hdop, pdop = res['hdop'][i], res['pdop'][i]
+        valid = ~np.isnan(hdop)
+        rows.append({
+            'subset': name,
+            'availability': valid.mean(),  # DOP が計算できたエポックの割合
+            'n_sats_mean': res['n_sats'][i].mean(),
+            'hdop_median': np.median(hdop[valid]) if valid.any() else np.nan,
+            'pdop_median': np.median(pdop[valid]) if valid.any() else np.nan,
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,200 @@
+"""
+DOP (Dilution of Precision) の計算。
+
+視線ベクトル (E, N, U) と時刻誤差項 1 からなる幾何行列 G の (GᵀG)⁻¹ を、
+任意の形 (..., n_sat) の方位角・仰角配列に対してまとめて計算する。
+"""
+import numpy as np
+
+MIN_SATS = 4  # 衛星が4機未満なら測位不能
+MAX_COND = 1e10  # 正規行列の条件数がこれ以上なら特異とみなす (同じ視線の衛星が重なった場合など)
+
+
+def los_enu(az_deg, el_deg):
+    """方位角 (北基準時計回り)・仰角 [deg] -> 視線ベクトル (..., 3) (East, North, Up)"""
+    az = np.radians(az_deg)
+    el = np.radians(el_deg)
+    cos_el = np.cos(el)
+    return np.stack([cos_el * np.sin(az), cos_el * np.cos(az), np.sin(el)], axis=-1)
+
+
+def batched_dop(az_deg, el_deg, mask=None, clock=None, n_clocks=None):
+    """
+    エポック (やサイト×エポック) ごとの DOP をまとめて計算する。
+
+    az_deg, el_deg : (..., n_sat) の配列。衛星数が揃わない場合は NaN で埋める
+    mask           : (..., n_sat) の bool。False の衛星は使わない (仰角マスク等)
+    clock          : (..., n_sat) の int (0 .. n_clocks-1)。衛星ごとの時刻系 (コンステレーション間バイアス)。
+                     None なら時刻誤差項は1つ。複数の時刻系は幾何行列の時刻列を分けて扱う
+    戻り値         : dict (hdop, vdop, pdop, gdop, n_sats)。各 (...) の形。
+                     使用衛星が (3 + 使われた時刻系の数) 機未満・特異 (条件数 MAX_COND 以上) のエポックは NaN
+    """
+    az = np.asarray(az_deg, dtype=float)
+    el = np.asarray(el_deg, dtype=float)
+    use = ~(np.isnan(az) | np.isnan(el))
+    if mask is not None:
+        use &= np.asarray(mask, dtype=bool)
+
+    if clock is None:
+        clock_cols = np.ones(az.shape + (1,))
+    else:
+        clock = np.asarray(clock, dtype=np.int64)
+        n_clocks = int(n_clocks or clock.max() + 1)
+        clock_cols = (clock[..., None] == np.arange(n_clocks)).astype(float)
+    k = 3 + clock_cols.shape[-1]
+
+    G = np.concatenate([los_enu(np.where(use, az, 0.0), np.where(use, el, 0.0)), clock_cols], axis=-1)
+    G *= use[..., None]
+
+    # 正規行列 N = G^T G (..., k, k)
+    N = np.einsum("...si,...sj->...ij", G, G)
+    n_sats = use.sum(axis=-1)
+
+    # 衛星が1機も無い時刻系の列は 0 になるので、対角を 1 にして外す (位置の成分には影響しない)
+    clock_diag = np.diagonal(N, axis1=-2, axis2=-1)[..., 3:]
+    active = clock_diag > 0
+    idx = np.arange(3, k)
+    N[..., idx, idx] = np.where(active, clock_diag, 1.0)
+
+    ok = n_sats >= np.maximum(MIN_SATS, 3 + active.sum(axis=-1))
+    N[~ok] = np.eye(k)
+    # 逆行列は求まっても、特異に近いと DOP が桁違いに大きくなるだけなので外す
+    with np.errstate(invalid="ignore", divide="ignore", over="ignore"):
+        ok &= np.linalg.cond(N) < MAX_COND
+    N[~ok] = np.eye(k)
+
+    try:
+        Q = np.linalg.inv(N)
+    except np.linalg.LinAlgError:
+        # 特異行列が混ざっている場合だけエポックごとに解き直す
+        Q = np.empty_like(N)
+        flat_N, flat_Q, flat_ok = N.reshape(-1, k, k), Q.reshape(-1, k, k), ok.reshape(-1)
+        for i in range(len(flat_N)):
+            try:
+                flat_Q[i] = np.linalg.inv(flat_N[i])
+            except np.linalg.LinAlgError:
+                flat_Q[i] = np.nan
+                flat_ok[i] = False
+
+    d = np.diagonal(Q, axis1=-2, axis2=-1)
+    with np.errstate(invalid="ignore"):
+        res = {
+            "hdop": np.sqrt(d[..., 0] + d[..., 1]),
+            "vdop": np.sqrt(d[..., 2]),
+            "pdop": np.sqrt(d[..., 0] + d[..., 1] + d[..., 2]),
+            "gdop": np.sqrt(d[..., :3].sum(axis=-1) + np.where(active, d[..., 3:], 0.0).sum(axis=-1)),
+        }
+    for key in res:
+        res[key] = np.where(ok, res[key], np.nan)
+    res["n_sats"] = n_sats
+    return res
+
+
+# ==========================================
+# 逐次更新 (高レートログ・リアルタイム用)
+# ==========================================
+REFRESH_EVERY = 200      # この回数の rank-1 更新ごとに正規行列から逆行列を作り直す
+MAX_DRIFT_DEG = 0.5      # 保持中の衛星の方位角・仰角がこれ以上ずれたら入れ替える
+MIN_DENOM = 1e-8         # Sherman–Morrison の分母がこれ以下なら作り直す (特異に近い)
+
+
+class IncrementalDOP:
+    """
+    エポック間で衛星の出入りだけを Sherman–Morrison の rank-1 更新で反映する DOP。
+
+    衛星ごとに幾何行 g = (E, N, U, 1) を保持し、正規行列 N = Σ g gᵀ とその逆行列 Q を持ち回る。
+      追加: Q ← Q − (Q g)(Q g)ᵀ / (1 + gᵀ Q g)
+      削除: Q ← Q + (Q g)(Q g)ᵀ / (1 − gᵀ Q g)
+    幾何のゆっくりした変化は、ずれが MAX_DRIFT_DEG を超えた衛星だけ削除+追加で入れ替えて追従する。
+    丸め誤差は REFRESH_EVERY 回ごとの N からの作り直しでリセットする。
+    """
+
+    def __init__(self, min_el=None, refresh_every=REFRESH_EVERY, max_drift_deg=MAX_DRIFT_DEG):
+        self.min_el = min_el
+        self.refresh_every = refresh_every
+        self.max_drift_deg = max_drift_deg
+        self.sats = {}             # key -> (az, el, g)
+        self.N = np.zeros((4, 4))
+        self.Q = None              # 衛星が MIN_SATS 機未満・特異のときは None
+        self._since_refresh = 0
+        self.n_rank1 = 0           # 統計: rank-1 更新の回数
+        self.n_refresh = 0         # 統計: 逆行列を作り直した回数
+
+    @staticmethod
+    def _row(az, el):
+        return np.r_[los_enu(az, el), 1.0]
+
+    def _refresh(self):
+        self._since_refresh = 0
+        self.n_refresh += 1
+        self.Q = None
+        if len(self.sats) >= MIN_SATS:
+            G = np.array([g for _, _, g in self.sats.values()])
+            self.N = G.T @ G
+            try:
+                self.Q = np.linalg.inv(self.N)
+            except np.linalg.LinAlgError:
+                self.Q = None
+        else:
+            self.N = np.zeros((4, 4))
+            for _, _, g in self.sats.values():
+                self.N += np.outer(g, g)
+
+    def _rank1(self, g, sign):
+        """sign=+1 で追加、-1 で削除。逆行列が使えなければ False"""
+        self.N += sign * np.outer(g, g)
+        if self.Q is None:
+            return False
+        Qg = self.Q @ g
+        denom = 1.0 + sign * (g @ Qg)
+        if abs(denom) < MIN_DENOM:
+            return False
+        self.Q -= sign * np.outer(Qg, Qg) / denom
+        self.n_rank1 += 1
+        self._since_refresh += 1
+        return True
+
+    def update(self, keys, az_deg, el_deg):
+        """
+        1エポック分の衛星 (キーは Svid 等の識別子) を与え、DOP の dict を返す
+        (batched_dop の1エポック分と同じキー: hdop, vdop, pdop, gdop, n_sats)。
+        """
+        az = np.asarray(az_deg, dtype=float)
+        el = np.asarray(el_deg, dtype=float)
+        use = ~(np.isnan(az) | np.isnan(el))
+        if self.min_el is not None:
+            use &= el >= self.min_el
+        current = {k: (a, e) for k, a, e, u in zip(keys, az, el, use) if u}
+
+        ok = self.Q is not None
+        for k in [k for k in self.sats if k not in current]:
+            ok &= self._rank1(self.sats.pop(k)[2], -1)
+        for k, (a, e) in current.items():
+            old = self.sats.get(k)
+            if old is not None:
+                if abs(old[1] - e) <= self.max_drift_deg and \
+                        abs((old[0] - a + 180.0) % 360.0 - 180.0) <= self.max_drift_deg:
+                    continue
+                ok &= self._rank1(old[2], -1)
+            g = self._row(a, e)
+            self.sats[k] = (a, e, g)
+            ok &= self._rank1(g, +1)
+
+        # 衛星が4機未満から戻ったとき・分母が小さかったとき・定期的に作り直す
+        if not ok or self._since_refresh >= self.refresh_every:
+            self._refresh()
+        return self.dop()
+
+    def dop(self):
+        n = len(self.sats)
+        if self.Q is None or n < MIN_SATS:
+            return {"hdop": np.nan, "vdop": np.nan, "pdop": np.nan, "gdop": np.nan, "n_sats": n}
+        d = np.diagonal(self.Q)
+        with np.errstate(invalid="ignore"):
+            return {
+                "hdop": float(np.sqrt(d[0] + d[1])),
+                "vdop": float(np.sqrt(d[2])),
+                "pdop": float(np.sqrt(d[0] + d[1] + d[2])),
+                "gdop": float(np.sqrt(d.sum())),
+                "n_sats": n,
+            }
@@ -0,0 +1,88 @@
+"""
+Fix と Status を UnixTimeMillis で突き合わせ、エポック単位の特徴量テーブルを作る。
+
+Status は StatusStore (エポックごとの連続区間) にして、bincount / reduceat と
+batched_dop でまとめて集計する。Fix との結合はソート済み同士の merge_asof で行う。
+"""
+import numpy as np
+import pandas as pd
+
+from common.skyline import horizon_mask
+from common.status_store import StatusStore
+
+HDOP_MIN_EL = 5.0          # Cut-A と同じ仰角マスク
+MERGE_TOLERANCE_MS = 500   # Fix と Status の時刻ずれの許容値 (1 Hz ログの半周期)
+
+EPOCH_DTYPES = {
+    'UnixTimeMillis': 'int64',
+    'err_h_m': 'float32',
+    'accuracy_m': 'float32',
+    'n_tracked': 'int16',
+    'n_used': 'int16',
+    'cn0_mean': 'float32',
+    'cn0_min': 'float32',
+    'hdop': 'float32',
+    'nlos_frac': 'float32',
+}
+
+
+def status_epoch_metrics(status, horizon_profile=None):
+    """Status (StatusStore または read_log_tables の DataFrame) -> エポックごとの衛星数・Cn0・HDOP・NLoS 率"""
+    if not isinstance(status, StatusStore):
+        status = StatusStore.from_frame(status)
+    n_ep = status.n_epochs
+    ep = status.epoch_of
+
+    used = status.used
+    az = status.az.astype(float)
+    el = status.el.astype(float)
+
+    n_used = status.per_epoch_sum(used)
+    cn0_used = np.where(used, status.cn0, np.nan)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Cn0 が空の信号は平均に入れない (Phase 1 の df_used['Cn0DbHz'].mean() と同じ)
+        cn0_mean = status.per_epoch_sum(np.nan_to_num(cn0_used)) / status.per_epoch_sum(~np.isnan(cn0_used))
+    cn0_min = np.fmin.reduceat(cn0_used, status.offsets[:-1]) if n_ep else np.zeros(0)
+
+    hdop = status.dop(HDOP_MIN_EL)['hdop']
+
+    # 建物の水平線より下に見える信号を NLoS とみなす
+    if horizon_profile is not None and n_ep:
+        above = el >= 0
+        blocked = above & ~horizon_mask(az[None, :], el[None, :], np.asarray(horizon_profile)[None, :])[0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            nlos_frac = np.bincount(ep, blocked, n_ep) / np.bincount(ep, above, n_ep)
+    else:
+        nlos_frac = np.full(n_ep, np.nan)
+
+    return pd.DataFrame({
+        'UnixTimeMillis': status.times, 'n_tracked': status.counts, 'n_used': n_used,
+        'cn0_mean': cn0_mean, 'cn0_min': cn0_min, 'hdop': hdop, 'nlos_frac': nlos_frac,
+    })
+
+
+def build_epoch_table(df_fix, df_status, site_id, transformer, horizon_profile=None,
+                      tolerance_ms=MERGE_TOLERANCE_MS):
+    """
+    1サイト分の Fix / Status -> エポック単位のテーブル。
+    err_h_m は calculate_projected_error と同じく、投影後の中央値位置からの水平距離。
+    """
+    fx = df_fix.dropna(subset=['UnixTimeMillis', 'LatitudeDegrees', 'LongitudeDegrees'])
+    fx = fx.sort_values('UnixTimeMillis', kind='stable')
+    xx, yy = transformer.transform(fx['LongitudeDegrees'].values, fx['LatitudeDegrees'].values)
+    err = np.hypot(xx - np.median(xx), yy - np.median(yy)) if len(fx) else np.zeros(0)
+
+    left = pd.DataFrame({
+        'UnixTimeMillis': fx['UnixTimeMillis'].to_numpy(np.int64),
+        'err_h_m': err,
+        'accuracy_m': fx['AccuracyMeters'].to_numpy(float),
+    })
+    right = status_epoch_metrics(df_status, horizon_profile)
+    df = pd.merge_asof(left, right, on='UnixTimeMillis', direction='nearest', tolerance=tolerance_ms)
+
+    # Status が対応しないエポックの衛星数は 0
+    for c in ('n_tracked', 'n_used'):
+        df[c] = df[c].fillna(0)
+    df = df.astype(EPOCH_DTYPES)
+    df.insert(0, 'site_id', site_id)
+    return df
@@ -0,0 +1,246 @@
+"""
+長時間ログ向けの水平誤差統計 (メモリ一定・マージ可能)。
+
+QuantileSketch は DDSketch と同じ対数バケットのスケッチで、分位点を相対誤差 rel_acc 以内で返す。
+バケット配置が同じスケッチ同士は件数を足すだけでマージできる (チャンク間・ファイル間・プロセス間)。
+
+ProjectedErrorStats は calculate_projected_error (run_baseline.py) を2パスに分けたもの。
+  1パス目: 基準点 ref からの dx, dy をスケッチし、その中央値で中心を決める
+           (ref を指定しなければ最初のチャンクの中央値を REF_GRID_M の格子に丸めた点。
+            同じサイトの別ファイルもふつうは同じ ref になり、マージで dx, dy がずれない)
+  2パス目: 中心からの水平距離をスケッチし、p50 / p95 / p99 を返す
+dx, dy の誤差は rel_acc * |dx| なので、ref はデータの近くに置く (遠いと中心がその分ずれる)。
+"""
+import numpy as np
+
+REL_ACCURACY = 0.005   # 分位点の相対誤差 (0.5%)
+MIN_VALUE = 1e-4       # これより小さい絶対値は 0 として数える [m]
+MAX_VALUE = 1e7        # これより大きい値は最上位のバケットに入れる [m]
+PERCENTILES = (50, 95, 99)
+REF_GRID_M = 10.0      # 既定の基準点を丸める格子 [m]
+
+
+class QuantileSketch:
+    def __init__(self, rel_acc=REL_ACCURACY, min_value=MIN_VALUE, max_value=MAX_VALUE):
+        self.rel_acc, self.min_value, self.max_value = float(rel_acc), float(min_value), float(max_value)
+        self.gamma = (1 + self.rel_acc) / (1 - self.rel_acc)
+        self._log_gamma = np.log(self.gamma)
+        # バケット k は (gamma^(k-1), gamma^k] を受け持つ
+        self.k0 = int(np.floor(np.log(self.min_value) / self._log_gamma))
+        self.n_keys = int(np.ceil(np.log(self.max_value) / self._log_gamma)) - self.k0 + 1
+        self.pos = np.zeros(self.n_keys, dtype=np.int64)
+        self.neg = np.zeros(self.n_keys, dtype=np.int64)
+        self.zero = 0
+        self.count = 0
+        self.min, self.max = np.inf, -np.inf
+
+    def _keys(self, a):
+        k = np.ceil(np.log(a) / self._log_gamma).astype(np.int64) - self.k0
+        return np.clip(k, 0, self.n_keys - 1)
+
+    def update(self, values):
+        v = np.asarray(values, dtype=float).ravel()
+        v = v[np.isfinite(v)]
+        if not len(v):
+            return self
+        a = np.abs(v)
+        small = a < self.min_value
+        self.zero += int(small.sum())
+        p, n = (v > 0) & ~small, (v < 0) & ~small
+        self.pos += np.bincount(self._keys(a[p]), minlength=self.n_keys)
+        self.neg += np.bincount(self._keys(a[n]), minlength=self.n_keys)
+        self.count += len(v)
+        self.min, self.max = min(self.min, float(v.min())), max(self.max, float(v.max()))
+        return self
+
+    def _layout(self):
+        return self.rel_acc, self.min_value, self.max_value
+
+    def merge(self, other):
+        if self._layout() != other._layout():
+            raise ValueError("QuantileSketch.merge: bucket layout differs")
+        self.pos += other.pos
+        self.neg += other.neg
+        self.zero += other.zero
+        self.count += other.count
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        return self
+
+    def mapped(self, func):
+        """
+        各バケットの代表値を単調増加の関数 func で移したスケッチを返す (元の値は持っていないので、
+        移した後の値の誤差は代表値の誤差 rel_acc * |値| 程度になる)
+        """
+        out = type(self)(self.rel_acc, self.min_value, self.max_value)
+        if self.count == 0:
+            return out
+        vals, counts = self._sorted_buckets()
+        v = np.asarray(func(np.clip(vals, self.min, self.max)), dtype=float)
+        a = np.abs(v)
+        small = a < out.min_value
+        p, n = (v > 0) & ~small, (v < 0) & ~small
+        out.zero = int(counts[small].sum())
+        np.add.at(out.pos, out._keys(a[p]), counts[p])
+        np.add.at(out.neg, out._keys(a[n]), counts[n])
+        out.count = self.count
+        out.min, out.max = (float(m) for m in func(np.array([self.min, self.max])))
+        return out
+
+    def _sorted_buckets(self):
+        """(代表値, 件数) を値の昇順で返す。代表値は相対誤差 rel_acc 以内"""
+        rep = 2 * self.gamma ** (np.arange(self.n_keys) + self.k0) / (self.gamma + 1)
+        vals = np.r_[-rep[::-1], 0.0, rep]
+        counts = np.r_[self.neg[::-1], self.zero, self.pos]
+        keep = counts > 0
+        return vals[keep], counts[keep]
+
+    def quantiles(self, qs):
+        """np.percentile (線形補間) と同じ定義の分位点 (q は 0-1)。空なら NaN"""
+        qs = np.atleast_1d(np.asarray(qs, dtype=float))
+        if self.count == 0:
+            return np.full(len(qs), np.nan)
+        vals, counts = self._sorted_buckets()
+        cum = np.cumsum(counts)
+        h = qs * (self.count - 1)
+        lo = vals[np.searchsorted(cum, np.floor(h), side='right')]
+        hi = vals[np.searchsorted(cum, np.ceil(h), side='right')]
+        out = lo + (h - np.floor(h)) * (hi - lo)
+        return np.clip(out, self.min, self.max)
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def to_dict(self):
+        return {
+            'rel_acc': self.rel_acc, 'min_value': self.min_value, 'max_value': self.max_value,
+            'count': self.count, 'zero': self.zero, 'min': self.min, 'max': self.max,
+            # 疎な形で保存 (0 でないバケットだけ)
+            'pos': {int(k): int(c) for k, c in zip(np.flatnonzero(self.pos), self.pos[self.pos > 0])},
+            'neg': {int(k): int(c) for k, c in zip(np.flatnonzero(self.neg), self.neg[self.neg > 0])},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d['rel_acc'], d['min_value'], d['max_value'])
+        s.count, s.zero = int(d['count']), int(d['zero'])
+        s.min, s.max = float(d['min']), float(d['max'])
+        for store, items in ((s.pos, d['pos']), (s.neg, d['neg'])):
+            for k, c in items.items():
+                store[int(k)] = c
+        return s
+
+
+class ProjectedErrorStats:
+    """
+    1サイト分の投影座標 (EPSG:6677) から水平誤差の分位点を求める。
+    同じサイトの複数チャンク・複数ファイルは merge でまとめられる (ref が同じなら dx, dy は正確)。
+    """
+
+    def __init__(self, ref=None, rel_acc=REL_ACCURACY):
+        self.ref = None if ref is None else (float(ref[0]), float(ref[1]))
+        self.dx = QuantileSketch(rel_acc)
+        self.dy = QuantileSketch(rel_acc)
+        self.dist = QuantileSketch(rel_acc)
+        self._center = None
+
+    @property
+    def n_fix(self):
+        return self.dx.count
+
+    # 1パス目
+    def add_positions(self, xx, yy):
+        xx, yy = np.asarray(xx, dtype=float), np.asarray(yy, dtype=float)
+        if not len(xx):
+            return self
+        if self.ref is None:
+            self.ref = tuple(float(np.round(np.median(v) / REF_GRID_M) * REF_GRID_M) for v in (xx, yy))
+        self.dx.update(xx - self.ref[0])
+        self.dy.update(yy - self.ref[1])
+        self._center = None
+        return self
+
+    @property
+    def center(self):
+        """中央値位置 (x, y)。1パス目の後に確定する"""
+        if self._center is None:
+            if self.ref is None or self.n_fix == 0:
+                return np.nan, np.nan
+            self._center = (self.ref[0] + self.dx.quantile(0.5), self.ref[1] + self.dy.quantile(0.5))
+        return self._center
+
+    # 2パス目
+    def add_errors(self, xx, yy):
+        cx, cy = self.center
+        self.dist.update(np.hypot(np.asarray(xx, dtype=float) - cx, np.asarray(yy, dtype=float) - cy))
+        return self
+
+    def merge(self, other):
+        """
+        other をまとめる。ref が違えば other の dx, dy を self.ref 基準にずらす (代表値をずらすので誤差 rel_acc 程度)。
+        dist はそれぞれ自分の中心からの距離なので、マージ後の中心までのずれ d を使い sqrt(dist^2 + d^2) に
+        置き換えてから足す (誤差の向きがずれの向きと無関係とみなした近似。d が誤差に比べて小さいほど正確)。
+        正確な値が要るときは、同じ ref でログを読み直すこと (streaming_projected_error に複数ファイルを渡す)。
+        """
+        if other.ref is None:
+            return self
+        if self.ref is None:
+            self.ref = other.ref
+        old_centers = [(s.center, s.dist) for s in (self, other) if s.n_fix]
+        if self.ref == other.ref:
+            odx, ody = other.dx, other.dy
+        else:
+            sx, sy = other.ref[0] - self.ref[0], other.ref[1] - self.ref[1]
+            odx, ody = other.dx.mapped(lambda v: v + sx), other.dy.mapped(lambda v: v + sy)
+        self.dx.merge(odx)
+        self.dy.merge(ody)
+        self._center = None
+
+        cx, cy = self.center
+        dist = QuantileSketch(*self.dist._layout())
+        for (ox, oy), d in old_centers:
+            shift2 = (ox - cx) ** 2 + (oy - cy) ** 2
+            dist.merge(d if shift2 == 0 else d.mapped(lambda v: np.sqrt(v * v + shift2)))
+        self.dist = dist
+        return self
+
+    def summary(self, percentiles=PERCENTILES):
+        cx, cy = self.center
+        row = {'n_fix': self.n_fix, 'center_x_6677': cx, 'center_y_6677': cy}
+        for p, v in zip(percentiles, self.dist.quantiles(np.asarray(percentiles) / 100.0)):
+            row[f'err_p{p}_m'] = float(v)
+        return row
+
+    def to_dict(self):
+        return {'ref': self.ref, 'dx': self.dx.to_dict(), 'dy': self.dy.to_dict(), 'dist': self.dist.to_dict()}
+
+    @classmethod
+    def from_dict(cls, d):
+        s = cls(d['ref'], d['dx']['rel_acc'])
+        s.dx, s.dy, s.dist = (QuantileSketch.from_dict(d[k]) for k in ('dx', 'dy', 'dist'))
+        return s
+
+
+def streaming_projected_error(filepaths, transformer, chunk_rows=100_000, rel_acc=REL_ACCURACY, ref=None):
+    """
+    calculate_projected_error のメモリ一定版。ログ (1つまたは同一サイトの複数) を2回読み、
+    ProjectedErrorStats を返す。ref (x, y) はあとで別のファイルの結果とマージするときの共通の基準点。
+    """
+    from common.gnss_log import iter_fix_chunks
+
+    if isinstance(filepaths, (str, bytes)) or not hasattr(filepaths, '__iter__'):
+        filepaths = [filepaths]
+    filepaths = list(filepaths)
+
+    def projected_chunks():
+        for fp in filepaths:
+            for df in iter_fix_chunks(fp, chunk_rows, ['LatitudeDegrees', 'LongitudeDegrees']):
+                df = df.dropna()
+                if len(df):
+                    yield transformer.transform(df['LongitudeDegrees'].values, df['LatitudeDegrees'].values)
+
+    stats = ProjectedErrorStats(ref, rel_acc)
+    for xx, yy in projected_chunks():
+        stats.add_positions(xx, yy)
+    for xx, yy in projected_chunks():
+        stats.add_errors(xx, yy)
+    return stats
@@ -0,0 +1,158 @@
+"""
+図の作成を数値計算から切り離す。
+
+  仕様 (spec) : 計算済みの曲線・点の配列と見た目だけを持つ dict (JSON にできる)。
+                roc_figure / scatter_figure で作り、write_specs で figures.json に書く
+  描画        : render_specs がワーカープロセスで Agg バックエンドを使って描く (図ごとに並列)。
+                start_render はプロセスを起動してすぐに戻るので、呼び出し側はその間に結果の書き込みなどを続けられる
+
+spec の path は figures.json のあるフォルダからの相対パス (フォルダごとコピーしても描き直せる)。
+環境変数 PNT_NO_FIGURES=1 または各スクリプトの --no-figures で描画を省く (figures.json は書く)。
+あとから描くときは src/render_figures.py (パイプラインの figures 段) を使う。
+"""
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+NO_FIGURES_ENV = 'PNT_NO_FIGURES'
+SPEC_FILE = 'figures.json'
+
+
+def figures_enabled(no_figures=False):
+    """--no-figures (no_figures=True) か PNT_NO_FIGURES が設定されていれば False"""
+    return not no_figures and os.environ.get(NO_FIGURES_ENV, '').strip() in ('', '0')
+
+
+def _list(a):
+    return [float(v) for v in a]
+
+
+# ==========================================
+# 仕様
+# ==========================================
+def roc_curve_spec(label, fpr, tpr, **style):
+    """ROC 曲線1本 (style は plt.plot のキーワード: color, lw, linestyle など)"""
+    return {'label': label, 'fpr': _list(fpr), 'tpr': _list(tpr), 'style': style}
+
+
+def roc_figure(path, curves, title='ROC Curves', figsize=(8, 8), dpi=None, diagonal=None,
+               xlabel=None, ylabel=None, label_fontsize=None, title_fontsize=None,
+               legend=None, grid=False, lim_pad=None, tight=False):
+    """
+    ROC 曲線の図。diagonal は対角線の plt.plot のキーワード (既定は 'k--')。
+    lim_pad を指定すると x, y の範囲を [-lim_pad, 1 + lim_pad] にする。tight=True で bbox_inches='tight'。
+    """
+    return {'kind': 'roc', 'path': str(path), 'curves': curves, 'title': title, 'figsize': list(figsize),
+            'dpi': dpi, 'diagonal': diagonal, 'xlabel': xlabel, 'ylabel': ylabel,
+            'label_fontsize': label_fontsize, 'title_fontsize': title_fontsize,
+            'legend': legend or {}, 'grid': grid, 'lim_pad': lim_pad, 'tight': tight}
+
+
+def scatter_figure(path, panels, ylabel, figsize=(15, 5), dpi=None, alpha=0.6):
+    """横に並べた散布図。panels: [{'x': [...], 'y': [...], 'xlabel': ...}, ...]"""
+    panels = [{'x': _list(p['x']), 'y': _list(p['y']), 'xlabel': p['xlabel']} for p in panels]
+    return {'kind': 'scatter', 'path': str(path), 'panels': panels, 'ylabel': ylabel,
+            'figsize': list(figsize), 'dpi': dpi, 'alpha': alpha}
+
+
+def write_specs(spec_path, specs):
+    """figures.json を書く (一時ファイルに書いてから置き換える)"""
+    spec_path = Path(spec_path)
+    spec_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = spec_path.with_suffix('.tmp')
+    tmp.write_text(json.dumps({'figures': specs}))
+    tmp.replace(spec_path)
+    return spec_path
+
+
+def read_specs(spec_path):
+    return json.loads(Path(spec_path).read_text())['figures']
+
+
+# ==========================================
+# 描画 (ワーカープロセスで実行)
+# ==========================================
+def _draw_roc(plt, spec):
+    fig = plt.figure(figsize=spec['figsize'])
+    for c in spec['curves']:
+        plt.plot(c['fpr'], c['tpr'], label=c['label'], **c['style'])
+    if spec['diagonal'] is None:
+        plt.plot([0, 1], [0, 1], 'k--')
+    else:
+        plt.plot([0, 1], [0, 1], **spec['diagonal'])
+    if spec['lim_pad'] is not None:
+        plt.xlim([-spec['lim_pad'], 1 + spec['lim_pad']])
+        plt.ylim([-spec['lim_pad'], 1 + spec['lim_pad']])
+    if spec['xlabel']:
+        plt.xlabel(spec['xlabel'], fontsize=spec['label_fontsize'])
+    if spec['ylabel']:
+        plt.ylabel(spec['ylabel'], fontsize=spec['label_fontsize'])
+    plt.title(spec['title'], fontsize=spec['title_fontsize'])
+    plt.legend(**spec['legend'])
+    if spec['grid']:
+        plt.grid(True, linestyle=':', alpha=0.6)
+    return fig
+
+
+def _draw_scatter(plt, spec):
+    fig = plt.figure(figsize=spec['figsize'])
+    n = len(spec['panels'])
+    for i, p in enumerate(spec['panels']):
+        plt.subplot(1, n, i + 1)
+        plt.scatter(p['x'], p['y'], alpha=spec['alpha'])
+        plt.xlabel(p['xlabel']); plt.ylabel(spec['ylabel'])
+    plt.tight_layout()
+    return fig
+
+
+_DRAW = {'roc': _draw_roc, 'scatter': _draw_scatter}
+
+
+def render_figure(spec, base_dir):
+    """spec を base_dir からの相対パスに PNG で書く。戻り値は (パス, 秒)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    t0 = time.perf_counter()
+    path = Path(base_dir) / spec['path']
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fig = _DRAW[spec['kind']](plt, spec)
+    tmp = path.with_name(path.stem + '.tmp' + path.suffix)
+    fig.savefig(tmp, dpi=spec['dpi'] or 'figure', bbox_inches='tight' if spec.get('tight') else None)
+    plt.close(fig)
+    os.replace(tmp, path)
+    return str(path), time.perf_counter() - t0
+
+
+class RenderJob:
+    """start_render の戻り値。wait() で描画の終了を待ち、[(パス, 秒), ...] を返す"""
+
+    def __init__(self, executor, futures):
+        self._executor = executor
+        self._futures = futures
+
+    def wait(self):
+        try:
+            return [f.result() for f in self._futures]
+        finally:
+            self._executor.shutdown()
+
+
+def start_render(specs, base_dir, workers=None):
+    """specs を図ごとにワーカープロセスで描き始める (すぐに戻る)"""
+    workers = max(1, min(len(specs), workers or os.cpu_count() or 1))
+    ex = ProcessPoolExecutor(max_workers=workers)
+    return RenderJob(ex, [ex.submit(render_figure, s, base_dir) for s in specs])
+
+
+def render_specs(spec_paths, workers=None):
+    """複数の figures.json の図をまとめて並列に描く。戻り値は [(パス, 秒), ...]"""
+    jobs = [(s, Path(p).parent) for p in spec_paths for s in read_specs(p)]
+    if not jobs:
+        return []
+    workers = max(1, min(len(jobs), workers or os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        return list(ex.map(render_figure, *zip(*jobs)))
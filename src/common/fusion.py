@@ -0,0 +1,124 @@
+"""
+リスク指標を組み合わせたスコア (L2 正則化ロジスティック回帰) と、その交差検証。
+
+  fit_logistic          : Newton 法 (IRLS)。beta0 を渡すと前回の係数から始める (warm start、数回で収束)
+  stratified_group_folds: 同じサイト (ブートストラップで重複したもの) を同じ fold に入れ、
+                          陽性・陰性の割合が fold ごとにそろうように分ける
+  cv_predict            : fold ごとに学習し、学習に使っていないサイトの予測 (out-of-fold) を返す
+
+特徴量は学習側の中央値で欠損を埋め、学習側の平均・標準偏差で標準化してから当てはめる。
+"""
+import numpy as np
+
+L2 = 1.0            # 正則化の強さ (標準化した特徴量の係数に対して。切片には掛けない)
+MAX_ITER = 50
+TOL = 1e-6          # Newton 法の係数の変化がこれ未満で収束
+
+
+class LogisticModel:
+    """標準化の値と係数 (beta[0] が切片)"""
+
+    def __init__(self, center, scale, fill, beta):
+        self.center = center
+        self.scale = scale
+        self.fill = fill
+        self.beta = beta
+
+    def design(self, X):
+        X = np.where(np.isnan(X), self.fill, X)
+        return np.column_stack([np.ones(len(X)), (X - self.center) / self.scale])
+
+    def predict(self, X):
+        """線形予測子 (大きいほど陽性らしい。AUC には確率に直さずに使える)"""
+        return self.design(X) @ self.beta
+
+
+def fit_logistic(X, y, l2=L2, beta0=None):
+    """X: (n, p) の特徴量 (NaN 可), y: 0/1。beta0 を渡すとそこから Newton 法を始める"""
+    missing = np.isnan(X)
+    if missing.any():
+        fill = np.nanmedian(X, axis=0)
+        fill = np.where(np.isnan(fill), 0.0, fill)
+        Xf = np.where(missing, fill, X)
+    else:
+        fill, Xf = np.median(X, axis=0), X
+    center = Xf.mean(axis=0)
+    scale = Xf.std(axis=0)
+    # 定数の列 (丸め誤差の分だけ散らばったものを含む) は標準化しない (係数は正則化で 0 になる)
+    scale[scale <= 1e-9 * (np.abs(center) + 1.0)] = 1.0
+    model = LogisticModel(center, scale, fill, None)
+    Z = model.design(X)
+    y = np.asarray(y, dtype=float)
+
+    p = Z.shape[1]
+    penalty = np.full(p, l2)
+    penalty[0] = 0.0
+
+    def objective(beta):
+        eta = Z @ beta
+        return np.sum(np.logaddexp(0.0, eta) - y * eta) + 0.5 * np.sum(penalty * beta ** 2)
+
+    beta = np.zeros(p) if beta0 is None else np.array(beta0, dtype=float)
+    f = objective(beta)
+    for _ in range(MAX_ITER):
+        mu = 1.0 / (1.0 + np.exp(-np.clip(Z @ beta, -30, 30)))
+        grad = Z.T @ (mu - y) + penalty * beta
+        hess = (Z * (mu * (1 - mu))[:, None]).T @ Z + np.diag(penalty + 1e-9)
+        step = np.linalg.solve(hess, grad)
+        # 目的関数が下がるまで歩幅を半分にする (warm start の初期値が遠いときの発散を防ぐ)
+        t = 1.0
+        while t > 1e-4:
+            f_new = objective(beta - t * step)
+            if f_new <= f:
+                break
+            t *= 0.5
+        else:
+            break  # どの歩幅でも下がらない (収束済みか数値誤差の範囲) ので、確かめていない歩幅は使わずに終える
+        beta -= t * step
+        f = f_new
+        if np.max(np.abs(t * step)) < TOL:
+            break
+    model.beta = beta
+    return model
+
+
+def stratified_group_folds(y, groups, k, rng):
+    """
+    各行の fold 番号 (0..k-1)。同じ group の行は同じ fold。
+    group のラベル (同じ group 内では同じ前提) ごとに group を並べ替えて順に割り当てる。
+    """
+    y = np.asarray(y)
+    uniq, first, inverse = np.unique(groups, return_index=True, return_inverse=True)
+    fold_of_group = np.empty(len(uniq), dtype=np.int64)
+    for label in np.unique(y[first]):
+        members = np.flatnonzero(y[first] == label)
+        members = members[rng.permutation(len(members))]
+        # ラベルごとに開始位置をずらし、小さい fold ができないようにする
+        fold_of_group[members] = (np.arange(len(members)) + rng.integers(k)) % k
+    return fold_of_group[inverse.ravel()]
+
+
+def n_folds(y, groups, k):
+    """陽性・陰性とも各 fold に1つ以上の group が入る fold 数 (2 未満なら交差検証できない)"""
+    y = np.asarray(y)
+    _, first = np.unique(groups, return_index=True)
+    labels = y[first]
+    return min(k, int(labels.sum()), int((1 - labels).sum()))
+
+
+def cv_predict(X, y, folds, k, l2=L2, beta0=None):
+    """
+    fold ごとの out-of-fold 予測 (学習側が1クラスだけの fold は NaN)。
+    fold 間で係数を引き継いで warm start する。戻り値は (予測, 最後の係数)
+    """
+    pred = np.full(len(y), np.nan)
+    beta = beta0
+    for f in range(k):
+        test = folds == f
+        train = ~test
+        if not test.any() or len(np.unique(y[train])) < 2:
+            continue
+        model = fit_logistic(X[train], y[train], l2, beta)
+        beta = model.beta
+        pred[test] = model.predict(X[test])
+    return pred, beta
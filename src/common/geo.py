@@ -0,0 +1,23 @@
+from functools import lru_cache
+
+import numpy as np
+
+# 緯度経度 (WGS84) と 解析用の投影座標系 (JGD2011 / 平面直角座標系 IX系)
+WGS84_EPSG = "epsg:4326"
+PROJ_EPSG = "epsg:6677"
+
+
+@lru_cache(maxsize=None)
+def get_transformer(src_epsg=WGS84_EPSG, dst_epsg=PROJ_EPSG):
+    """
+    pyproj.Transformer をプロセス内で1度だけ生成して使い回す。
+    run_baseline.main と同じく always_xy=True (x=lon, y=lat) で作成する。
+    """
+    import pyproj
+    return pyproj.Transformer.from_crs(src_epsg, dst_epsg, always_xy=True)
+
+
+def lonlat_to_xy(lon, lat):
+    """経度・緯度 (スカラーまたは配列) を EPSG:6677 の (x, y) に変換する"""
+    xx, yy = get_transformer().transform(np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+    return np.asarray(xx), np.asarray(yy)
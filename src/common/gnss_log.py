@@ -0,0 +1,211 @@
+"""
+GNSS Logger (v3) のテキストログを Fix / Status の列データとして読み込む。
+
+parse_gnss_log (run_baseline.py) と同じく '# Fix' / '# Status' のヘッダ行から列名を取り、
+数値列だけを型付きで pandas.read_csv に渡す。
+
+圧縮ログ (.txt.gz / .txt.xz / .txt.zst) は open_log で透過的に読める。伸長は別スレッドで行い、
+ブロック単位でキューに渡すので、伸長と行の振り分け・パースが重なって進む。
+"""
+import io
+import os
+import gzip
+import lzma
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+FIX_COLUMNS = ['UnixTimeMillis', 'LatitudeDegrees', 'LongitudeDegrees', 'AccuracyMeters']
+STATUS_COLUMNS = ['UnixTimeMillis', 'ConstellationType', 'Svid', 'CarrierFrequencyHz',
+                  'Cn0DbHz', 'AzimuthDegrees', 'ElevationDegrees', 'UsedInFix']
+
+LOG_SUFFIXES = ('.txt', '.txt.gz', '.txt.xz', '.txt.zst')
+COMPRESSED_SUFFIXES = ('.gz', '.xz', '.zst')
+DECOMPRESS_BLOCK = 1 << 20   # 伸長スレッドが1回に渡すバイト数
+DECOMPRESS_AHEAD = 8         # 先読みするブロック数 (メモリは約 DECOMPRESS_BLOCK × この数)
+
+
+# ==========================================
+# ログの列挙・オープン (圧縮ログ対応)
+# ==========================================
+def find_logs(log_dir):
+    """ディレクトリ内のログ (非圧縮・圧縮) をファイル名順に返す"""
+    return sorted(str(p) for p in Path(log_dir).iterdir()
+                  if p.is_file() and p.name.endswith(LOG_SUFFIXES))
+
+
+def is_compressed(filepath):
+    return Path(filepath).suffix in COMPRESSED_SUFFIXES
+
+
+def _open_compressed(filepath):
+    suffix = Path(filepath).suffix
+    if suffix == '.gz':
+        return gzip.open(filepath, 'rb')
+    if suffix == '.xz':
+        return lzma.open(filepath, 'rb')
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading .zst logs requires zstandard. Run: pip install zstandard")
+    return zstandard.ZstdDecompressor().stream_reader(open(filepath, 'rb'), read_across_frames=True, closefd=True)
+
+
+class _BackgroundDecompressor(io.RawIOBase):
+    """
+    別スレッドで伸長したブロックを受け取るバイナリストリーム。
+    zlib / lzma / zstandard は伸長中に GIL を解放するので、呼び出し側のパースと並行して進む。
+    """
+
+    def __init__(self, filepath):
+        super().__init__()
+        self._queue = queue.Queue(maxsize=DECOMPRESS_AHEAD)
+        self._stop = threading.Event()
+        self._block, self._pos, self._eof = memoryview(b''), 0, False
+        self._thread = threading.Thread(target=self._run, args=(filepath,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self, filepath):
+        try:
+            with _open_compressed(filepath) as f:
+                while True:
+                    block = f.read(DECOMPRESS_BLOCK)
+                    if not block or not self._put(block):
+                        break
+        except Exception as e:  # 読み込み側で送出する
+            self._put(e)
+        self._put(None)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._block):
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, Exception):
+                self._eof = True
+                raise item
+            self._block, self._pos = memoryview(item), 0
+        n = min(len(b), len(self._block) - self._pos)
+        b[:n] = self._block[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self):
+        self._stop.set()
+        super().close()
+
+
+def open_log(filepath):
+    """ログをテキストとして開く (拡張子で圧縮形式を判定)"""
+    if is_compressed(filepath):
+        raw = io.BufferedReader(_BackgroundDecompressor(filepath), buffer_size=DECOMPRESS_BLOCK)
+        return io.TextIOWrapper(raw, encoding='utf-8', errors='ignore')
+    return Path(filepath).open('r', encoding='utf-8', errors='ignore')
+
+
+def map_logs(func, filepaths, workers=None):
+    """
+    func(filepath) をファイルごとに別プロセスで並列に実行し、filepaths の順に (filepath, 結果) を返す。
+    func はモジュールの最上位で定義された関数 (pickle 可能) であること。
+    """
+    filepaths = list(filepaths)
+    workers = min(workers or os.cpu_count() or 1, len(filepaths))
+    if workers <= 1:
+        for fp in filepaths:
+            yield fp, func(fp)
+        return
+    with ProcessPoolExecutor(workers) as ex:
+        yield from zip(filepaths, ex.map(func, filepaths))
+
+
+def _header(line):
+    # '# Fix,Provider,...' -> ['Fix', 'Provider', ...] (parse_gnss_log と同じ)
+    return [c.strip() for c in line.replace('#', '').strip().split(',')]
+
+
+def _to_frame(lines, header, columns):
+    """レコード行 -> 指定列だけの数値 DataFrame (ログに無い列は NaN)"""
+    idx = {}
+    for i, name in enumerate(header or []):
+        idx.setdefault(name, i)  # 重複列名 (VerticalAccuracyMeters 等) は先頭を使う
+    present = [c for c in columns if c in idx]
+
+    if lines and present:
+        df = pd.read_csv(
+            io.StringIO(''.join(lines)), header=None, names=range(len(header)),
+            usecols=[idx[c] for c in present], on_bad_lines='skip', engine='c',
+        )
+        df.columns = [header[i] for i in df.columns]
+        df = df.apply(pd.to_numeric, errors='coerce')
+    else:
+        df = pd.DataFrame(columns=present, dtype=float)
+
+    for c in columns:
+        if c not in df.columns:
+            df[c] = np.nan
+    return df[columns]
+
+
+def read_log_tables(filepath, fix_columns=FIX_COLUMNS, status_columns=STATUS_COLUMNS):
+    """
+    1つのログ -> (df_fix, df_status)。ヘッダ行が無い場合は ValueError。
+    行の振り分けだけを Python で行い、数値変換は read_csv (C 実装) に任せる。
+    """
+    fix_lines, status_lines = [], []
+    fix_header = status_header = None
+    with open_log(filepath) as f:
+        for line in f:
+            if line.startswith('Fix'):
+                fix_lines.append(line)
+            elif line.startswith('Status'):
+                status_lines.append(line)
+            elif line.startswith('# Fix'):
+                fix_header = _header(line)
+            elif line.startswith('# Status'):
+                status_header = _header(line)
+
+    if not fix_header or not status_header:
+        raise ValueError("Missing Header")
+    return (_to_frame(fix_lines, fix_header, fix_columns),
+            _to_frame(status_lines, status_header, status_columns))
+
+
+def iter_fix_chunks(filepath, chunk_rows=100_000, fix_columns=FIX_COLUMNS):
+    """
+    Fix 行だけを chunk_rows 行ずつの DataFrame として順に返す (長時間ログ用、メモリ一定)。
+    '# Fix' ヘッダが無い場合は ValueError。
+    """
+    lines, header = [], None
+    with open_log(filepath) as f:
+        for line in f:
+            if line.startswith('Fix'):
+                lines.append(line)
+                if header and len(lines) >= chunk_rows:
+                    yield _to_frame(lines, header, fix_columns)
+                    lines = []
+            elif line.startswith('# Fix'):
+                header = _header(line)
+
+    if not header:
+        raise ValueError("Missing Header")
+    if lines:
+        yield _to_frame(lines, header, fix_columns)
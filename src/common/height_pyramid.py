@@ -0,0 +1,207 @@
+"""
+建物高さの多重解像度ピラミッド (全解像度を1つの GeoTIFF に入れる)。
+
+最も細かい解像度 (既定 1 m) で1度だけラスタ化した格子から、粗い解像度 (3 m, 5 m, 10 m ...) を
+f×f セルの max (または mean) でまとめて作る。格子の原点と行列数は全解像度の最小公倍数 (3, 5, 10 なら 30 m) の
+倍数にそろえるので、どの解像度のセルも細かいセルをちょうど f×f 個含み、セルの境界は座標系の格子と一致する
+(AOI が変わっても同じ解像度のセルは同じ位置)。
+
+ファイル: 1ページ目が最も細かい解像度、以降は粗い順に1ページずつ (非圧縮 Float32、1ストリップ)。
+各ページに座標 (ModelTiepoint / ModelPixelScale)・EPSG・NoData を持たせるので、
+GeoTiff(path, page=k) でそのまま memmap で読め、GDAL / QGIS では GTIFF_DIR:<k+1>:<path> で開ける。
+"""
+import math
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from common.raster import GeoTiff
+
+BASE_RES_M = 1.0                    # ラスタ化する解像度
+LEVELS_M = (1.0, 3.0, 5.0, 10.0)    # ファイルに入れる解像度 (BASE_RES_M の整数倍)
+NODATA = -9999.0                    # 建物の無いセル (gdal:rasterize の NODATA と同じ)
+EPSG = 6677
+PYRAMID_FILE = "bld_height_pyramid.tif"
+
+# TIFF タグ (番号, 型, 値)。型 3: SHORT, 4: LONG, 2: ASCII, 12: DOUBLE, 16: LONG8
+_SHORT, _LONG, _ASCII, _DOUBLE, _LONG8 = 3, 4, 2, 12, 16
+_TYPE_FORMATS = {_SHORT: ("H", 2), _LONG: ("I", 4), _ASCII: ("s", 1), _DOUBLE: ("d", 8), _LONG8: ("Q", 8)}
+
+
+def level_factors(levels_m=LEVELS_M, base_res=BASE_RES_M):
+    """解像度 -> BASE の何セル分か (整数でなければ ValueError)"""
+    factors = []
+    for res in levels_m:
+        f = res / base_res
+        if f < 1 or abs(f - round(f)) > 1e-9:
+            raise ValueError(f"解像度 {res} m は {base_res} m の整数倍ではありません")
+        factors.append(int(round(f)))
+    return factors
+
+
+def aligned_extent(xmin, ymin, xmax, ymax, levels_m=LEVELS_M, base_res=BASE_RES_M):
+    """
+    範囲を全解像度の最小公倍数の倍数に外側へ広げる。
+    戻り値は (xmin, ymin, xmax, ymax, 列数, 行数) (列数・行数は base_res での値)
+    """
+    block = math.lcm(*level_factors(levels_m, base_res)) * base_res
+    x0, y0 = math.floor(xmin / block) * block, math.floor(ymin / block) * block
+    x1, y1 = math.ceil(xmax / block) * block, math.ceil(ymax / block) * block
+    return x0, y0, x1, y1, int(round((x1 - x0) / base_res)), int(round((y1 - y0) / base_res))
+
+
+def pool(grid, f, method="max", nodata=NODATA):
+    """
+    (H, W) の格子 -> (H/f, W/f)。f×f のセルの max / mean (NoData・NaN は除き、全部欠損なら NoData)。
+    H, W は f の倍数であること (aligned_extent の格子)。
+    """
+    h, w = grid.shape
+    if h % f or w % f:
+        raise ValueError(f"格子 {h}×{w} が {f} セルで割り切れません (aligned_extent の範囲を使ってください)")
+    a = np.asarray(grid, dtype=np.float32)
+    missing = np.isnan(a) | (a == nodata)
+    if method == "max":
+        blocks = np.where(missing, -np.inf, a).reshape(h // f, f, w // f, f)
+        out = blocks.max(axis=(1, 3))
+        out[np.isneginf(out)] = nodata
+    elif method == "mean":
+        total = np.where(missing, 0.0, a).reshape(h // f, f, w // f, f).sum(axis=(1, 3), dtype=np.float64)
+        count = (~missing).reshape(h // f, f, w // f, f).sum(axis=(1, 3))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out = np.where(count > 0, total / count, nodata)
+    else:
+        raise ValueError(f"unknown pooling method: {method}")
+    return out.astype(np.float32)
+
+
+def build_levels(grid, levels_m=LEVELS_M, base_res=BASE_RES_M, method="max", nodata=NODATA):
+    """
+    base_res の格子 -> [(解像度, 格子), ...] (細かい順)。
+    max は入れ子になる解像度 (5 m -> 10 m) を作成済みの粗い格子から作る (結果は同じで、読む量が少ない)。
+    mean は欠損の数で重みが変わるため、常に base_res の格子から作る。
+    """
+    factors = sorted(set(level_factors(levels_m, base_res)))
+    built = {}
+    for f in factors:
+        src = 1
+        if method == "max":
+            src = max(g for g in built if f % g == 0) if built else 1
+        built[f] = grid if f == 1 else pool(built.get(src, grid), f // src, method, nodata)
+    return [(f * base_res, np.asarray(built[f], dtype=np.float32)) for f in factors]
+
+
+def _ifd_bytes(tags, big, data_end, next_ifd):
+    """
+    タグ {番号: (型, 値)} -> (IFD のバイト列, IFD の後ろに置く値のバイト列)。
+    IFD は data_end の位置に置く前提で、収まらない値の位置を決める。
+    """
+    off_fmt, count_fmt, entry_size, inline = ("Q", "Q", 20, 8) if big else ("I", "H", 12, 4)
+    n = len(tags)
+    ifd_size = struct.calcsize("<" + count_fmt) + n * entry_size + struct.calcsize("<" + off_fmt)
+    extra = bytearray()
+    entries = bytearray(struct.pack("<" + count_fmt, n))
+    for tag in sorted(tags):
+        typ, value = tags[tag]
+        code, size = _TYPE_FORMATS[typ]
+        if typ == _ASCII:
+            payload = value.encode("ascii") + b"\x00"
+            count = len(payload)
+        else:
+            value = tuple(value) if isinstance(value, (list, tuple)) else (value,)
+            payload = struct.pack("<" + code * len(value), *value)
+            count = len(value)
+        head = struct.pack("<HH" + off_fmt, tag, typ, count)
+        if len(payload) <= inline:
+            entries += head + payload.ljust(inline, b"\x00")
+        else:
+            entries += head + struct.pack("<" + off_fmt, data_end + ifd_size + len(extra))
+            extra += payload
+            if len(extra) % 2:
+                extra += b"\x00"
+    entries += struct.pack("<" + off_fmt, next_ifd)
+    return bytes(entries), bytes(extra)
+
+
+def write_pyramid(path, levels, xmin, ymax, nodata=NODATA, epsg=EPSG, method="max"):
+    """
+    levels: build_levels の戻り値、(xmin, ymax): 格子の左上隅の座標。
+    一時ファイルに書いてから置き換える。合計が 4 GB を超えるときは BigTIFF で書く。
+    """
+    path = Path(path)
+    total = sum(a.nbytes for _, a in levels)
+    big = total > (1 << 32) - (1 << 24)
+    offset_type = _LONG8 if big else _LONG
+    geokeys = (1, 1, 0, 3,
+               1024, 0, 1, 1,       # GTModelType = Projected
+               1025, 0, 1, 1,       # GTRasterType = PixelIsArea
+               3072, 0, 1, epsg)    # ProjectedCSType
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as fp:
+        fp.write(b"II" + (struct.pack("<HHHQ", 43, 8, 0, 0) if big else struct.pack("<HI", 42, 0)))
+        first_ptr = 8 if big else 4
+        prev_next_ptr = first_ptr
+        for res, grid in levels:
+            h, w = grid.shape
+            data_off = fp.tell()
+            fp.write(np.ascontiguousarray(grid, dtype="<f4").tobytes())
+            if fp.tell() % 2:
+                fp.write(b"\x00")
+            tags = {
+                254: (_LONG, 0),                      # NewSubfileType (独立したページ。オーバービューではない)
+                256: (_LONG, w), 257: (_LONG, h),
+                258: (_SHORT, 32), 259: (_SHORT, 1),  # 32 bit, 非圧縮
+                262: (_SHORT, 1),                     # BlackIsZero
+                270: (_ASCII, f"bld_height res={res:g}m method={method}"),
+                273: (offset_type, data_off),
+                277: (_SHORT, 1), 278: (_LONG, h), 279: (offset_type, grid.nbytes),
+                284: (_SHORT, 1), 339: (_SHORT, 3),   # PlanarConfiguration, SampleFormat = IEEE float
+                33550: (_DOUBLE, (res, res, 0.0)),
+                33922: (_DOUBLE, (0.0, 0.0, 0.0, xmin, ymax, 0.0)),
+                34735: (_SHORT, geokeys),
+                42113: (_ASCII, f"{nodata:g}"),
+            }
+            ifd_off = fp.tell()
+            entries, extra = _ifd_bytes(tags, big, ifd_off, 0)
+            fp.write(entries + extra)
+            # 前の IFD (またはヘッダ) の「次の IFD」をこの IFD に向ける
+            end = fp.tell()
+            fp.seek(prev_next_ptr)
+            fp.write(struct.pack("<Q" if big else "<I", ifd_off))
+            prev_next_ptr = ifd_off + len(entries) - (8 if big else 4)
+            fp.seek(end)
+    tmp.replace(path)
+    return path
+
+
+def pyramid_resolutions(path):
+    """ファイルの各ページの解像度 [m] (ページ順)"""
+    first = GeoTiff(path)
+    return [first.res_x] + [GeoTiff(path, page=k).res_x for k in range(1, first.n_pages)]
+
+
+def open_level(path, res_m):
+    """解像度 res_m [m] のページを GeoTiff で開く (無ければ ValueError)"""
+    resolutions = pyramid_resolutions(path)
+    for k, res in enumerate(resolutions):
+        if abs(res - res_m) < 1e-6:
+            return GeoTiff(path, page=k)
+    raise ValueError(f"{Path(path).name}: {res_m:g} m のページがありません (あるのは {resolutions})")
+
+
+def open_height_raster(raster_dir, res_m):
+    """
+    data_qgis/processed から解像度 res_m の建物高さを開く。
+    ピラミッド (bld_height_pyramid.tif) にその解像度があればそのページ、
+    無ければ解像度ごとのファイル (bld_height_5m.tif など)。どちらも無ければ None。
+    """
+    raster_dir = Path(raster_dir)
+    pyramid = raster_dir / PYRAMID_FILE
+    if pyramid.exists():
+        try:
+            return open_level(pyramid, res_m)
+        except ValueError:
+            pass
+    single = raster_dir / f"bld_height_{res_m:g}m.tif"
+    return GeoTiff(single) if single.exists() else None
@@ -0,0 +1,269 @@
+"""
+パイプラインの段・サイトごとの計測 (経過時間・CPU 時間・RSS・処理件数) と、任意のサンプリングプロファイラ。
+
+  prof = Profiler('run_baseline')
+  with prof.stage('projection', site='A11') as rec:
+      ...
+      rec['items'] = n_fix
+  prof.write(run_dir / 'profile.json')
+
+ログごとの並列処理は prof.map_logs を使う (各プロセス内で計測し、サイトごとに記録する)。
+
+RSS は段ごとに 入口 (rss_start_mb)・出口 (rss_end_mb)・段の間の最大 (rss_peak_mb、RSS_POLL_MS ごとに読む) と、
+入口からの増加 (rss_delta_mb = rss_peak_mb - rss_start_mb) を記録する。
+現在の RSS が読めない環境 (Linux 以外) では None。プロセス全体のピークは to_dict の total に入れる。
+
+サンプリング: 環境変数 PNT_PROFILE_SAMPLE にサイト ID (カンマ区切り、'all' で全て) を指定すると、
+そのサイトの段の実行中に PNT_PROFILE_INTERVAL_MS ごとに主スレッドのスタックを記録し、
+<出力先>/profile_samples/<site>_<stage>.folded (flamegraph.pl / speedscope で読める collapsed 形式) に書く。
+サンプリング中は CPU 時間が少し増える。
+"""
+import os
+import sys
+import json
+import time
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAMPLE_ENV = 'PNT_PROFILE_SAMPLE'
+INTERVAL_ENV = 'PNT_PROFILE_INTERVAL_MS'
+DEFAULT_INTERVAL_MS = 5.0
+RSS_POLL_MS = 10.0
+RSS_KEYS = ('rss_start_mb', 'rss_end_mb', 'rss_peak_mb', 'rss_delta_mb')
+
+
+def peak_rss_mb(children=False):
+    """プロセス (children=True なら終了した子プロセスの最大) のピーク RSS [MiB]。取れない環境では None"""
+    if resource is None:
+        return None
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Linux は KiB、macOS はバイト
+    return ru.ru_maxrss / (1 << 20) if sys.platform == 'darwin' else ru.ru_maxrss / 1024
+
+
+def current_rss_mb():
+    """今の RSS [MiB] (/proc/self/statm)。取れない環境では None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1 << 20)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class RssMonitor:
+    """段の入口・出口と、その間の最大の RSS を測る (別スレッドで RSS_POLL_MS ごとに読む)"""
+
+    def __init__(self, interval_ms=RSS_POLL_MS):
+        self.interval = interval_ms / 1000.0
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._stop = threading.Event()
+        self._thread = None
+        if self.start_mb is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    def stop(self):
+        """{'rss_start_mb', 'rss_end_mb', 'rss_peak_mb', 'rss_delta_mb'} を返す"""
+        if self._thread is None:
+            return dict.fromkeys(RSS_KEYS)
+        self._stop.set()
+        self._thread.join()
+        end = current_rss_mb()
+        self.peak_mb = max(self.peak_mb, end)
+        return {'rss_start_mb': self.start_mb, 'rss_end_mb': end, 'rss_peak_mb': self.peak_mb,
+                'rss_delta_mb': self.peak_mb - self.start_mb}
+
+
+def sample_targets():
+    """PNT_PROFILE_SAMPLE で指定されたサイト ID の集合 ('all' は '*')。未指定なら空"""
+    value = os.environ.get(SAMPLE_ENV, '').strip()
+    if not value:
+        return set()
+    if value.lower() == 'all':
+        return {'*'}
+    return {s.strip() for s in value.split(',') if s.strip()}
+
+
+class Timed:
+    """別プロセスで func を実行し、(戻り値, 計測値の dict) を返す (map_logs 用。func は pickle 可能なこと)"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        rss = RssMonitor()
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            result = self.func(*args, **kwargs)
+        finally:
+            wall, cpu, mem = time.perf_counter() - t0, time.process_time() - c0, rss.stop()
+        return result, {'wall_s': wall, 'cpu_s': cpu, **mem, 'pid': os.getpid()}
+
+
+# ==========================================
+# サンプリングプロファイラ
+# ==========================================
+class StackSampler:
+    """別スレッドから一定間隔で対象スレッドのスタックを読み、(スタック -> 回数) を数える"""
+
+    def __init__(self, interval_ms=DEFAULT_INTERVAL_MS, thread_id=None):
+        self.interval = interval_ms / 1000.0
+        self.thread_id = thread_id or threading.get_ident()
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def write_folded(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            for stack, n in self.counts.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+# ==========================================
+# 計測の記録
+# ==========================================
+class Profiler:
+    """enabled=False なら何も記録しない (計測を任意にしたい関数の既定値用)"""
+
+    def __init__(self, script, sample_dir=None, enabled=True):
+        self.script = script
+        self.enabled = enabled
+        self.started = time.strftime('%Y-%m-%dT%H:%M:%S')
+        self.records = []
+        self.sample_dir = Path(sample_dir) if sample_dir else None
+        self.sample_sites = sample_targets()
+        self.sample_interval = float(os.environ.get(INTERVAL_ENV, DEFAULT_INTERVAL_MS))
+        self._t0, self._c0 = time.perf_counter(), time.process_time()
+
+    @property
+    def sampling(self):
+        return self.enabled and bool(self.sample_sites)
+
+    def _should_sample(self, site):
+        return self.sampling and ('*' in self.sample_sites or (site is not None and site in self.sample_sites))
+
+    @contextmanager
+    def stage(self, name, site=None, items=None):
+        """with の中を計測する。yield される dict の 'items' に処理件数を入れられる"""
+        rec = {'stage': name, 'site': site, 'items': items}
+        if not self.enabled:
+            yield rec
+            return
+        sampler = StackSampler(self.sample_interval).start() if self._should_sample(site) else None
+        rss = RssMonitor()
+        t0, c0 = time.perf_counter(), time.process_time()
+        try:
+            yield rec
+        finally:
+            rec.update({
+                'wall_s': time.perf_counter() - t0,
+                'cpu_s': time.process_time() - c0,
+                **rss.stop(),
+                'where': 'main',
+            })
+            self.records.append(rec)
+            if sampler is not None:
+                sampler.stop()
+                out_dir = self.sample_dir or Path('.')
+                sampler.write_folded(out_dir / 'profile_samples' / f"{site or 'all'}_{name}.folded")
+
+    def add(self, name, measure, site=None, items=None):
+        """Timed で別プロセスから返ってきた計測値を記録する"""
+        if not self.enabled:
+            return
+        self.records.append({'stage': name, 'site': site, 'items': items,
+                             'wall_s': measure['wall_s'], 'cpu_s': measure['cpu_s'],
+                             **{k: measure[k] for k in RSS_KEYS},
+                             'where': 'main' if measure['pid'] == os.getpid() else f"worker:{measure['pid']}"})
+
+    def map_logs(self, name, func, filepaths, workers=None, items_of=None):
+        """
+        common.gnss_log.map_logs と同じく (filepath, 結果) を順に返し、ファイル (サイト) ごとの計測を記録する。
+        サンプリング中は主プロセスで1ファイルずつ実行する (別プロセスのスタックは読めないため)。
+        """
+        from common.gnss_log import map_logs
+        site_of = lambda fp: Path(fp).name.split('_')[0]
+        if self.sampling:
+            for fp in filepaths:
+                with self.stage(name, site=site_of(fp)) as rec:
+                    res = func(fp)
+                    rec['items'] = items_of(res) if items_of else None
+                yield fp, res
+            return
+        for fp, (res, measure) in map_logs(Timed(func), filepaths, workers):
+            self.add(name, measure, site=site_of(fp), items=items_of(res) if items_of else None)
+            yield fp, res
+
+    def summary(self):
+        """段ごとの合計 (記録順)"""
+        stages = {}
+        for r in self.records:
+            s = stages.setdefault(r['stage'], {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'items': 0,
+                                               'max_wall_s': 0.0, 'slowest_site': None, 'max_rss_delta_mb': None})
+            s['count'] += 1
+            s['wall_s'] += r['wall_s']
+            s['cpu_s'] += r['cpu_s']
+            s['items'] += r['items'] or 0
+            if r.get('rss_delta_mb') is not None:
+                s['max_rss_delta_mb'] = max(s['max_rss_delta_mb'] or 0.0, r['rss_delta_mb'])
+            if r['wall_s'] > s['max_wall_s']:
+                s['max_wall_s'], s['slowest_site'] = r['wall_s'], r['site']
+        return stages
+
+    def to_dict(self):
+        return {
+            'script': self.script,
+            'started': self.started,
+            'total': {'wall_s': time.perf_counter() - self._t0, 'cpu_s': time.process_time() - self._c0,
+                      'rss_peak_mb': peak_rss_mb(), 'rss_peak_children_mb': peak_rss_mb(children=True)},
+            'stages': self.summary(),
+            'records': self.records,
+        }
+
+    def write(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=lambda v: v.item() if hasattr(v, 'item') else str(v))
+        return path
+
+    def report(self):
+        """段ごとの時間を表示する (経過時間の多い順)"""
+        print("\n--- Profile (wall / cpu / max RSS increase / slowest site) ---")
+        for name, s in sorted(self.summary().items(), key=lambda kv: -kv[1]['wall_s']):
+            slow = f"{s['slowest_site']} {s['max_wall_s']:.2f}s" if s['slowest_site'] else '-'
+            mem = f"+{s['max_rss_delta_mb']:.0f}MiB" if s['max_rss_delta_mb'] is not None else '-'
+            print(f"{name:<14} {s['wall_s']:8.2f}s {s['cpu_s']:8.2f}s {mem:>9}  x{s['count']:<4} {slow}")
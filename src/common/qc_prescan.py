@@ -0,0 +1,94 @@
+"""
+QC (エポック数・記録時間) を、ログ全体をパースする前にバイト列の走査だけで判定する。
+
+  Fix の件数   : mmap した本文で行頭の 'Fix' (b'\\nFix') を数える (bytes.count、C 実装)
+  記録時間     : 先頭側の最初の Fix 行と末尾側の最後の Fix 行だけを読み、UnixTimeMillis の差を取る
+
+parse_gnss_log (run_baseline.py) と同じく 'Fix' で始まる行をすべて Fix レコードとして数える。
+判定できない場合 (時刻が読めない、圧縮ログ等) は落とさず、通常のパースに任せる。
+"""
+import mmap
+from pathlib import Path
+
+# QC のしきい値 (run_baseline.py・live_tail.py・pnt.py qc で共通)
+QC_MIN_EPOCHS = 240      # Fix の件数
+QC_MIN_DURATION = 240.0  # 記録時間 [s]
+
+SCAN_BLOCK = 64 << 20   # 件数を数えるときに一度に読むバイト数
+FIX_PREFIX = b'\nFix'
+
+
+def _fix_header(mm):
+    """'# Fix,...' ヘッダ -> 列名のリスト (無ければ None)"""
+    pos = mm.find(b'# Fix')
+    if pos < 0:
+        return None
+    end = mm.find(b'\n', pos)
+    line = mm[pos:end if end >= 0 else len(mm)].decode('utf-8', errors='ignore')
+    return [c.strip() for c in line.replace('#', '').strip().split(',')]
+
+
+def _line_at(mm, start):
+    end = mm.find(b'\n', start)
+    return mm[start:end if end >= 0 else len(mm)].decode('utf-8', errors='ignore').strip()
+
+
+def _count_fix(mm):
+    n = 1 if mm[:3] == b'Fix' else 0
+    overlap = len(FIX_PREFIX) - 1
+    for i in range(0, len(mm), SCAN_BLOCK):
+        # ブロック境界にまたがる b'\nFix' を拾うため、前のブロックの末尾を重ねる
+        n += mm[max(i - overlap, 0):i + SCAN_BLOCK].count(FIX_PREFIX)
+    return n
+
+
+def _fix_time(line, t_idx):
+    try:
+        return float(line.split(',')[t_idx])
+    except (IndexError, ValueError):
+        return None
+
+
+def prescan_log(filepath):
+    """
+    1つのログ -> dict (n_fix, t_first, t_last, duration, has_header)。
+    時刻が読めなければ t_first / t_last / duration は None。圧縮ログは走査できないので None。
+    """
+    if Path(filepath).suffix in ('.gz', '.xz', '.zst'):
+        return None
+    res = {'n_fix': 0, 't_first': None, 't_last': None, 'duration': None, 'has_header': False}
+    with Path(filepath).open('rb') as f:
+        if f.seek(0, 2) == 0:
+            return res
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header = _fix_header(mm)
+            res['has_header'] = header is not None and mm.find(b'# Status') >= 0
+            res['n_fix'] = _count_fix(mm)
+            if res['n_fix'] == 0 or header is None or 'UnixTimeMillis' not in header:
+                return res
+
+            t_idx = header.index('UnixTimeMillis')
+            # 先頭側: 最初の Fix 行 / 末尾側: 最後の Fix 行
+            first = 0 if mm[:3] == b'Fix' else mm.find(FIX_PREFIX) + 1
+            last = mm.rfind(FIX_PREFIX) + 1 if mm.rfind(FIX_PREFIX) >= 0 else 0
+            t0 = _fix_time(_line_at(mm, first), t_idx)
+            t1 = _fix_time(_line_at(mm, last), t_idx)
+    if t0 is not None and t1 is not None:
+        res['t_first'], res['t_last'] = t0, t1
+        res['duration'] = abs(t1 - t0) / 1000.0
+    return res
+
+
+def prescan_failure(scan, min_epochs, min_duration):
+    """
+    QC 不合格の理由 (run_baseline.py の qc_fails.csv と同じ文言)。合格・判定不能なら None。
+    """
+    if scan is None:
+        return None
+    if not scan['has_header']:
+        return "Parse Error: Missing Header"
+    if scan['n_fix'] < min_epochs:
+        return f"Low Epochs ({scan['n_fix']})"
+    if scan['duration'] is not None and scan['duration'] < min_duration:
+        return f"Short Duration ({scan['duration']:.1f}s)"
+    return None
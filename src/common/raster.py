@@ -0,0 +1,336 @@
+import struct
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+# ==========================================
+# 設定
+# ==========================================
+# data_qgis/processed のラスタ (QGIS で作成済み) とレイヤ名の対応
+# risk_horizon / overhead_score のラスタは存在すれば読み込む (無ければ NaN を返す)
+DEFAULT_LAYERS = {
+    "risk_proxy":     "risk_proxy_5m.tif",
+    "risk_class":     "risk_class_5m_py.tif",
+    "svf_proxy":      "svf_proxy_5m.tif",
+    "risk_horizon":   "risk_horizon_5m.tif",
+    "overhead_score": "overhead_score_5m.tif",
+}
+
+TILE_SIZE = 256                 # キャッシュ単位のタイル (ピクセル)
+DEFAULT_CACHE_BYTES = 64 << 20  # タイルキャッシュの上限 (64 MiB)
+
+# TIFF タグ番号
+_TAG_WIDTH, _TAG_HEIGHT, _TAG_BITS, _TAG_COMPRESSION = 256, 257, 258, 259
+_TAG_STRIP_OFFSETS, _TAG_SAMPLES, _TAG_ROWS_PER_STRIP, _TAG_STRIP_COUNTS = 273, 277, 278, 279
+_TAG_TILE_WIDTH, _TAG_TILE_LENGTH, _TAG_TILE_OFFSETS, _TAG_TILE_COUNTS = 322, 323, 324, 325
+_TAG_SAMPLE_FORMAT = 339
+_TAG_PIXEL_SCALE, _TAG_TIEPOINT, _TAG_GDAL_NODATA = 33550, 33922, 42113
+
+# TIFF の型番号 -> (struct 書式, バイト数)
+_TIFF_TYPES = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8), 6: ("b", 1), 7: ("B", 1),
+    8: ("h", 2), 9: ("i", 4), 10: ("ii", 8), 11: ("f", 4), 12: ("d", 8), 16: ("Q", 8), 17: ("q", 8), 18: ("Q", 8),
+}
+
+# (SampleFormat, BitsPerSample) -> numpy dtype
+_SAMPLE_DTYPES = {
+    (1, 8): "u1", (1, 16): "u2", (1, 32): "u4",
+    (2, 8): "i1", (2, 16): "i2", (2, 32): "i4",
+    (3, 32): "f4", (3, 64): "f8",
+}
+
+
+# ==========================================
+# GeoTIFF 読み込み (memmap)
+# ==========================================
+class GeoTiff:
+    """
+    単バンドの非圧縮 GeoTIFF を numpy.memmap で開く。
+    ピクセル値はファイルから直接参照するため、開くだけではメモリを消費しない。
+    圧縮ファイルは tifffile があればメモリに展開して読む。
+    複数ページの TIFF (common.height_pyramid) は page で読むページ (0 始まり) を選ぶ。
+    """
+
+    def __init__(self, path, page=0):
+        self.path = Path(path)
+        self.page = page
+        self._raw = np.memmap(self.path, dtype=np.uint8, mode="r")
+        tags = self._read_ifd(page)
+
+        self.width = int(tags[_TAG_WIDTH][0])
+        self.height = int(tags[_TAG_HEIGHT][0])
+        if int(tags.get(_TAG_SAMPLES, (1,))[0]) != 1:
+            raise ValueError(f"{self.path.name}: 単バンドのラスタのみ対応しています")
+
+        fmt = int(tags.get(_TAG_SAMPLE_FORMAT, (1,))[0])
+        bits = int(tags[_TAG_BITS][0])
+        self.dtype = np.dtype(_SAMPLE_DTYPES[(fmt, bits)]).newbyteorder(self._bo)
+
+        # ジオリファレンス (左上隅の座標とピクセルサイズ)
+        scale = tags[_TAG_PIXEL_SCALE]
+        tie = tags[_TAG_TIEPOINT]
+        self.res_x, self.res_y = float(scale[0]), float(scale[1])
+        self.x0 = float(tie[3]) - float(tie[0]) * self.res_x
+        self.y0 = float(tie[4]) + float(tie[1]) * self.res_y
+
+        self.nodata = None
+        if _TAG_GDAL_NODATA in tags:
+            self.nodata = float(tags[_TAG_GDAL_NODATA].strip("\x00 "))
+
+        compression = int(tags.get(_TAG_COMPRESSION, (1,))[0])
+        if compression == 1:
+            self._data = self._map_pixels(tags)
+        else:
+            self._data = self._load_compressed()
+
+    # --- IFD 解析 ---
+    def _read_ifd(self, page):
+        raw = self._raw
+        self._bo = "<" if bytes(raw[:2]) == b"II" else ">"
+        magic = struct.unpack_from(self._bo + "H", raw, 2)[0]
+        big = magic == 43
+        if big:
+            off_fmt, count_fmt, count_size, entry_fmt, entry_size, inline_size = "Q", "Q", 8, "HHQ", 20, 8
+            next_off = struct.unpack_from(self._bo + "Q", raw, 8)[0]
+        else:
+            off_fmt, count_fmt, count_size, entry_fmt, entry_size, inline_size = "I", "H", 2, "HHI", 12, 4
+            next_off = struct.unpack_from(self._bo + "I", raw, 4)[0]
+
+        # IFD の連結リストをたどってページ数を数える
+        offsets = []
+        while next_off:
+            offsets.append(next_off)
+            n = struct.unpack_from(self._bo + count_fmt, raw, next_off)[0]
+            next_off = struct.unpack_from(self._bo + off_fmt, raw, next_off + count_size + n * entry_size)[0]
+        self.n_pages = len(offsets)
+        if not 0 <= page < self.n_pages:
+            raise ValueError(f"{self.path.name}: page {page} がありません (ページ数 {self.n_pages})")
+        ifd_off = offsets[page]
+        n_entries = struct.unpack_from(self._bo + count_fmt, raw, ifd_off)[0]
+        first = ifd_off + count_size
+
+        tags = {}
+        for i in range(n_entries):
+            pos = first + i * entry_size
+            tag, typ, count = struct.unpack_from(self._bo + entry_fmt, raw, pos)
+            if typ not in _TIFF_TYPES:
+                continue
+            code, size = _TIFF_TYPES[typ]
+            nbytes = size * count
+            value_pos = pos + 4 + (8 if big else 4)
+            if nbytes > inline_size:
+                value_pos = struct.unpack_from(self._bo + ("Q" if big else "I"), raw, value_pos)[0]
+            if typ == 2:
+                tags[tag] = bytes(raw[value_pos:value_pos + count]).decode("ascii", "ignore")
+            else:
+                tags[tag] = struct.unpack_from(self._bo + code * count, raw, value_pos)
+        return tags
+
+    def _map_pixels(self, tags):
+        """ストリップ/タイルの配置から、ピクセル配列の memmap ビューを作る"""
+        itemsize = self.dtype.itemsize
+        if _TAG_TILE_OFFSETS in tags:
+            tw, th = int(tags[_TAG_TILE_WIDTH][0]), int(tags[_TAG_TILE_LENGTH][0])
+            offsets = np.asarray(tags[_TAG_TILE_OFFSETS], dtype=np.int64)
+            n_down, n_across = -(-self.height // th), -(-self.width // tw)
+            tile_bytes = tw * th * itemsize
+            if not np.all(np.diff(offsets) == tile_bytes):
+                return self._load_compressed()
+            start = int(offsets[0])
+            blocks = self._raw[start:start + tile_bytes * len(offsets)].view(self.dtype)
+            blocks = blocks.reshape(n_down, n_across, th, tw)
+            # タイル並び (n_down, n_across, th, tw) -> (H, W) は memmap のままでは作れないため
+            # 読み出し時にタイル単位で組み立てる
+            self._tile_shape = (th, tw)
+            return blocks
+
+        offsets = np.asarray(tags[_TAG_STRIP_OFFSETS], dtype=np.int64)
+        counts = np.asarray(tags[_TAG_STRIP_COUNTS], dtype=np.int64)
+        if len(offsets) > 1 and not np.all(offsets[1:] == offsets[:-1] + counts[:-1]):
+            return self._load_compressed()
+        start = int(offsets[0])
+        n = self.width * self.height
+        return self._raw[start:start + n * itemsize].view(self.dtype).reshape(self.height, self.width)
+
+    def _load_compressed(self):
+        try:
+            import tifffile
+        except ImportError:
+            raise ValueError(
+                f"{self.path.name}: 圧縮/非連続の GeoTIFF は memmap できません。"
+                " gdal_translate -co COMPRESS=NONE で変換するか tifffile をインストールしてください。"
+            )
+        return np.asarray(tifffile.imread(self.path))
+
+    # --- 読み出し ---
+    def read_window(self, r0, r1, c0, c1):
+        """行 [r0, r1) × 列 [c0, c1) を (範囲内に切り詰めて) ndarray にコピーして返す"""
+        r0, c0 = max(r0, 0), max(c0, 0)
+        r1, c1 = min(r1, self.height), min(c1, self.width)
+        if self._data.ndim == 2:
+            return np.array(self._data[r0:r1, c0:c1], dtype=self.dtype.newbyteorder("="))
+
+        th, tw = self._tile_shape
+        out = np.empty((r1 - r0, c1 - c0), dtype=self.dtype.newbyteorder("="))
+        for ty in range(r0 // th, (r1 - 1) // th + 1):
+            for tx in range(c0 // tw, (c1 - 1) // tw + 1):
+                tr0, tc0 = ty * th, tx * tw
+                a0, a1 = max(r0, tr0), min(r1, tr0 + th)
+                b0, b1 = max(c0, tc0), min(c1, tc0 + tw)
+                out[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = self._data[ty, tx, a0 - tr0:a1 - tr0, b0 - tc0:b1 - tc0]
+        return out
+
+    def as_array(self):
+        """(H, W) の配列。ストリップ形式なら memmap のビューをそのまま返す (コピーしない)"""
+        if self._data.ndim == 2:
+            return self._data
+        return self.read_window(0, self.height, 0, self.width)
+
+    def xy_to_rowcol(self, x, y):
+        """投影座標 (x, y) -> ピクセルの (row, col)。範囲外でもそのまま返す"""
+        col = np.floor((np.asarray(x, dtype=float) - self.x0) / self.res_x).astype(np.int64)
+        row = np.floor((self.y0 - np.asarray(y, dtype=float)) / self.res_y).astype(np.int64)
+        return row, col
+
+
+# ==========================================
+# タイル LRU キャッシュ
+# ==========================================
+class TileCache:
+    """
+    (レイヤ名, タイル番号) -> ndarray の LRU キャッシュ。
+    保持するタイルの合計バイト数が max_bytes を超えたら古い順に捨てる。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles = OrderedDict()
+
+    def get(self, key, loader):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        self.misses += 1
+        tile = loader()
+        self._tiles[key] = tile
+        self.nbytes += tile.nbytes
+        while self.nbytes > self.max_bytes and len(self._tiles) > 1:
+            _, old = self._tiles.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+        return tile
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else None,
+            "tiles": len(self._tiles), "bytes": self.nbytes, "max_bytes": self.max_bytes,
+        }
+
+
+class RasterLayer:
+    """GeoTiff をタイル単位でキャッシュしながら点サンプリングする"""
+
+    def __init__(self, name, path, cache, tile_size=TILE_SIZE):
+        self.name = name
+        self.tif = GeoTiff(path)
+        self.cache = cache
+        self.tile_size = tile_size
+        self._n_tiles_x = -(-self.tif.width // tile_size)
+
+    def _tile(self, key):
+        ts = self.tile_size
+        ty, tx = divmod(int(key), self._n_tiles_x)
+        return self.cache.get(
+            (self.name, ty, tx),
+            lambda: self.tif.read_window(ty * ts, (ty + 1) * ts, tx * ts, (tx + 1) * ts),
+        )
+
+    def sample(self, x, y):
+        """投影座標 (EPSG:6677) の点列で値を取り出す。範囲外・NoData は NaN"""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        out = np.full(x.shape, np.nan)
+
+        row, col = self.tif.xy_to_rowcol(x, y)
+        inside = (row >= 0) & (row < self.tif.height) & (col >= 0) & (col < self.tif.width)
+        if not inside.any():
+            return out
+
+        ts = self.tile_size
+        r, c = row[inside], col[inside]
+        keys = (r // ts) * self._n_tiles_x + (c // ts)
+        vals = np.empty(len(r))
+        uniq, inv = np.unique(keys, return_inverse=True)
+        for i, key in enumerate(uniq):
+            sel = inv == i
+            vals[sel] = self._tile(key)[r[sel] % ts, c[sel] % ts]
+
+        nodata = self.tif.nodata
+        if nodata is not None and not np.isnan(nodata):
+            vals[vals == nodata] = np.nan
+        out[inside] = vals
+        return out
+
+
+class RasterStack:
+    """
+    data_qgis/processed の複数ラスタを1つのタイルキャッシュで共有して点サンプリングする。
+    ファイルが無いレイヤは missing に記録し、値は NaN を返す。
+    """
+
+    def __init__(self, raster_dir, layers=None, cache_bytes=DEFAULT_CACHE_BYTES, tile_size=TILE_SIZE):
+        self.raster_dir = Path(raster_dir)
+        self.cache = TileCache(cache_bytes)
+        self.layers, self.missing = {}, []
+        for name, filename in (layers or DEFAULT_LAYERS).items():
+            path = self.raster_dir / filename
+            if path.exists():
+                self.layers[name] = RasterLayer(name, path, self.cache, tile_size)
+            else:
+                self.missing.append(name)
+
+    @property
+    def names(self):
+        return list(self.layers) + self.missing
+
+    def sample_xy(self, x, y):
+        """{レイヤ名: 値の配列} を返す"""
+        x = np.atleast_1d(np.asarray(x, dtype=float))
+        y = np.atleast_1d(np.asarray(y, dtype=float))
+        res = {name: layer.sample(x, y) for name, layer in self.layers.items()}
+        for name in self.missing:
+            res[name] = np.full(x.shape, np.nan)
+        return res
+
+    def sample_lonlat(self, lon, lat):
+        """経度・緯度で問い合わせる。戻り値は (x, y, {レイヤ名: 値})"""
+        from common.geo import lonlat_to_xy
+        x, y = lonlat_to_xy(np.atleast_1d(lon), np.atleast_1d(lat))
+        return x, y, self.sample_xy(x, y)
+
+
+# ==========================================
+# 近傍最大 (src_qgis/svf_risk_localmax_layer.py の r.neighbors method=maximum 相当)
+# ==========================================
+def local_max(grid, radius_m=30.0, cell_m=5.0, nodata=None):
+    """
+    (H, W) の建物高さ -> 一辺 round(radius_m / cell_m) * 2 + 1 セルの正方近傍の最大値。
+    NaN・nodata のセルは無視し、近傍が全て欠損なら NaN。scipy.ndimage.maximum_filter (分離可能な1次元の走査) で計算する。
+    """
+    from scipy import ndimage
+    size = max(1, int(round(radius_m / cell_m))) * 2 + 1
+    a = np.asarray(grid, dtype=float)
+    missing = np.isnan(a) if nodata is None else np.isnan(a) | (a == nodata)
+    out = ndimage.maximum_filter(np.where(missing, -np.inf, a), size=size, mode="constant", cval=-np.inf)
+    out[np.isneginf(out)] = np.nan
+    return out
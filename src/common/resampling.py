@@ -0,0 +1,82 @@
+"""
+ブロック・層別ブートストラップのリサンプル (添字の配列) を作る。
+
+  ブロック : まとめて抽出するサイトの組 (空間ブロックなら同じ格子セルのサイト)。1サイト1ブロックなら通常の i.i.d.
+  層       : 層ごとに元の件数だけ抽出する (class ごとの件数を保つ)
+
+各層ではブロックを復元抽出して並べ、元の件数に達したところで切る (大きさの違うブロックの扱い)。
+ブロックの構成は最初に1度だけ作り、リサンプルは (リサンプル数, 件数) の添字の行列としてまとめて作る。
+"""
+import numpy as np
+
+# サイト表のリサンプルの方法 (site_resampler)
+#   iid                : サイトを独立に復元抽出
+#   stratified         : class (open / street / alley) ごとに件数を保って復元抽出
+#   spatial            : block_m 四方の格子セル (center_x_6677 / center_y_6677) ごとにまとめて復元抽出
+#   stratified_spatial : class ごとに、その class のサイトの格子セルをまとめて復元抽出
+SITE_MODES = ['iid', 'stratified', 'spatial', 'stratified_spatial']
+
+
+def grid_blocks(x, y, block_m):
+    """平面座標 [m] -> 一辺 block_m の格子セルの番号"""
+    ix = np.floor(np.asarray(x, dtype=float) / block_m).astype(np.int64)
+    iy = np.floor(np.asarray(y, dtype=float) / block_m).astype(np.int64)
+    return np.unique(np.stack([ix, iy], axis=1), axis=0, return_inverse=True)[1].ravel()
+
+
+class BlockResampler:
+    """blocks / strata: サイトごとのブロック・層のラベル (strata=None なら層は1つ)"""
+
+    def __init__(self, blocks, strata=None):
+        blocks = np.asarray(blocks)
+        self.n = len(blocks)
+        strata = np.zeros(self.n, dtype=int) if strata is None else np.asarray(strata)
+        self.strata = []
+        for s in np.unique(strata):
+            members = np.flatnonzero(strata == s)
+            # ブロック (層の中) -> サイトの添字。足りない所は -1 で埋めた行列
+            _, block_of = np.unique(blocks[members], return_inverse=True)
+            sizes = np.bincount(block_of)
+            table = np.full((len(sizes), sizes.max()), -1, dtype=np.int64)
+            slot = np.zeros(len(sizes), dtype=int)
+            for i, b in zip(members, block_of):
+                table[b, slot[b]] = i
+                slot[b] += 1
+            # 元の件数に必ず届くブロック数
+            n_draw = -(-len(members) // sizes.min())
+            self.strata.append((len(members), table, n_draw))
+
+    @property
+    def n_blocks(self):
+        return sum(len(table) for _, table, _ in self.strata)
+
+    def sample(self, n_boot, rng):
+        """(n_boot, n) の添字の行列"""
+        parts = []
+        for n_s, table, n_draw in self.strata:
+            drawn = table[rng.integers(0, len(table), (n_boot, n_draw))].reshape(n_boot, -1)
+            # -1 (埋め草) を後ろに寄せ、先頭の n_s 件を使う
+            keep = np.argsort(drawn < 0, axis=1, kind='stable')[:, :n_s]
+            parts.append(np.take_along_axis(drawn, keep, axis=1))
+        return np.concatenate(parts, axis=1)
+
+    def iter_samples(self, n_boot, rng, chunk=1000):
+        """chunk 個ずつのリサンプルを返す (件数が多いときのメモリを抑える)"""
+        for start in range(0, n_boot, chunk):
+            yield self.sample(min(chunk, n_boot - start), rng)
+
+
+def site_resampler(df, mode='iid', block_m=100.0):
+    """サイト表 (sites_risk.csv の列を持つ) -> BlockResampler"""
+    n = len(df)
+    if mode == 'iid':
+        return BlockResampler(np.arange(n))
+    cls = df['class'].astype(str).to_numpy() if mode in ('stratified', 'stratified_spatial') else None
+    if mode == 'stratified':
+        return BlockResampler(np.arange(n), strata=cls)
+    cells = grid_blocks(df['center_x_6677'], df['center_y_6677'], block_m)
+    if mode == 'spatial':
+        return BlockResampler(cells)
+    if mode == 'stratified_spatial':
+        return BlockResampler(cells, strata=cls)
+    raise ValueError(f"unknown bootstrap mode: {mode}")
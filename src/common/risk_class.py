@@ -0,0 +1,29 @@
+import numpy as np
+
+# risk_proxy_5m のしきい値 (src_qgis/for_PNT_sites_raw.py の Q30 / Q70 と同期)
+Q30 = 0.07203729078173637
+Q70 = 0.2442609965801239
+
+# 1=open, 2=street, 3=alley
+CLASS_NAMES = {1: "open", 2: "street", 3: "alley"}
+
+
+def classify_risk(risk):
+    """risk_proxy -> クラス (1/2/3)。NaN はそのまま NaN"""
+    risk = np.asarray(risk, dtype=float)
+    cls = np.where(risk <= Q30, 1.0, np.where(risk < Q70, 2.0, 3.0))
+    cls[np.isnan(risk)] = np.nan
+    return cls
+
+
+def fill_risk_class(values):
+    """
+    sample_xy の結果で risk_class が NoData の点を risk_proxy のしきい値で補う。
+    (risk_class_5m_py.tif が未作成・空の場合でもクラスを返せるようにする)
+    """
+    cls = np.array(values["risk_class"], dtype=float)
+    missing = np.isnan(cls)
+    if missing.any() and "risk_proxy" in values:
+        cls[missing] = classify_risk(values["risk_proxy"][missing])
+    values["risk_class"] = cls
+    return values
@@ -0,0 +1,179 @@
+"""
+時間窓 (直近 window_s 秒) のローリング指標を、窓ごとに再計算せず逐次更新で求める。
+
+  min / max : 単調デック (追加・削除とも償却 O(1))
+  p50 / p95 : 順序統計木 (sortedcontainers.SortedList、O(log n))
+  mean      : 累積和
+
+エポック単位のテーブル (epoch_dataset.build_epoch_table の出力) を時刻順に流し込む。
+RollingMetrics.update は1エポックずつ使えるので、追記中のログの監視にも使える。
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from sortedcontainers import SortedList
+
+WINDOW_S = 60.0
+# 列 -> 求める統計量
+DEFAULT_METRICS = {
+    'err_h_m': ('p50', 'p95'),
+    'hdop': ('p50', 'max'),
+    'n_used': ('mean', 'min'),
+    'cn0_mean': ('mean', 'min'),
+}
+
+
+class MonotonicDeque:
+    """窓内の最小値 (mode='min') / 最大値 (mode='max')"""
+
+    def __init__(self, mode='min'):
+        self.q = deque()  # (t, v)。v は先頭から単調
+        self._worse = (lambda a, b: a >= b) if mode == 'min' else (lambda a, b: a <= b)
+
+    def push(self, t, v):
+        while self.q and self._worse(self.q[-1][1], v):
+            self.q.pop()
+        self.q.append((t, v))
+
+    def evict(self, t_min):
+        while self.q and self.q[0][0] <= t_min:
+            self.q.popleft()
+
+    @property
+    def value(self):
+        return self.q[0][1] if self.q else np.nan
+
+
+class WindowQuantile:
+    """窓内の分位点 (np.percentile と同じ線形補間)"""
+
+    def __init__(self):
+        self.values = SortedList()
+
+    def push(self, v):
+        self.values.add(v)
+
+    def remove(self, v):
+        self.values.remove(v)
+
+    def quantile(self, q):
+        n = len(self.values)
+        if n == 0:
+            return np.nan
+        h = q * (n - 1)
+        lo = int(np.floor(h))
+        v0 = self.values[lo]
+        return v0 if lo == n - 1 else v0 + (h - lo) * (self.values[lo + 1] - v0)
+
+
+class WindowMean:
+    def __init__(self):
+        self.total, self.count = 0.0, 0
+
+    def push(self, v):
+        self.total += v
+        self.count += 1
+
+    def remove(self, v):
+        self.total -= v
+        self.count -= 1
+        if self.count == 0:
+            self.total = 0.0  # 丸め誤差の蓄積をリセット
+
+    @property
+    def value(self):
+        return self.total / self.count if self.count else np.nan
+
+
+class RollingMetrics:
+    """
+    update(t_ms, {列: 値}) で1エポックを加え、窓 (t - window, t] の指標を dict で返す。
+    NaN の値はその列の集計から除外する。
+    """
+
+    def __init__(self, window_s=WINDOW_S, metrics=None):
+        self.window_ms = float(window_s) * 1000.0
+        self.metrics = dict(metrics or DEFAULT_METRICS)
+        self.rows = deque()  # (t, {列: 値}) 窓から外れたときに取り除く値
+        self.extrema, self.quantiles, self.means = {}, {}, {}
+        for col, stats in self.metrics.items():
+            for s in stats:
+                if s in ('min', 'max'):
+                    self.extrema[(col, s)] = MonotonicDeque(s)
+                elif s == 'mean':
+                    self.means[col] = WindowMean()
+                elif s.startswith('p'):
+                    self.quantiles.setdefault(col, WindowQuantile())
+                else:
+                    raise ValueError(f"unknown rolling statistic: {s}")
+
+    def update(self, t, values):
+        t = float(t)
+        kept = {}
+        for col in self.metrics:
+            v = values.get(col, np.nan)
+            if v is None or v != v:
+                continue
+            v = float(v)
+            kept[col] = v
+            for s in ('min', 'max'):
+                if (col, s) in self.extrema:
+                    self.extrema[(col, s)].push(t, v)
+            if col in self.quantiles:
+                self.quantiles[col].push(v)
+            if col in self.means:
+                self.means[col].push(v)
+        self.rows.append((t, kept))
+        self._evict(t - self.window_ms)
+        return self.snapshot()
+
+    def _evict(self, t_min):
+        while self.rows and self.rows[0][0] <= t_min:
+            _, kept = self.rows.popleft()
+            for col, v in kept.items():
+                if col in self.quantiles:
+                    self.quantiles[col].remove(v)
+                if col in self.means:
+                    self.means[col].remove(v)
+        for d in self.extrema.values():
+            d.evict(t_min)
+
+    def snapshot(self):
+        out = {'n_epochs': len(self.rows)}
+        for col, stats in self.metrics.items():
+            for s in stats:
+                if s in ('min', 'max'):
+                    v = self.extrema[(col, s)].value
+                elif s == 'mean':
+                    v = self.means[col].value
+                else:
+                    v = self.quantiles[col].quantile(float(s[1:]) / 100.0)
+                out[f'{col}_{s}'] = v
+        return out
+
+
+def rolling_table(df, window_s=WINDOW_S, metrics=None, step_s=None, time_col='UnixTimeMillis'):
+    """
+    エポック単位のテーブル (1サイト分) -> 時刻インデックスのローリング指標テーブル。
+    step_s を指定すると step_s 秒ごとに1行だけ出力する (窓の計算は全エポックで行う)。
+    """
+    roll = RollingMetrics(window_s, metrics)
+    df = df.sort_values(time_col, kind='stable')
+    cols = [c for c in roll.metrics if c in df.columns]
+    times = df[time_col].to_numpy(np.int64)
+    data = {c: df[c].to_numpy(float) for c in cols}
+
+    out_t, rows = [], []
+    next_emit = None
+    for i, t in enumerate(times):
+        snap = roll.update(t, {c: data[c][i] for c in cols})
+        if step_s is None or next_emit is None or t >= next_emit:
+            out_t.append(t)
+            rows.append(snap)
+            next_emit = t + step_s * 1000.0 if step_s else None
+
+    res = pd.DataFrame(rows)
+    res.insert(0, time_col, np.asarray(out_t, dtype=np.int64))
+    res.index = pd.to_datetime(res[time_col], unit='ms', utc=True).rename('time')
+    return res
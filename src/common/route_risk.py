@@ -0,0 +1,178 @@
+"""
+経路 (ポリライン) に沿った GNSS リスクの評価。
+
+UAV / 配送ロボットのプランナが候補経路を大量に比較する用途を想定し、
+経路の細分化・ラスタ参照・集計をすべて numpy の配列演算で行う。
+経路は EPSG:6677 の頂点列で受け取る (緯度経度の場合は routes_from_latlon で変換)。
+"""
+from pathlib import Path
+
+import numpy as np
+
+from common.raster import GeoTiff, DEFAULT_LAYERS
+from common.risk_class import classify_risk
+
+DEFAULT_STEP_M = 2.5   # 細分化の間隔 (5m ラスタの半分)
+HIGH_RISK_CLASS = 3    # alley 相当を「高リスク」とする
+
+# 経路評価に使うレイヤ (無いものは NaN 扱い)
+ROUTE_LAYERS = {k: DEFAULT_LAYERS[k] for k in ("risk_proxy", "risk_class", "overhead_score")}
+
+
+def pack_routes(routes):
+    """頂点列のリスト [(N_i, 2), ...] -> (vertices (M, 2), offsets (R+1,))"""
+    routes = [np.asarray(r, dtype=float).reshape(-1, 2) for r in routes]
+    lengths = np.array([len(r) for r in routes], dtype=np.int64)
+    if len(routes) == 0 or lengths.min() < 2:
+        raise ValueError("each route needs at least 2 vertices")
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    return np.concatenate(routes), offsets
+
+
+def routes_from_latlon(routes_latlon):
+    """[(lat, lon), ...] の経路リストを EPSG:6677 の (x, y) に変換して pack する"""
+    from common.geo import lonlat_to_xy
+    vertices, offsets = pack_routes(routes_latlon)
+    xx, yy = lonlat_to_xy(vertices[:, 1], vertices[:, 0])
+    return np.column_stack([xx, yy]), offsets
+
+
+def densify(vertices, offsets, step_m=DEFAULT_STEP_M):
+    """
+    各区間を step_m 以下の小区間に分け、その中点をサンプル点とする。
+    戻り値は dict:
+      x, y     : サンプル点の座標
+      ds       : サンプル点が代表する長さ (m)
+      seg      : サンプル点が属する区間番号 (全経路通し)
+      route    : サンプル点が属する経路番号
+      seg_route: 区間 -> 経路番号, seg_len: 区間長
+    """
+    n_vert = len(vertices)
+    # 各経路の最終頂点は区間の始点にならない
+    is_start = np.ones(n_vert, dtype=bool)
+    is_start[offsets[1:] - 1] = False
+    start = np.flatnonzero(is_start)
+
+    d = vertices[start + 1] - vertices[start]
+    seg_len = np.hypot(d[:, 0], d[:, 1])
+    n_sub = np.maximum(1, np.ceil(seg_len / step_m)).astype(np.int64)
+
+    seg = np.repeat(np.arange(len(start)), n_sub)
+    first = np.cumsum(n_sub) - n_sub
+    k = np.arange(len(seg)) - first[seg]
+    t = (k + 0.5) / n_sub[seg]
+
+    seg_route = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets) - 1)
+    return {
+        "x": vertices[start[seg], 0] + t * d[seg, 0],
+        "y": vertices[start[seg], 1] + t * d[seg, 1],
+        "ds": (seg_len / n_sub)[seg],
+        "seg": seg,
+        "route": seg_route[seg],
+        "seg_route": seg_route,
+        "seg_len": seg_len,
+        "seg_first": first,
+    }
+
+
+class RouteScorer:
+    """
+    risk_proxy / risk_class / overhead_score のラスタを memmap で保持し、
+    経路群をまとめて評価する。
+    """
+
+    def __init__(self, raster_dir, layers=None, step_m=DEFAULT_STEP_M, high_class=HIGH_RISK_CLASS):
+        self.step_m = step_m
+        self.high_class = high_class
+        self._grids = {}
+        for name, filename in (layers or ROUTE_LAYERS).items():
+            path = Path(raster_dir) / filename
+            if path.exists():
+                tif = GeoTiff(path)
+                self._grids[name] = (tif, tif.as_array())
+
+    def sample(self, x, y):
+        """インデックス計算だけでラスタ値を取り出す。範囲外・NoData は NaN"""
+        res = {}
+        for name in ROUTE_LAYERS:
+            if name not in self._grids:
+                res[name] = np.full(len(x), np.nan)
+                continue
+            tif, arr = self._grids[name]
+            row, col = tif.xy_to_rowcol(x, y)
+            inside = (row >= 0) & (row < tif.height) & (col >= 0) & (col < tif.width)
+            vals = np.full(len(x), np.nan)
+            vals[inside] = arr[row[inside], col[inside]]
+            if tif.nodata is not None and not np.isnan(tif.nodata):
+                vals[vals == tif.nodata] = np.nan
+            res[name] = vals
+
+        cls = res["risk_class"]
+        missing = np.isnan(cls)
+        cls[missing] = classify_risk(res["risk_proxy"][missing])
+        return res
+
+    def score(self, routes):
+        """経路のリスト [(N_i, 2), ...] (EPSG:6677) を評価する"""
+        vertices, offsets = pack_routes(routes)
+        return self.score_packed(vertices, offsets)
+
+    def score_packed(self, vertices, offsets):
+        """
+        pack 済みの経路群を評価し、(経路ごとの指標, 区間ごとの指標) を dict of ndarray で返す。
+
+        経路ごと: length_m, risk_integral (∫risk ds), risk_mean, risk_max,
+                 class3_frac (高リスククラスの距離割合), longest_high_risk_m,
+                 overhead_max, coverage (ラスタ範囲内の距離割合)
+        """
+        s = densify(vertices, offsets, self.step_m)
+        v = self.sample(s["x"], s["y"])
+        ds, seg, route = s["ds"], s["seg"], s["route"]
+        n_seg, n_route = len(s["seg_len"]), len(offsets) - 1
+
+        risk = v["risk_proxy"]
+        valid = ~np.isnan(risk)
+        w_valid = np.where(valid, ds, 0.0)
+        risk_w = np.where(valid, risk * ds, 0.0)
+        high = v["risk_class"] >= self.high_class
+        high_w = np.where(high, ds, 0.0)
+
+        # --- 区間ごと (サンプル点は区間ごとに連続して並んでいる) ---
+        seg_valid = np.bincount(seg, w_valid, n_seg)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            seg_metrics = {
+                "route": s["seg_route"],
+                "length_m": s["seg_len"],
+                "risk_mean": np.bincount(seg, risk_w, n_seg) / seg_valid,
+                "risk_max": np.fmax.reduceat(risk, s["seg_first"]),
+                "class3_frac": np.bincount(seg, high_w, n_seg) / s["seg_len"],
+                "overhead_max": np.fmax.reduceat(v["overhead_score"], s["seg_first"]),
+            }
+
+        # --- 経路ごと ---
+        route_first = np.searchsorted(route, np.arange(n_route))
+        length = np.bincount(route, ds, n_route)
+        route_valid = np.bincount(route, w_valid, n_route)
+        integral = np.bincount(route, risk_w, n_route)
+
+        # 連続する高リスク区間 (経路の切れ目でランを区切る)
+        prev_high = np.r_[False, high[:-1]]
+        prev_high[route_first] = False
+        run_start = high & ~prev_high
+        run_id = np.cumsum(run_start) - 1
+        run_len = np.bincount(run_id[high], ds[high], int(run_start.sum()))
+        longest = np.zeros(n_route)
+        np.maximum.at(longest, route[run_start], run_len)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            route_metrics = {
+                "length_m": length,
+                "risk_integral": integral,
+                "risk_mean": integral / route_valid,
+                "risk_max": np.fmax.reduceat(risk, route_first),
+                "class3_frac": np.bincount(route, high_w, n_route) / length,
+                "longest_high_risk_m": longest,
+                "overhead_max": np.fmax.reduceat(v["overhead_score"], route_first),
+                "coverage": route_valid / length,
+            }
+        return route_metrics, seg_metrics
@@ -0,0 +1,156 @@
+"""
+衛星ごとの追尾区間 (トラック) の索引と、Cn0 の仰角テンプレートによる NLoS 判定。
+
+トラック: 同じ (ConstellationType, Svid, 周波数) の観測を時刻順に並べ、MAX_GAP_MS を超える途切れで区切ったもの。
+NLoS 判定: 見通し (LoS) の Cn0 は仰角とともに上がる。周波数帯・仰角ビンごとの Cn0 上位分位点を
+テンプレートとし、それより NLOS_DEFICIT_DB 以上低い観測を NLoS 候補とする。一時的なフェージングを除くため、
+同じトラックで MIN_RUN エポック以上続いたものだけを NLoS とみなす。正解 (誤差) を使わない特徴量。
+
+どちらも argsort / bincount / searchsorted による一括処理で、観測数百万件でもループしない。
+"""
+import numpy as np
+
+MAX_GAP_MS = 2000          # これを超えて途切れたら別トラック (1 Hz ログで1エポック欠け程度まで許容)
+EL_BIN_DEG = 5.0           # テンプレートの仰角ビン幅
+TEMPLATE_QUANTILE = 0.9    # ビン内の Cn0 の上位分位点を LoS の基準とする
+MIN_BIN_COUNT = 20         # これより観測が少ないビンは隣のビンから補間する
+NLOS_DEFICIT_DB = 7.0      # テンプレートからの不足がこれ以上なら NLoS 候補
+MIN_RUN = 3                # NLoS 候補が同じトラックで続くエポック数の下限
+
+
+def frequency_band(carrier_hz):
+    """CarrierFrequencyHz -> 周波数帯コード (0: L1/E1/B1/G1 帯, 1: L5/E5/B2 帯, 2: その他, -1: 不明)"""
+    f = np.asarray(carrier_hz, dtype=float) / 1e6
+    band = np.full(f.shape, 2, dtype=np.int8)
+    band[(f > 1550) & (f < 1615)] = 0
+    band[(f > 1160) & (f < 1215)] = 1
+    band[np.isnan(f)] = -1
+    return band
+
+
+def satellite_keys(status):
+    """StatusStore -> 観測ごとの衛星・信号キー (int64)"""
+    return (status.constellation.astype(np.int64) << 24) | \
+           ((status.svid.astype(np.int64) & 0xFFFF) << 8) | status.freq_code.astype(np.int64)
+
+
+class TrackIndex:
+    """
+    order        : トラック順 (キー, 時刻) に並べた観測番号
+    starts, lengths : order 上での各トラックの区間
+    track_of     : 観測ごと (元の順) のトラック番号
+    """
+
+    def __init__(self, status, max_gap_ms=MAX_GAP_MS):
+        key = satellite_keys(status)
+        t = np.repeat(status.times, status.counts)
+        self.order = np.lexsort((t, key))
+        k, ts = key[self.order], t[self.order]
+        brk = np.r_[True, (k[1:] != k[:-1]) | (np.diff(ts) > max_gap_ms)] if len(k) else np.zeros(0, dtype=bool)
+        self.starts = np.flatnonzero(brk)
+        self.lengths = np.diff(np.r_[self.starts, len(k)])
+        self.key = k[self.starts]
+        self.t_start = ts[self.starts]
+        self.t_end = ts[np.r_[self.starts[1:], len(k)] - 1] if len(k) else ts
+        track_sorted = np.cumsum(brk) - 1
+        self.track_of = np.empty(len(k), dtype=np.int64)
+        self.track_of[self.order] = track_sorted
+
+    @property
+    def n_tracks(self):
+        return len(self.starts)
+
+    def per_track_mean(self, values):
+        v = np.asarray(values, dtype=float)
+        ok = ~np.isnan(v)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (np.bincount(self.track_of[ok], v[ok], self.n_tracks)
+                    / np.bincount(self.track_of[ok], minlength=self.n_tracks))
+
+    def runs_at_least(self, flags, min_run):
+        """同じトラック内で flags が min_run 回以上連続した観測だけ True (元の順で返す)"""
+        f = np.asarray(flags, dtype=bool)[self.order]
+        if not len(f):
+            return f
+        tr = self.track_of[self.order]
+        run_id = np.cumsum(np.r_[True, (f[1:] != f[:-1]) | (tr[1:] != tr[:-1])]) - 1
+        long_run = np.bincount(run_id)[run_id] >= min_run
+        out = np.empty(len(f), dtype=bool)
+        out[self.order] = f & long_run
+        return out
+
+
+class Cn0Template:
+    """周波数帯 × 仰角ビンごとの LoS 基準 Cn0 (上位分位点を仰角方向に単調化したもの)"""
+
+    def __init__(self, table, bin_deg=EL_BIN_DEG):
+        self.table = table  # (3 帯, n_bins)
+        self.bin_deg = bin_deg
+
+    @classmethod
+    def fit(cls, el, cn0, band, q=TEMPLATE_QUANTILE, bin_deg=EL_BIN_DEG, min_count=MIN_BIN_COUNT):
+        """観測 (複数サイトをまとめたもの) からテンプレートを作る"""
+        el, cn0, band = np.asarray(el, dtype=float), np.asarray(cn0, dtype=float), np.asarray(band)
+        n_bins = int(np.ceil(90.0 / bin_deg))
+        ok = ~(np.isnan(el) | np.isnan(cn0)) & (el >= 0) & (band >= 0)
+        b = np.clip((el[ok] / bin_deg).astype(np.int64), 0, n_bins - 1)
+        g = band[ok].astype(np.int64) * n_bins + b
+        v = cn0[ok]
+
+        # グループ (帯, ビン) ごとの分位点: グループ内で Cn0 を並べ、q の位置を読む
+        order = np.lexsort((v, g))
+        g_s, v_s = g[order], v[order]
+        counts = np.bincount(g_s, minlength=3 * n_bins)
+        starts = np.r_[0, np.cumsum(counts)[:-1]]
+        table = np.full(3 * n_bins, np.nan)
+        has = counts >= min_count
+        table[has] = v_s[starts[has] + (q * (counts[has] - 1)).astype(np.int64)]
+        table = table.reshape(3, n_bins)
+
+        centers = (np.arange(n_bins) + 0.5) * bin_deg
+        for i in range(3):
+            row = table[i]
+            ok_b = ~np.isnan(row)
+            if ok_b.sum() == 0:
+                continue
+            row[:] = np.interp(centers, centers[ok_b], row[ok_b])
+            row[:] = np.maximum.accumulate(row)  # LoS の Cn0 は仰角とともに下がらない
+        return cls(table, bin_deg)
+
+    def expected(self, el, band):
+        """観測ごとの LoS 基準 Cn0 (ビン中心間を線形補間)。不明な帯は NaN"""
+        el = np.asarray(el, dtype=float)
+        band = np.asarray(band)
+        n_bins = self.table.shape[1]
+        pos = np.clip(el / self.bin_deg - 0.5, 0, n_bins - 1)
+        lo = np.floor(np.nan_to_num(pos)).astype(np.int64)
+        hi = np.minimum(lo + 1, n_bins - 1)
+        w = pos - lo
+        b = np.clip(band, 0, 2)
+        out = (1 - w) * self.table[b, lo] + w * self.table[b, hi]
+        out[band < 0] = np.nan
+        return out
+
+
+def classify_nlos(status, template, tracks=None, deficit_db=NLOS_DEFICIT_DB, min_run=MIN_RUN):
+    """
+    StatusStore -> 観測ごとの NLoS フラグ (bool) と判定対象フラグ (仰角 >= 0・Cn0 とテンプレートがある観測)。
+    """
+    tracks = tracks or TrackIndex(status)
+    band = frequency_band(status.carrier_hz)
+    el = status.el.astype(float)
+    cn0 = status.cn0.astype(float)
+    expected = template.expected(el, band)
+    valid = ~(np.isnan(cn0) | np.isnan(expected)) & (el >= 0)
+    with np.errstate(invalid='ignore'):
+        candidate = valid & (expected - cn0 >= deficit_db)
+    return tracks.runs_at_least(candidate, min_run), valid
+
+
+def nlos_fraction(status, template, used_only=False, **kwargs):
+    """サイトの Cn0 ベース NLoS 率 (判定対象の観測に占める NLoS の割合)"""
+    nlos, valid = classify_nlos(status, template, **kwargs)
+    if used_only:
+        valid = valid & status.used
+    n = valid.sum()
+    return float((nlos & valid).sum() / n) if n else np.nan
@@ -0,0 +1,56 @@
+"""
+建物高さラスタからサイトごとの水平線プロファイル (スカイラインマスク) を求める。
+
+各方位について、サイトから放射状にラスタを参照し、建物上端を見込む仰角の最大値を
+その方位のマスク仰角とする。全サイト × 全方位 × 全距離を1回のインデックス計算で処理する。
+"""
+import numpy as np
+
+from common.raster import GeoTiff
+
+N_AZIMUTH = 72          # 5度刻み
+MAX_DIST_M = 300.0      # 探索距離
+ANTENNA_HEIGHT_M = 1.5  # 三脚の高さ (README の Data Collection Protocol)
+
+
+def horizon_profiles(x, y, height_tif, n_az=N_AZIMUTH, max_dist=MAX_DIST_M, antenna_h=ANTENNA_HEIGHT_M):
+    """
+    サイト座標 (EPSG:6677) -> 方位ビンごとの水平線仰角 [deg] (P, n_az)。
+    方位ビン k は方位角 [k*360/n_az, (k+1)*360/n_az) を表す。
+    """
+    tif = height_tif if isinstance(height_tif, GeoTiff) else GeoTiff(height_tif)
+    grid = tif.as_array()
+    step = min(tif.res_x, tif.res_y) / 2.0
+
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    y = np.atleast_1d(np.asarray(y, dtype=float))
+    az = np.radians((np.arange(n_az) + 0.5) * 360.0 / n_az)
+    # 自セルの建物は除外するため、1セル分離れたところから探索する
+    dist = np.arange(tif.res_x, max_dist + step, step)
+
+    px = x[:, None, None] + dist[None, None, :] * np.sin(az)[None, :, None]
+    py = y[:, None, None] + dist[None, None, :] * np.cos(az)[None, :, None]
+    row, col = tif.xy_to_rowcol(px, py)
+    inside = (row >= 0) & (row < tif.height) & (col >= 0) & (col < tif.width)
+
+    h = np.zeros(px.shape)
+    h[inside] = grid[row[inside], col[inside]]
+    if tif.nodata is not None:
+        h[h == tif.nodata] = 0.0
+    h = np.nan_to_num(h, nan=0.0)
+
+    elev = np.degrees(np.arctan2(h - antenna_h, dist[None, None, :]))
+    return np.clip(elev.max(axis=-1), 0.0, 90.0)
+
+
+def horizon_mask(az_deg, el_deg, profiles, min_el_deg=0.0):
+    """
+    方位角・仰角 (P, ..., n_sat) が水平線プロファイル (P, n_az) より上にあるか。
+    仰角マスク min_el_deg も同時に適用する。
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    n_az = profiles.shape[1]
+    k = (np.floor(np.asarray(az_deg) / (360.0 / n_az)).astype(np.int64)) % n_az
+    p = np.arange(profiles.shape[0]).reshape((-1,) + (1,) * (k.ndim - 1))
+    limit = np.maximum(profiles[p, k], min_el_deg)
+    return np.asarray(el_deg) >= limit
@@ -0,0 +1,206 @@
+"""
+パイプラインの段 (スクリプト) を入出力つきで宣言し、依存関係の順に実行する。
+
+  依存関係 : ある段の入力が別の段の出力 (またはその中のファイル) なら、その段のあとに実行する
+  キャッシュ: 入力ファイル・スクリプト・共通コードの内容ハッシュが前回と同じで、出力も前回のまま残っていれば省略
+  並列実行 : 依存関係の無い段は jobs 個まで同時にサブプロセスで実行する
+
+段が再実行されても出力の内容が変わらなければ、その下流の段は入力ハッシュが変わらないので省略される。
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+from pathlib import Path
+
+HASH_BLOCK = 1 << 20
+SKIP_DIRS = {'__pycache__', '.git'}
+
+
+def content_digest(path, cache=None):
+    """
+    ファイルまたはディレクトリ (中のファイル名と内容) の sha256。存在しなければ None。
+    cache (dict) を渡すと、サイズと更新時刻が前回と同じファイルは読み直さない。
+    """
+    path = Path(path)
+    if path.is_file():
+        st = path.stat()
+        stamp = [st.st_size, st.st_mtime_ns]
+        hit = cache.get(str(path)) if cache is not None else None
+        if hit and hit[:2] == stamp:
+            return hit[2]
+        h = hashlib.sha256()
+        with path.open('rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK), b''):
+                h.update(block)
+        if cache is not None:
+            cache[str(path)] = stamp + [h.hexdigest()]
+        return h.hexdigest()
+    if path.is_dir():
+        h = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+            for name in sorted(files):
+                p = Path(root) / name
+                h.update(str(p.relative_to(path)).encode())
+                h.update(content_digest(p, cache).encode())
+        return h.hexdigest()
+    return None
+
+
+class Stage:
+    def __init__(self, name, script, inputs=(), outputs=(), args=()):
+        self.name = name
+        self.script = Path(script)
+        self.inputs = [Path(p) for p in inputs]
+        self.outputs = [Path(p) for p in outputs]
+        self.args = [str(a) for a in args]
+
+
+def _inside(path, parent):
+    try:
+        path.relative_to(parent)
+        return True
+    except ValueError:
+        return False
+
+
+class Pipeline:
+    def __init__(self, stages, root, state_dir, code_paths=()):
+        self.stages = {s.name: s for s in stages}
+        if len(self.stages) != len(stages):
+            raise ValueError("Pipeline: duplicate stage name")
+        self.root = Path(root)
+        self.state_dir = Path(state_dir)
+        self.state_file = self.state_dir / 'state.json'
+        self.code_paths = [Path(p) for p in code_paths]
+        self.deps = {
+            s.name: sorted({o.name for o in stages if o is not s
+                            and any(_inside(i, out) or _inside(out, i) for i in s.inputs for out in o.outputs)})
+            for s in stages
+        }
+        self.order = self._toposort()
+        self.state = json.loads(self.state_file.read_text()) if self.state_file.exists() else {}
+        self.state.setdefault('stages', {})
+        self.files = self.state.setdefault('files', {})  # content_digest のキャッシュ
+
+    def _toposort(self):
+        order, mark = [], {}
+
+        def visit(name, path):
+            if mark.get(name) == 'done':
+                return
+            if mark.get(name) == 'visiting':
+                raise ValueError(f"Pipeline: dependency cycle: {' -> '.join(path + [name])}")
+            mark[name] = 'visiting'
+            for d in self.deps[name]:
+                visit(d, path + [name])
+            mark[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def select(self, targets=None):
+        """targets とその上流の段 (実行順)。None なら全段"""
+        if not targets:
+            return list(self.order)
+        unknown = [t for t in targets if t not in self.stages]
+        if unknown:
+            raise ValueError(f"Pipeline: unknown stage(s): {', '.join(unknown)}")
+        need, stack = set(), list(targets)
+        while stack:
+            n = stack.pop()
+            if n not in need:
+                need.add(n)
+                stack += self.deps[n]
+        return [n for n in self.order if n in need]
+
+    # ==========================================
+    # キャッシュ判定
+    # ==========================================
+    def input_hash(self, stage):
+        h = hashlib.sha256()
+        for p in [stage.script] + self.code_paths + stage.inputs:
+            h.update(str(p).encode())
+            h.update(str(content_digest(p, self.files)).encode())
+        h.update(json.dumps(stage.args).encode())
+        return h.hexdigest()
+
+    def is_fresh(self, stage, input_hash):
+        prev = self.state['stages'].get(stage.name)
+        if not prev or prev.get('input_hash') != input_hash:
+            return False
+        return all(content_digest(p, self.files) == prev['outputs'].get(str(p)) for p in stage.outputs)
+
+    def _save_state(self):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.state, indent=2))
+        tmp.replace(self.state_file)
+
+    # ==========================================
+    # 実行
+    # ==========================================
+    async def _run_stage(self, stage, input_hash, sem, log):
+        async with sem:
+            log(f"[run]    {stage.name}: {stage.script.relative_to(self.root)}")
+            t0 = time.perf_counter()
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+            with open(self.state_dir / f'{stage.name}.log', 'wb') as out:
+                proc = await asyncio.create_subprocess_exec(
+                    sys.executable, str(stage.script), *stage.args, cwd=str(self.root),
+                    stdout=out, stderr=asyncio.subprocess.STDOUT)
+                code = await proc.wait()
+            dt = time.perf_counter() - t0
+        missing = [str(p) for p in stage.outputs if not p.exists()]
+        if code != 0 or missing:
+            reason = f"exit code {code}" if code != 0 else f"missing output {missing[0]}"
+            log(f"[FAIL]   {stage.name} ({reason}, {dt:.1f}s) -> see {self.state_dir / (stage.name + '.log')}")
+            return 'failed'
+        self.state['stages'][stage.name] = {
+            'input_hash': input_hash,
+            'outputs': {str(p): content_digest(p, self.files) for p in stage.outputs},
+            'seconds': round(dt, 2),
+            'finished': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        self._save_state()
+        log(f"[done]   {stage.name} ({dt:.1f}s)")
+        return 'ran'
+
+    async def run(self, targets=None, jobs=4, force=False, dry_run=False, log=print):
+        """
+        段を依存関係の順に実行し、{段: 'ran' / 'cached' / 'failed' / 'blocked' / 'planned'} を返す。
+        dry_run では実行せず、キャッシュで省略されるかどうかだけを判定する (上流が再実行される段は 'planned')。
+        """
+        names = self.select(targets)
+        result = {}
+        sem = asyncio.Semaphore(max(1, jobs))
+        tasks = {}
+
+        async def process(name):
+            stage = self.stages[name]
+            dep_results = [await tasks[d] for d in self.deps[name] if d in tasks]
+            if any(r in ('failed', 'blocked') for r in dep_results):
+                log(f"[skip]   {name} (upstream failed)")
+                return 'blocked'
+            if dry_run and any(r == 'planned' for r in dep_results):
+                return 'planned'
+            h = await asyncio.to_thread(self.input_hash, stage)  # 大きなログのハッシュ中も他の段は進める
+            if not force and await asyncio.to_thread(self.is_fresh, stage, h):
+                log(f"[cached] {name}")
+                return 'cached'
+            if dry_run:
+                log(f"[plan]   {name}")
+                return 'planned'
+            return await self._run_stage(stage, h, sem, log)
+
+        for name in names:
+            tasks[name] = asyncio.ensure_future(process(name))
+        for name in names:
+            result[name] = await tasks[name]
+        self._save_state()
+        return result
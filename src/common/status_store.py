@@ -0,0 +1,147 @@
+"""
+Status レコードのコンパクトな列指向 (struct-of-arrays) 表現。
+
+  エポック     : 時刻 int64 と、観測配列への先頭位置 (offsets, 長さ n_epochs + 1)
+  衛星識別     : ConstellationType uint8 / Svid int16 / 周波数コード uint8 (周波数 Hz は別表)
+  観測値       : Cn0 / 方位角 / 仰角 float32
+  UsedInFix    : 1 観測 1 ビット (np.packbits)
+
+観測は時刻順に並べてあり、エポック i の観測は offsets[i]:offsets[i + 1] の連続区間 (O(1) で切り出せる)。
+1 観測あたり約 17 バイトで、文字列の DataFrame や Python のタプルのリストより 1 桁以上小さい。
+"""
+import numpy as np
+import pandas as pd
+
+from common.dop import batched_dop
+
+
+class StatusStore:
+    def __init__(self, times, offsets, constellation, svid, freq_code, freq_table, cn0, az, el, used_bits):
+        self.times = times              # (n_epochs,) int64  UnixTimeMillis
+        self.offsets = offsets          # (n_epochs + 1,) int64
+        self.constellation = constellation
+        self.svid = svid
+        self.freq_code = freq_code
+        self.freq_table = freq_table    # 周波数コード -> CarrierFrequencyHz (float64)
+        self.cn0 = cn0
+        self.az = az
+        self.el = el
+        self.used_bits = used_bits
+
+    # ==========================================
+    # 作成
+    # ==========================================
+    @classmethod
+    def from_frame(cls, df_status):
+        """read_log_tables の Status (数値列の DataFrame) から作る。時刻が無い行は捨てる"""
+        st = df_status.dropna(subset=['UnixTimeMillis']).sort_values('UnixTimeMillis', kind='stable')
+
+        def col(name, dtype, fill=np.nan):
+            if name not in st.columns:
+                return np.full(len(st), fill, dtype=dtype)
+            return st[name].fillna(fill).to_numpy(dtype)
+
+        t = col('UnixTimeMillis', np.int64, 0)
+        starts = np.flatnonzero(np.r_[True, t[1:] != t[:-1]]) if len(t) else np.zeros(0, dtype=np.int64)
+        freq = col('CarrierFrequencyHz', np.float64)
+        # 周波数は種類が少ないのでコード化 (NaN は最後のコード)
+        freq_table, freq_code = np.unique(freq, return_inverse=True)
+        used = col('UsedInFix', np.float64, 0) == 1
+
+        return cls(
+            times=t[starts],
+            offsets=np.r_[starts, len(t)].astype(np.int64),
+            constellation=col('ConstellationType', np.float64, 0).astype(np.uint8),
+            svid=col('Svid', np.float64, 0).astype(np.int16),
+            freq_code=freq_code.astype(np.uint8).ravel(),
+            freq_table=freq_table,
+            cn0=col('Cn0DbHz', np.float32),
+            az=col('AzimuthDegrees', np.float32),
+            el=col('ElevationDegrees', np.float32),
+            used_bits=np.packbits(used),
+        )
+
+    @classmethod
+    def from_log(cls, filepath):
+        """ログ -> StatusStore (ヘッダが無い場合は read_log_tables と同じく ValueError)"""
+        from common.gnss_log import read_log_tables
+        return cls.from_frame(read_log_tables(filepath)[1])
+
+    # ==========================================
+    # 参照
+    # ==========================================
+    def __len__(self):
+        return len(self.cn0)
+
+    @property
+    def n_epochs(self):
+        return len(self.times)
+
+    @property
+    def counts(self):
+        """エポックごとの観測数"""
+        return np.diff(self.offsets)
+
+    @property
+    def epoch_of(self):
+        """観測ごとのエポック番号"""
+        return np.repeat(np.arange(self.n_epochs), self.counts)
+
+    @property
+    def used(self):
+        return np.unpackbits(self.used_bits, count=len(self)).view(bool)
+
+    @property
+    def carrier_hz(self):
+        return self.freq_table[self.freq_code]
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.times, self.offsets, self.constellation, self.svid, self.freq_code,
+                                      self.freq_table, self.cn0, self.az, self.el, self.used_bits))
+
+    def epoch(self, i):
+        """エポック i の観測の区間 (slice)"""
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def select(self, mask):
+        """観測を mask で絞った StatusStore (エポックの並びは保つので、観測 0 件のエポックも残る)"""
+        mask = np.asarray(mask, dtype=bool)
+        kept = np.r_[0, np.cumsum(mask)]
+        return StatusStore(
+            self.times, kept[self.offsets].astype(np.int64),
+            self.constellation[mask], self.svid[mask], self.freq_code[mask], self.freq_table,
+            self.cn0[mask], self.az[mask], self.el[mask], np.packbits(self.used[mask]),
+        )
+
+    # ==========================================
+    # エポック単位の集計
+    # ==========================================
+    def per_epoch_sum(self, values):
+        """観測ごとの値 (bool 可) -> エポックごとの合計"""
+        return np.bincount(self.epoch_of, np.asarray(values, dtype=float), self.n_epochs)
+
+    def padded(self, values, fill=np.nan):
+        """観測ごとの値 -> (n_epochs, 最大観測数) の配列 (空きは fill)"""
+        counts = self.counts
+        out = np.full((self.n_epochs, counts.max() if self.n_epochs else 0), fill, dtype=float)
+        ep = self.epoch_of
+        out[ep, np.arange(len(self)) - self.offsets[ep]] = values
+        return out
+
+    def dop(self, min_el=None, mask=None):
+        """全エポックの DOP を batched_dop でまとめて計算する (min_el 未満・mask=False の衛星は使わない)"""
+        use = np.ones(len(self), dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+        if min_el is not None:
+            use = use & (self.el >= min_el)
+        if self.n_epochs == 0:
+            return {k: np.zeros(0) for k in ('hdop', 'vdop', 'pdop', 'gdop', 'n_sats')}
+        return batched_dop(self.padded(self.az), self.padded(self.el), self.padded(use, fill=0) > 0)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'UnixTimeMillis': np.repeat(self.times, self.counts),
+            'ConstellationType': self.constellation, 'Svid': self.svid, 'CarrierFrequencyHz': self.carrier_hz,
+            'Cn0DbHz': self.cn0, 'AzimuthDegrees': self.az, 'ElevationDegrees': self.el,
+            'UsedInFix': self.used.astype(np.int8),
+        })
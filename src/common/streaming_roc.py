@@ -0,0 +1,168 @@
+"""
+チャンク単位で ROC / AUC を累積する (データ量に依存しない一定メモリ)。
+
+スコアを [lo, hi] の細かいビンに分け、ビンごとの正例・負例の件数だけを保持する。
+AUC はビン内の正例・負例の組を「同点 (0.5)」として数えた Mann-Whitney 統計量で、
+真の AUC との差は 0.5 × (値の幅を持つビン内の正負ペア数) / (P × N) 以下になる。
+スコアが離散値 (各ビンの値が1種類) なら誤差 0 で、sklearn の roc_curve + auc と一致する。
+"""
+from pathlib import Path
+
+import numpy as np
+
+N_BINS = 1 << 16        # ビン数 (メモリは約 4 × 8 × N_BINS バイト)
+CHUNK_ROWS = 1 << 20    # 1チャンクの行数
+
+
+class StreamingROC:
+    def __init__(self, lo, hi, n_bins=N_BINS):
+        self.lo, self.hi, self.n_bins = float(lo), float(hi), int(n_bins)
+        self.pos = np.zeros(self.n_bins, dtype=np.int64)
+        self.neg = np.zeros(self.n_bins, dtype=np.int64)
+        # ビン内のスコアの最小・最大 (ビン内が同一値かどうかの判定用)
+        self.bin_min = np.full(self.n_bins, np.inf)
+        self.bin_max = np.full(self.n_bins, -np.inf)
+
+    def _bin(self, s):
+        if self.hi <= self.lo:
+            return np.zeros(len(s), dtype=np.int64)
+        idx = np.floor((s - self.lo) * (self.n_bins / (self.hi - self.lo))).astype(np.int64)
+        return np.clip(idx, 0, self.n_bins - 1)
+
+    def update(self, scores, labels):
+        """scores (float) と labels (0/1) のチャンクを加える。NaN は除外"""
+        s = np.asarray(scores, dtype=float)
+        y = np.asarray(labels, dtype=float)
+        ok = ~(np.isnan(s) | np.isnan(y))
+        s, y = s[ok], y[ok] == 1
+        b = self._bin(s)
+        self.pos += np.bincount(b[y], minlength=self.n_bins)
+        self.neg += np.bincount(b[~y], minlength=self.n_bins)
+        np.minimum.at(self.bin_min, b, s)
+        np.maximum.at(self.bin_max, b, s)
+        return self
+
+    def merge(self, other):
+        if (self.lo, self.hi, self.n_bins) != (other.lo, other.hi, other.n_bins):
+            raise ValueError("StreamingROC.merge: bin layout differs")
+        self.pos += other.pos
+        self.neg += other.neg
+        np.minimum(self.bin_min, other.bin_min, out=self.bin_min)
+        np.maximum(self.bin_max, other.bin_max, out=self.bin_max)
+        return self
+
+    @property
+    def n_pos(self):
+        return int(self.pos.sum())
+
+    @property
+    def n_neg(self):
+        return int(self.neg.sum())
+
+    def curve(self):
+        """(fpr, tpr, thresholds)。しきい値は高い順 (sklearn.metrics.roc_curve と同じ向き)"""
+        keep = (self.pos + self.neg) > 0
+        pos, neg = self.pos[keep][::-1], self.neg[keep][::-1]
+        tpr = np.r_[0.0, np.cumsum(pos) / max(self.n_pos, 1)]
+        fpr = np.r_[0.0, np.cumsum(neg) / max(self.n_neg, 1)]
+        thresholds = np.r_[np.inf, self.bin_min[keep][::-1]]
+        return fpr, tpr, thresholds
+
+    def auc(self):
+        """(AUC, 誤差の上限)。片方のクラスしか無ければ (NaN, NaN)"""
+        n_pairs = self.n_pos * self.n_neg
+        if n_pairs == 0:
+            return np.nan, np.nan
+        neg_below = np.cumsum(self.neg) - self.neg
+        score = (self.pos * (neg_below + 0.5 * self.neg)).sum() / n_pairs
+        spread = self.bin_max > self.bin_min
+        bound = 0.5 * (self.pos * self.neg)[spread].sum() / n_pairs
+        return float(score), float(bound)
+
+
+class StreamingHistogram:
+    """ラベル作成用の分位点を求めるための固定ビンのヒストグラム"""
+
+    def __init__(self, lo, hi, n_bins=N_BINS):
+        self.lo, self.hi, self.n_bins = float(lo), float(hi), int(n_bins)
+        self.counts = np.zeros(self.n_bins, dtype=np.int64)
+
+    def update(self, values):
+        v = np.asarray(values, dtype=float)
+        v = v[~np.isnan(v)]
+        if self.hi <= self.lo:
+            self.counts[0] += len(v)
+            return self
+        idx = np.clip(((v - self.lo) * (self.n_bins / (self.hi - self.lo))).astype(np.int64), 0, self.n_bins - 1)
+        self.counts += np.bincount(idx, minlength=self.n_bins)
+        return self
+
+    def quantile(self, q):
+        """分位点 (誤差はビン幅以下)"""
+        cum = np.cumsum(self.counts)
+        k = int(np.searchsorted(cum, q * cum[-1], side='left'))
+        return self.lo + (k + 0.5) * (self.hi - self.lo) / self.n_bins
+
+
+def exact_quantile(source, column, q, hist, chunk_rows=CHUNK_ROWS):
+    """
+    pandas.Series.quantile (線形補間) と同じ分位点を求める。
+    ヒストグラムで対象の順位を含むビンを特定し、そのビンの値だけを追加の1パスで集めて並べ替える。
+    値が1つも無ければ (全て NaN) pandas と同じく NaN を返す。
+    """
+    n = int(hist.counts.sum())
+    if n == 0:
+        return float('nan')
+    h = (n - 1) * q
+    ranks = [int(np.floor(h)), int(np.ceil(h))]
+    cum = np.cumsum(hist.counts)
+    bins = sorted({int(np.searchsorted(cum, r, side='right')) for r in ranks})
+    first = bins[0]
+    below = int(cum[first - 1]) if first > 0 else 0   # 対象ビンより下の件数
+
+    picked = []
+    for chunk in iter_column_chunks(source, [column], chunk_rows):
+        v = np.asarray(chunk[column], dtype=float)
+        v = v[~np.isnan(v)]
+        idx = np.clip(((v - hist.lo) * (hist.n_bins / (hist.hi - hist.lo))).astype(np.int64), 0, hist.n_bins - 1) \
+            if hist.hi > hist.lo else np.zeros(len(v), dtype=np.int64)
+        picked.append(v[(idx >= bins[0]) & (idx <= bins[-1])])
+    vals = np.sort(np.concatenate(picked))
+    v0, v1 = vals[ranks[0] - below], vals[ranks[1] - below]
+    return float(v0 + (h - ranks[0]) * (v1 - v0))
+
+
+# ==========================================
+# チャンク読み込み (Parquet / .npy の memmap)
+# ==========================================
+def iter_column_chunks(source, columns, chunk_rows=CHUNK_ROWS):
+    """
+    source が .parquet なら row group を memory_map で順に読み、
+    ディレクトリなら <列名>.npy を mmap_mode='r' で開いてチャンクに切り出す。
+    {列名: ndarray} を yield する。
+    """
+    source = Path(source)
+    if source.suffix == '.parquet':
+        import pyarrow.parquet as pq
+        pf = pq.ParquetFile(source, memory_map=True)
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=list(columns)):
+            yield {c: batch.column(c).to_numpy(zero_copy_only=False) for c in columns}
+        return
+
+    arrays = {c: np.load(source / f'{c}.npy', mmap_mode='r') for c in columns}
+    n = len(next(iter(arrays.values())))
+    for i in range(0, n, chunk_rows):
+        yield {c: np.asarray(a[i:i + chunk_rows], dtype=float) for c, a in arrays.items()}
+
+
+def column_ranges(source, columns, chunk_rows=CHUNK_ROWS):
+    """1パス目: 各列の (min, max)"""
+    lo = {c: np.inf for c in columns}
+    hi = {c: -np.inf for c in columns}
+    for chunk in iter_column_chunks(source, columns, chunk_rows):
+        for c in columns:
+            v = np.asarray(chunk[c], dtype=float)
+            if np.isfinite(v).any():
+                lo[c] = min(lo[c], float(np.nanmin(v)))
+                hi[c] = max(hi[c], float(np.nanmax(v)))
+    return {c: (lo[c], hi[c]) for c in columns}
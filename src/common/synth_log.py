@@ -0,0 +1,148 @@
+"""
+GNSS Logger (v3.0.0.1) 形式の合成ログ。実測ログ (45 サイト) は非公開なので、ベンチマークや動作確認に使う。
+
+  衛星 : コンステレーションに順番に割り当て、方位角・仰角はゆっくり動く軌跡 (仰角 > 0 の衛星だけ記録)
+  信号 : L1 帯 + (dual_freq なら) L5 帯。GLONASS は FDMA の L1 のみ
+  Cn0  : 仰角とともに上がる LoS の値 + ノイズ。信号ごとに NLoS 区間 (Cn0 が下がり UsedInFix=0) を2状態のマルコフ連鎖で入れる
+  Fix  : 基準点のまわりの AR(1) の誤差 (水平 err_m 程度)
+
+同じ seed なら同じファイルになる。.gz / .xz で終わるパスは圧縮して書く。
+"""
+import gzip
+import lzma
+
+import numpy as np
+
+# 2026-01-10 (実測の初日) の昼頃
+T0_MS = 1768012345000
+
+DEFAULT_CONSTELLATIONS = (1, 3, 4, 5, 6)  # GPS, GLONASS, QZSS, BeiDou, Galileo
+CONSTELLATION_CODES = {'GPS': 1, 'SBAS': 2, 'GLONASS': 3, 'QZSS': 4, 'BEIDOU': 5, 'GALILEO': 6, 'IRNSS': 7}
+
+# ConstellationType -> (L1 帯, L5 帯) の CarrierFrequencyHz (L5 帯の無いものは1つ)
+CARRIERS = {
+    1: (1575.42e6, 1176.45e6),
+    2: (1575.42e6,),
+    3: (1602.0e6,),
+    4: (1575.42e6, 1176.45e6),
+    5: (1561.098e6, 1176.45e6),
+    6: (1575.42e6, 1176.45e6),
+    7: (1176.45e6,),
+}
+
+HEADER = [
+    "# ",
+    "# Header Description:",
+    "# Version: v3.0.0.1 Platform: 14 Manufacturer: Google Model: Pixel 8",
+    "# ",
+    "# Fix,Provider,LatitudeDegrees,LongitudeDegrees,AltitudeMeters,SpeedMps,AccuracyMeters,BearingDegrees,"
+    "UnixTimeMillis,SpeedAccuracyMps,BearingAccuracyDegrees,elapsedRealtimeNanos,VerticalAccuracyMeters,"
+    "MockLocation,NumberOfUsedSignals,VerticalAccuracyMeters,SolutionType",
+    "# Status,UnixTimeMillis,SignalCount,SignalIndex,ConstellationType,Svid,CarrierFrequencyHz,Cn0DbHz,"
+    "AzimuthDegrees,ElevationDegrees,UsedInFix,HasAlmanacData,HasEphemerisData,BasebandCn0DbHz",
+    "# ",
+]
+
+WRITE_EPOCHS = 1000         # この数のエポックごとにまとめて書き込む
+M_PER_DEG_LAT = 111320.0
+
+
+def _open_write(path):
+    path = str(path)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', compresslevel=6)
+    if path.endswith('.xz'):
+        return lzma.open(path, 'wt')
+    return open(path, 'w')
+
+
+def _signals(n_sats, constellations, dual_freq, rng):
+    """衛星・信号の表 (信号ごとの constellation, svid, 周波数, 衛星番号)"""
+    const = np.array([constellations[i % len(constellations)] for i in range(n_sats)])
+    svid = np.zeros(n_sats, dtype=int)
+    for c in np.unique(const):
+        sel = const == c
+        svid[sel] = rng.permutation(np.arange(1, 64))[:sel.sum()]
+
+    rows = []
+    for i in range(n_sats):
+        bands = CARRIERS.get(int(const[i]), (1575.42e6,))
+        if const[i] == 3:
+            bands = (bands[0] + (svid[i] % 14 - 7) * 0.5625e6,)  # GLONASS の周波数チャネル
+        for f in (bands if dual_freq else bands[:1]):
+            rows.append((const[i], svid[i], f, i))
+    return np.array(rows)
+
+
+def write_synthetic_log(path, duration_s=330.0, rate_hz=1.0, n_sats=24, constellations=DEFAULT_CONSTELLATIONS,
+                        dual_freq=True, seed=0, lat0=35.6595, lon0=139.7005, err_m=3.0,
+                        nlos_rate=0.15, t0_ms=T0_MS):
+    """
+    合成ログを path に書く。戻り値は {'n_epochs', 'n_status', 'n_signals'}。
+    nlos_rate: NLoS 状態にある信号の割合の目安 (0 なら全て LoS)
+    """
+    rng = np.random.default_rng(seed)
+    n_epochs = int(round(duration_s * rate_hz))
+    dt = 1.0 / rate_hz
+
+    sig = _signals(n_sats, tuple(constellations), dual_freq, rng)
+    sig_const, sig_svid, sig_freq = sig[:, 0].astype(int), sig[:, 1].astype(int), sig[:, 2]
+    sat = sig[:, 3].astype(int)
+    n_sig = len(sig)
+
+    # 衛星の軌跡: 仰角は約 6 時間周期の山形、方位角は一定速度で回る
+    el_peak = rng.uniform(20, 88, n_sats)
+    phase = rng.uniform(0, 1, n_sats)
+    az0 = rng.uniform(0, 360, n_sats)
+    az_rate = rng.uniform(-0.01, 0.01, n_sats)  # deg/s
+    pass_s = 6 * 3600.0
+    band_offset = np.where(sig_freq < 1.3e9, -3.0, 0.0)  # L5 帯は L1 帯より Cn0 が少し低い
+
+    # NLoS 区間 (2状態マルコフ連鎖: 平均滞在 p_exit^-1 エポック)
+    p_exit = 0.05
+    p_enter = p_exit * nlos_rate / max(1.0 - nlos_rate, 1e-9)
+    nlos = rng.random(n_sig) < nlos_rate
+
+    # Fix の誤差 (AR(1)、定常状態の標準偏差が err_m / sqrt(2) 程度になる係数)
+    rho = 0.98
+    en = rng.normal(0, err_m / np.sqrt(2), 2)
+    m_per_deg_lon = M_PER_DEG_LAT * np.cos(np.radians(lat0))
+
+    n_status = 0
+    with _open_write(path) as f:
+        f.write("\n".join(HEADER) + "\n")
+        buf = []
+        for k in range(n_epochs):
+            t_s = k * dt
+            t_ms = t0_ms + int(round(t_s * 1000))
+            el_sat = el_peak * np.sin(np.pi * (phase + t_s / pass_s)) - 5.0
+            az_sat = (az0 + az_rate * t_s) % 360
+
+            flip = rng.random(n_sig) < np.where(nlos, p_exit, p_enter)
+            nlos ^= flip
+            el = el_sat[sat]
+            vis = np.flatnonzero(el > 0)
+            el_v = el[vis]
+            nl = nlos[vis]
+            cn0 = (22.0 + 22.0 * np.sin(np.radians(el_v)) + band_offset[vis]
+                   + rng.normal(0, 2.0, len(vis)) - np.where(nl, rng.uniform(8, 15, len(vis)), 0.0))
+            used = (el_v > 10) & ~nl & (rng.random(len(vis)) < 0.9)
+
+            n_vis = len(vis)
+            for i, (j, c, e, u) in enumerate(zip(vis.tolist(), cn0.tolist(), el_v.tolist(), used.tolist())):
+                buf.append(f"Status,{t_ms + 7},{n_vis},{i},{sig_const[j]},{sig_svid[j]},{sig_freq[j]:.0f},"
+                           f"{c:.2f},{az_sat[sat[j]]:.3f},{e:.3f},{int(u)},1,1,{c - 2:.2f}\n")
+            n_status += n_vis
+
+            en = rho * en + rng.normal(0, err_m / np.sqrt(2) * np.sqrt(1 - rho ** 2), 2)
+            lat = lat0 + en[1] / M_PER_DEG_LAT
+            lon = lon0 + en[0] / m_per_deg_lon
+            buf.append(f"Fix,GPS,{lat:.8f},{lon:.8f},40.0,0.0,{err_m * rng.uniform(0.8, 1.5):.1f},0.0,{t_ms},"
+                       f"0.1,0.0,{int(t_s * 1e9)},5.0,0,{int(used.sum())},5.0,\n")
+
+            if (k + 1) % WRITE_EPOCHS == 0:
+                f.writelines(buf)
+                buf.clear()
+        f.writelines(buf)
+
+    return {'n_epochs': n_epochs, 'n_status': n_status, 'n_signals': n_sig}
@@ -0,0 +1,226 @@
+"""
+処理済みラスタ (EPSG:6677) から Web メルカトルの XYZ タイル (PNG / WebP) を作る。
+
+  タイルの画素 : 画素中心を 17×17 の制御点だけ pyproj で EPSG:6677 に変換し、間は双線形補間する
+                 (タイル内では投影の歪みが滑らかなので、誤差は 5 m セルに比べて無視できる)
+  読み込み     : タイルが参照するセルの範囲だけを GeoTiff.read_window で読む (memmap のため、その部分のページだけ読まれる)
+  差分更新     : タイルごとに参照した値 (最近傍で取り出したセル値) のハッシュを manifest.json に記録し、
+                 前回と同じタイルは色付け・エンコード・書き込みを省く
+
+レイヤ (TILE_LAYERS) は使うラスタ (DEFAULT_LAYERS の名前) と色の付け方を持つ。
+risk_class は risk_query_server と同じく、NoData の所を risk_proxy のしきい値で補う (fill_risk_class)。
+"""
+import io
+import os
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from common.geo import get_transformer, PROJ_EPSG
+from common.raster import GeoTiff
+from common.risk_class import fill_risk_class
+
+TILE_PX = 256
+CONTROL_STEP = 16           # 制御点の間隔 (画素)。TILE_PX の約数
+EARTH_RADIUS_M = 6378137.0
+ORIGIN_SHIFT_M = np.pi * EARTH_RADIUS_M
+WEB_MERCATOR_EPSG = "epsg:3857"
+
+# レイヤ名 -> 使うラスタと色
+#   class : 値 (1/2/3) ごとの RGBA
+#   ramp  : range の範囲を stops の色で線形補間 (range が None ならラスタの 1〜99 パーセンタイル)
+TILE_LAYERS = {
+    "risk_class": {
+        "rasters": ["risk_class", "risk_proxy"],
+        "style": "class",
+        "colors": {1: (26, 152, 80, 170), 2: (253, 174, 97, 190), 3: (215, 48, 39, 210)},
+    },
+    "risk_proxy": {
+        "rasters": ["risk_proxy"],
+        "style": "ramp",
+        "range": (0.0, 1.0),
+        "stops": [(26, 152, 80, 150), (254, 224, 139, 180), (215, 48, 39, 210)],
+    },
+    "overhead_score": {
+        "rasters": ["overhead_score"],
+        "style": "ramp",
+        "range": None,
+        "stops": [(158, 188, 218, 0), (140, 107, 177, 170), (110, 1, 107, 220)],
+    },
+}
+
+
+# ==========================================
+# タイル番号と座標
+# ==========================================
+def lonlat_to_tile(lon, lat, z):
+    """経度・緯度 -> ズーム z のタイル番号 (x, y) (浮動小数)"""
+    n = 2 ** z
+    lat = np.radians(np.clip(lat, -85.05112878, 85.05112878))
+    tx = (np.asarray(lon, dtype=float) + 180.0) / 360.0 * n
+    ty = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0 * n
+    return tx, ty
+
+
+def raster_lonlat_bounds(tif, n_edge=16):
+    """ラスタの範囲 (縁の点を変換) -> (経度最小, 緯度最小, 経度最大, 緯度最大)"""
+    t = np.linspace(0.0, 1.0, n_edge)
+    x0, x1 = tif.x0, tif.x0 + tif.width * tif.res_x
+    y1, y0 = tif.y0, tif.y0 - tif.height * tif.res_y
+    xs = np.concatenate([x0 + t * (x1 - x0), np.full(n_edge, x1), x1 - t * (x1 - x0), np.full(n_edge, x0)])
+    ys = np.concatenate([np.full(n_edge, y0), y0 + t * (y1 - y0), np.full(n_edge, y1), y1 - t * (y1 - y0)])
+    lon, lat = get_transformer(PROJ_EPSG, "epsg:4326").transform(xs, ys)
+    return float(np.min(lon)), float(np.min(lat)), float(np.max(lon)), float(np.max(lat))
+
+
+def tiles_in_bounds(bounds, zooms):
+    """(経度最小, 緯度最小, 経度最大, 緯度最大) に掛かるタイル [(z, x, y), ...]"""
+    lon0, lat0, lon1, lat1 = bounds
+    tiles = []
+    for z in zooms:
+        x0, y0 = lonlat_to_tile(lon0, lat1, z)
+        x1, y1 = lonlat_to_tile(lon1, lat0, z)
+        for x in range(int(np.floor(x0)), int(np.floor(x1)) + 1):
+            for y in range(int(np.floor(y0)), int(np.floor(y1)) + 1):
+                tiles.append((z, x, y))
+    return tiles
+
+
+def tile_pixel_xy(z, x, y):
+    """タイルの画素中心の EPSG:6677 座標 ((TILE_PX, TILE_PX) の x, y)。制御点だけ変換して補間する"""
+    size = 2.0 * ORIGIN_SHIFT_M / 2 ** z
+    res = size / TILE_PX
+    left, top = -ORIGIN_SHIFT_M + x * size, ORIGIN_SHIFT_M - y * size
+    ctrl = np.arange(0, TILE_PX + 1, CONTROL_STEP, dtype=float)
+    cx, cy = np.meshgrid(left + ctrl * res, top - ctrl * res)
+    px, py = get_transformer(WEB_MERCATOR_EPSG, PROJ_EPSG).transform(cx, cy)
+
+    # 制御点の間を双線形補間 (画素中心は制御点の間の (k + 0.5) / CONTROL_STEP の位置)
+    pos = (np.arange(TILE_PX) + 0.5) / CONTROL_STEP
+    i0 = np.minimum(pos.astype(int), len(ctrl) - 2)
+    f = pos - i0
+    def interp(grid):
+        rows = grid[i0] * (1 - f)[:, None] + grid[i0 + 1] * f[:, None]
+        return rows[:, i0] * (1 - f)[None, :] + rows[:, i0 + 1] * f[None, :]
+    return interp(np.asarray(px)), interp(np.asarray(py))
+
+
+# ==========================================
+# 値の取り出しと色付け
+# ==========================================
+def sample_window(tif, x, y):
+    """座標の配列 -> 最近傍のセル値 (範囲外・NoData は NaN)。参照する範囲だけを読む"""
+    row, col = tif.xy_to_rowcol(x, y)
+    inside = (row >= 0) & (row < tif.height) & (col >= 0) & (col < tif.width)
+    out = np.full(x.shape, np.nan, dtype=np.float32)
+    if not inside.any():
+        return out
+    r, c = row[inside], col[inside]
+    r0, c0 = int(r.min()), int(c.min())
+    window = tif.read_window(r0, int(r.max()) + 1, c0, int(c.max()) + 1)
+    vals = window[r - r0, c - c0].astype(np.float32)
+    if tif.nodata is not None and not np.isnan(tif.nodata):
+        vals[vals == tif.nodata] = np.nan
+    out[inside] = vals
+    return out
+
+
+def layer_values(spec, rasters, x, y):
+    """レイヤの値 ((TILE_PX, TILE_PX)、欠損は NaN)。rasters: {ラスタ名: GeoTiff} (無いラスタは入れない)"""
+    values = {name: sample_window(rasters[name], x, y) if name in rasters else np.full(x.shape, np.nan)
+              for name in spec["rasters"]}
+    if spec["style"] == "class":
+        return fill_risk_class(values)["risk_class"].astype(np.float32)
+    return values[spec["rasters"][0]]
+
+
+def colorize(spec, values, value_range=None):
+    """値 -> (TILE_PX, TILE_PX, 4) の RGBA (欠損は透明)"""
+    rgba = np.zeros(values.shape + (4,), dtype=np.uint8)
+    if spec["style"] == "class":
+        for cls, color in spec["colors"].items():
+            rgba[values == cls] = color
+        return rgba
+    lo, hi = value_range
+    stops = np.asarray(spec["stops"], dtype=float)
+    t = np.clip((values - lo) / max(hi - lo, 1e-12), 0.0, 1.0)
+    at = np.linspace(0.0, 1.0, len(stops))
+    ok = ~np.isnan(values)
+    for ch in range(4):
+        rgba[..., ch][ok] = np.round(np.interp(t[ok], at, stops[:, ch])).astype(np.uint8)
+    return rgba
+
+
+def encode(rgba, fmt):
+    """RGBA -> PNG / WebP のバイト列 (Pillow)"""
+    from PIL import Image
+    buf = io.BytesIO()
+    img = Image.fromarray(rgba, "RGBA")
+    if fmt == "webp":
+        img.save(buf, format="WEBP", lossless=True)
+    else:
+        img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def values_digest(values):
+    """タイルの値のハッシュ (差分更新の判定用)。全て欠損なら '' (タイルを書かない)"""
+    missing = np.isnan(values)
+    if missing.all():
+        return ""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(missing.tobytes())
+    h.update(np.where(missing, 0.0, values).astype(np.float32).tobytes())
+    return h.hexdigest()
+
+
+def tile_path(out_dir, z, x, y, fmt):
+    return Path(out_dir) / str(z) / str(x) / f"{y}.{fmt}"
+
+
+# ==========================================
+# タイルの書き出し (プロセスごとに実行)
+# ==========================================
+_OPEN = {}
+
+
+def _open_rasters(paths):
+    """{ラスタ名: パス} -> {ラスタ名: GeoTiff} (プロセス内で開いたものを使い回す)"""
+    out = {}
+    for name, path in paths.items():
+        key = (str(path), os.stat(path).st_mtime_ns)
+        if key not in _OPEN:
+            _OPEN[key] = GeoTiff(path)
+        out[name] = _OPEN[key]
+    return out
+
+
+def render_tiles(layer, raster_paths, tiles, old_digests, out_dir, fmt, value_range):
+    """
+    tiles の各タイルについて値を取り出し、前回 (old_digests) から変わったものだけ書き出す。
+    戻り値は ({'z/x/y': ハッシュ}, 書いた数, 消した数)。全て欠損のタイルはファイルを作らない (あれば消す)。
+    """
+    spec = TILE_LAYERS[layer]
+    rasters = _open_rasters(raster_paths)
+    digests, written, removed = {}, 0, 0
+    for z, x, y in tiles:
+        key = f"{z}/{x}/{y}"
+        px, py = tile_pixel_xy(z, x, y)
+        values = layer_values(spec, rasters, px, py)
+        digest = values_digest(values)
+        digests[key] = digest
+        path = tile_path(out_dir, z, x, y, fmt)
+        if digest == old_digests.get(key) and (digest == "" or path.exists()):
+            continue
+        if digest == "":
+            if path.exists():
+                path.unlink()
+                removed += 1
+            continue
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_bytes(encode(colorize(spec, values, value_range), fmt))
+        os.replace(tmp, path)
+        written += 1
+    return digests, written, removed
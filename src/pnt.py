@@ -0,0 +1,170 @@
+"""
+Phase 1/2/3 と現場ツールをまとめて呼ぶ入口。
+
+  python src/pnt.py <サブコマンド> [引数...]
+  python src/pnt.py phase1
+  python src/pnt.py bootstrap
+  python src/pnt.py qc data/raw/logs
+
+このファイルは標準ライブラリだけを読み込む。numpy / pandas / sklearn などは、それを使う
+サブコマンドの中で初めて読み込む (--help や qc は数十 ms で起動する)。
+スクリプトのサブコマンドは、そのスクリプトを __main__ として実行する (引数はそのまま渡す)。
+"""
+import sys
+from pathlib import Path
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+SRC = PROJECT_ROOT / 'src'
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+
+# common.gnss_log.LOG_SUFFIXES と同じ (gnss_log は pandas を読み込むので qc では使わない)
+LOG_SUFFIXES = ('.txt', '.txt.gz', '.txt.xz', '.txt.zst')
+
+# サブコマンド -> (スクリプト, 説明)
+SCRIPTS = {
+    # Phase 1
+    'phase1':          ('01_baseline_phase1/run_baseline.py', "Phase 1: サイトごとの誤差・DOP・ROC"),
+    'epoch-dataset':   ('01_baseline_phase1/build_epoch_dataset.py', "エポック単位の表 (Parquet)"),
+    'streaming-error': ('01_baseline_phase1/streaming_error_stats.py', "長時間ログの誤差分位点 (スケッチ)"),
+    'rolling':         ('01_baseline_phase1/rolling_metrics.py', "時間窓ごとの指標"),
+    # Phase 2
+    'dop-sim':         ('02_proposed_phase2/step2_1_dop_sim.py', "Step 2-1: 仰角マスクごとの HDOP"),
+    'evaluate':        ('02_proposed_phase2/step2_2_evaluate_methods.py', "Step 2-2: リスク指標の評価"),
+    'dop-predict':     ('02_proposed_phase2/step2_3_dop_predict.py', "Step 2-3: アルマナックからの DOP 予測"),
+    'constellation':   ('02_proposed_phase2/step2_4_constellation_breakdown.py', "Step 2-4: コンステレーション別の内訳"),
+    # Phase 3
+    'bootstrap':       ('03_statistical_validation/run_bootstrap_test.py', "Phase 3: ブートストラップ検定"),
+    'fusion':          ('03_statistical_validation/run_fusion_cv.py', "Phase 3: 指標を組み合わせたスコアの交差検証"),
+    'final-roc':       ('03_statistical_validation/generate_final_roc_curves.py', "Phase 3: ROC 曲線の図"),
+    'streaming-roc':   ('03_statistical_validation/streaming_roc_auc.py', "大きな表の ROC/AUC (省メモリ)"),
+    # パイプライン・ツール
+    'pipeline':        ('run_pipeline.py', "Phase 1 -> 2 -> 3 (キャッシュ付き)"),
+    'figures':         ('render_figures.py', "計算済みの曲線 (figures.json) から図を描く"),
+    'live-tail':       ('04_field_tools/live_tail.py', "記録中のログの追跡と QC"),
+    'risk-server':     ('04_field_tools/risk_query_server.py', "リスク照会の HTTP サービス"),
+    'tiles':           ('04_field_tools/export_tiles.py', "リスクラスタの XYZ タイル書き出し"),
+    'synth-logs':      ('benchmarks/make_synthetic_logs.py', "合成ログの作成"),
+    'bench':           ('benchmarks/run_benchmarks.py', "ベンチマーク"),
+}
+
+
+# ==========================================
+# 軽いサブコマンド (このファイルの中で処理する)
+# ==========================================
+def cmd_qc(argv):
+    """ログ (またはフォルダ) の QC をバイト列の走査だけで判定する"""
+    import argparse
+    from common.qc_prescan import QC_MIN_EPOCHS, QC_MIN_DURATION, prescan_log, prescan_failure
+
+    parser = argparse.ArgumentParser(prog='pnt.py qc', description=cmd_qc.__doc__)
+    parser.add_argument('paths', nargs='*', type=Path, default=[LOG_DIR])
+    parser.add_argument('--min-epochs', type=int, default=QC_MIN_EPOCHS)
+    parser.add_argument('--min-duration', type=float, default=QC_MIN_DURATION)
+    args = parser.parse_args(argv)
+
+    files = []
+    for p in args.paths:
+        if p.is_dir():
+            files.extend(sorted(f for f in p.iterdir() if f.is_file() and f.name.endswith(LOG_SUFFIXES)))
+        else:
+            files.append(p)
+    n_fail = 0
+    for fp in files:
+        scan = prescan_log(fp)
+        if scan is None:
+            print(f"{fp.name}: compressed, needs full parse")
+            continue
+        reason = prescan_failure(scan, args.min_epochs, args.min_duration)
+        n_fail += reason is not None
+        print(f"{fp.name}: {'FAIL (' + reason + ')' if reason else 'PASS'}  "
+              f"fix={scan['n_fix']} duration={scan['duration']}")
+    return 1 if n_fail else 0
+
+
+def cmd_auc(argv):
+    """CSV の1列をスコアとして AUC を計算する (ラベル列、または誤差列の上位分位を陽性とする)"""
+    import csv
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='pnt.py auc', description=cmd_auc.__doc__)
+    parser.add_argument('csv', type=Path)
+    parser.add_argument('--score', required=True, nargs='+', help="スコアの列 (複数可)")
+    parser.add_argument('--label', default=None, help="0/1 のラベル列")
+    parser.add_argument('--target', default='err_p95_m', help="--label が無いときに使う誤差の列")
+    parser.add_argument('--quantile', type=float, default=0.70, help="誤差がこの分位以上のサイトを陽性とする (パイプラインと同じ)")
+    args = parser.parse_args(argv)
+
+    import numpy as np
+    from common.auc_stats import auc_score
+
+    with open(args.csv, newline='') as f:
+        rows = list(csv.DictReader(f))
+
+    def column(name):
+        if rows and name not in rows[0]:
+            parser.error(f"column not found: {name}")
+        return np.array([float(r[name]) if r[name] not in ('', 'nan', 'NaN') else np.nan for r in rows])
+
+    if args.label:
+        y = column(args.label)
+    else:
+        err = column(args.target)
+        y = np.where(np.isnan(err), np.nan, err >= np.nanquantile(err, args.quantile))
+    for name in args.score:
+        s = column(name)
+        ok = ~np.isnan(s) & ~np.isnan(y)
+        print(f"{name:<24} AUC = {auc_score(y[ok], s[ok]):.4f}  (n={int(ok.sum())})")
+    return 0
+
+
+BUILTINS = {
+    'qc':  (cmd_qc, "ログの QC 判定 (全体をパースしない)"),
+    'auc': (cmd_auc, "CSV の列の AUC"),
+}
+
+
+def usage():
+    lines = ["usage: python src/pnt.py <command> [args...]", "", "commands:"]
+    for name, (_, desc) in {**SCRIPTS, **BUILTINS}.items():
+        lines.append(f"  {name:<16} {desc}")
+    lines.append("\n各コマンドの引数は `python src/pnt.py <command> --help`")
+    return "\n".join(lines)
+
+
+def run_script(rel_path, argv):
+    """スクリプトを __main__ として実行する (argv[0] はスクリプトのパス)"""
+    import runpy
+    path = SRC / rel_path
+    sys.argv = [str(path), *argv]
+    try:
+        runpy.run_path(str(path), run_name='__main__')
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help', 'help', 'list'):
+        print(usage())
+        return 0
+    cmd, rest = argv[0], argv[1:]
+    if cmd in BUILTINS:
+        return BUILTINS[cmd][0](rest)
+    if cmd in SCRIPTS:
+        return run_script(SCRIPTS[cmd][0], rest)
+    print(f"unknown command: {cmd}\n\n{usage()}", file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
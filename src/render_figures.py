@@ -0,0 +1,51 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.figures import SPEC_FILE, render_specs
+
+OUT = PROJECT_ROOT / 'experiments' / 'analysis_output'
+
+# 引数を省略したときに描く図 (各段が書いた計算済みの曲線)
+DEFAULT_SPECS = [
+    OUT / 'phase1_baseline' / 'latest' / 'plots' / SPEC_FILE,
+    OUT / 'phase3_validation' / 'figures_roc.json',
+    OUT / 'phase3_streaming_roc' / 'plots' / SPEC_FILE,
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="各段が書いた figures.json の図をまとめて並列に描く (Agg)")
+    parser.add_argument('specs', nargs='*', type=Path, help="figures.json のパス。省略時は既定の段の出力 (無いものは飛ばす)")
+    parser.add_argument('--workers', type=int, default=None, help="描画に使うプロセス数 (既定: CPU コア数)")
+    args = parser.parse_args()
+
+    specs = args.specs or [p for p in DEFAULT_SPECS if p.exists()]
+    missing = [p for p in specs if not p.exists()]
+    if missing:
+        print(f"Error: {missing[0]} not found.")
+        sys.exit(1)
+    if not specs:
+        print("No figure specs found. Run the pipeline stages first.")
+        return
+
+    t0 = time.perf_counter()
+    done = render_specs(specs, args.workers)
+    for path, seconds in done:
+        print(f"  {seconds:5.2f}s  {path}")
+    print(f"\nRendered {len(done)} figures from {len(specs)} spec files in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import sys
+import asyncio
+import argparse
+from pathlib import Path
+
+# ==========================================
+# 設定
+# ==========================================
+# 1. このスクリプトの場所 (src/)
+CURRENT_DIR = Path(__file__).resolve().parent
+
+# 2. プロジェクトのルートディレクトリを特定 (src -> Root)
+PROJECT_ROOT = CURRENT_DIR.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.stages import Stage, Pipeline
+
+SRC = PROJECT_ROOT / 'src'
+LOG_DIR = PROJECT_ROOT / 'data' / 'raw' / 'logs'
+SITE_RISK_FILE = PROJECT_ROOT / 'data' / 'processed' / 'sites_risk.csv'
+OUT = PROJECT_ROOT / 'experiments' / 'analysis_output'
+
+# 実行状態 (入出力ハッシュ) と各段のログの置き場
+STATE_DIR = OUT / '.pipeline'
+
+# 図の仕様 (計算済みの曲線)。figures 段がまとめて描く
+PHASE1_FIGURES = OUT / 'phase1_baseline' / 'latest' / 'plots' / 'figures.json'
+PHASE3_FIGURES = OUT / 'phase3_validation' / 'figures_roc.json'
+
+# すべての段の入力ハッシュに含める共通コード (変更されたら全段やり直し)
+CODE_PATHS = [SRC / 'common']
+
+# ==========================================
+# 段の定義 (入力が他の段の出力なら、その段のあとに実行される)
+# ==========================================
+STAGES = [
+    # 段の間の受け渡しは .arrow (common.artifacts)。.csv は確認用の出力
+    # 図は各段では描かず (--no-figures、曲線を figures.json に書くだけ)、figures 段でまとめて描く
+    Stage('phase1', SRC / '01_baseline_phase1' / 'run_baseline.py',
+          inputs=[LOG_DIR, SITE_RISK_FILE],
+          outputs=[OUT / 'phase1_baseline' / 'latest' / 'merged.arrow',
+                   OUT / 'phase1_baseline' / 'latest' / 'merged.csv',
+                   OUT / 'phase1_baseline' / 'latest' / 'site_metrics_raw.arrow',
+                   OUT / 'phase1_baseline' / 'latest' / 'roc_auc.txt',
+                   PHASE1_FIGURES],
+          args=['--no-figures']),
+    Stage('phase2_dop', SRC / '02_proposed_phase2' / 'step2_1_dop_sim.py',
+          inputs=[LOG_DIR],
+          outputs=[OUT / 'phase2_dop' / 'week3_dop_results.arrow',
+                   OUT / 'phase2_dop' / 'week3_dop_results.csv']),
+    Stage('phase2_evaluate', SRC / '02_proposed_phase2' / 'step2_2_evaluate_methods.py',
+          inputs=[SITE_RISK_FILE,
+                  OUT / 'phase1_baseline' / 'latest' / 'merged.arrow',
+                  OUT / 'phase2_dop' / 'week3_dop_results.arrow'],
+          outputs=[OUT / 'phase2_evaluate' / 'merged_analysis2_final.arrow',
+                   OUT / 'phase2_evaluate' / 'merged_analysis2_final.csv',
+                   OUT / 'phase2_evaluate' / 'final_results.txt']),
+    Stage('phase3_bootstrap', SRC / '03_statistical_validation' / 'run_bootstrap_test.py',
+          inputs=[OUT / 'phase2_evaluate' / 'merged_analysis2_final.arrow'],
+          outputs=[OUT / 'phase3_validation' / 'bootstrap_results.csv',
+                   OUT / 'phase3_validation' / 'permutation_results.csv']),
+    Stage('phase3_roc', SRC / '03_statistical_validation' / 'generate_final_roc_curves.py',
+          inputs=[OUT / 'phase2_evaluate' / 'merged_analysis2_final.arrow'],
+          outputs=[PHASE3_FIGURES],
+          args=['--no-figures']),
+    Stage('figures', SRC / 'render_figures.py',
+          inputs=[PHASE1_FIGURES, PHASE3_FIGURES],
+          outputs=[OUT / 'phase1_baseline' / 'latest' / 'plots' / 'roc_curves.png',
+                   OUT / 'phase3_validation' / 'roc_comparison_final.png'],
+          args=[PHASE1_FIGURES, PHASE3_FIGURES]),
+
+    # 以下は --stages で指定したときだけ実行 (オプション)
+    Stage('constellation', SRC / '02_proposed_phase2' / 'step2_4_constellation_breakdown.py',
+          inputs=[LOG_DIR],
+          outputs=[OUT / 'phase2_constellation' / 'constellation_signal_stats.csv',
+                   OUT / 'phase2_constellation' / 'subset_dop.csv',
+                   OUT / 'phase2_constellation' / 'subset_hdop_wide.csv']),
+    Stage('epoch_dataset', SRC / '01_baseline_phase1' / 'build_epoch_dataset.py',
+          inputs=[LOG_DIR, SITE_RISK_FILE],
+          outputs=[OUT / 'phase1_baseline' / 'epoch_dataset.parquet']),
+    Stage('streaming_roc', SRC / '03_statistical_validation' / 'streaming_roc_auc.py',
+          inputs=[OUT / 'phase1_baseline' / 'epoch_dataset.parquet'],
+          outputs=[OUT / 'phase3_streaming_roc' / 'roc_auc_streaming.json']),
+    Stage('phase3_fusion', SRC / '03_statistical_validation' / 'run_fusion_cv.py',
+          inputs=[OUT / 'phase2_evaluate' / 'merged_analysis2_final.arrow'],
+          outputs=[OUT / 'phase3_validation' / 'fusion_cv_results.csv',
+                   OUT / 'phase3_validation' / 'fusion_coefficients.csv']),
+]
+
+# 段を指定しないときに実行する段 (論文の Phase 1 -> 2 -> 3)
+DEFAULT_STAGES = ['phase1', 'phase2_dop', 'phase2_evaluate', 'phase3_bootstrap', 'phase3_roc', 'figures']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Phase 1/2/3 を依存関係の順に実行 (変更の無い段は省略)")
+    parser.add_argument('--stages', nargs='+', default=None,
+                        help=f"実行する段 (上流も含めて実行)。'all' で全段。既定: {' '.join(DEFAULT_STAGES)}")
+    parser.add_argument('--jobs', type=int, default=4, help="同時に実行する段の数")
+    parser.add_argument('--force', action='store_true', help="キャッシュを無視して、実行対象の段 (上流を含む) をすべて実行")
+    parser.add_argument('--dry-run', action='store_true', help="実行せず、実行される段だけを表示")
+    parser.add_argument('--list', action='store_true', help="段と依存関係を表示")
+    parser.add_argument('--no-figures', action='store_true', help="figures 段 (図の描画) を実行しない")
+    args = parser.parse_args()
+
+    pipeline = Pipeline(STAGES, PROJECT_ROOT, STATE_DIR, code_paths=CODE_PATHS)
+
+    if args.list:
+        for name in pipeline.order:
+            stage = pipeline.stages[name]
+            deps = ', '.join(pipeline.deps[name]) or '-'
+            print(f"{name:<18} {str(stage.script.relative_to(PROJECT_ROOT)):<60} after: {deps}")
+        return
+
+    targets = DEFAULT_STAGES if args.stages is None else (None if args.stages == ['all'] else args.stages)
+    if args.no_figures:
+        targets = [n for n in (targets or pipeline.order) if n != 'figures']
+    try:
+        result = asyncio.run(pipeline.run(targets, jobs=args.jobs, force=args.force, dry_run=args.dry_run))
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+
+    counts = {}
+    for status in result.values():
+        counts[status] = counts.get(status, 0) + 1
+    print("\n" + ', '.join(f"{k}: {v}" for k, v in counts.items()))
+    if any(s in ('failed', 'blocked') for s in result.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
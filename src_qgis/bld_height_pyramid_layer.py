@@ -0,0 +1,118 @@
+exec(r"""
+import os
+import sys
+import processing
+from osgeo import gdal
+from qgis.core import QgsProject, QgsRasterLayer
+
+# ===== 設定（レイヤ名は今のプロジェクトに合わせて） =====
+SRC_BUILDING_LAYER_NAME = "bld_2d"   # 元の建物（EPSG:6668）
+AOI_LAYER_NAME          = "aoi"      # 元の AOI（EPSG:6677）
+HEIGHT_FIELD            = "measuredHeight"
+BASE_RES_M              = 1.0        # 1度だけラスタ化する解像度
+LEVELS_M                = (1.0, 3.0, 5.0, 10.0)   # ファイルに入れる解像度（BASE_RES_M の整数倍）
+POOL_METHOD             = "max"      # 粗い解像度のまとめ方（max: セル内の最も高い建物 / mean）
+
+# 1. 現在のプロジェクトフォルダ（.../data_qgis/raw）から2階層上がってルートディレクトリを特定
+current_dir = QgsProject.instance().homePath()
+root_dir = os.path.abspath(os.path.join(current_dir, "../../"))
+
+# 2. ピラミッドの計算・書き込みは src/common/height_pyramid.py を使う
+sys.path.insert(0, os.path.join(root_dir, "src"))
+from common.height_pyramid import PYRAMID_FILE, NODATA, aligned_extent, build_levels, write_pyramid
+
+# 3. ルート配下の experiments/qgis_output に出力
+output_dir = os.path.join(root_dir, "experiments", "qgis_output")
+os.makedirs(output_dir, exist_ok=True)
+OUTPUT_PATH = os.path.join(output_dir, PYRAMID_FILE)
+BASE_PATH = os.path.join(output_dir, "bld_height_base.tmp.tif")   # 1 m のラスタ化結果（作業用）
+
+print(f"Project Location: {current_dir}")
+print(f"Output will be saved to: {OUTPUT_PATH}")
+# ========================================================
+
+proj = QgsProject.instance()
+
+def get_layer(name):
+    lst = proj.mapLayersByName(name)
+    if not lst:
+        raise RuntimeError(f"レイヤ '{name}' が見つかりません")
+    return lst[0]
+
+try:
+    # --- レイヤ取得 ---
+    bld_src = get_layer(SRC_BUILDING_LAYER_NAME)
+    aoi = get_layer(AOI_LAYER_NAME)
+
+    print("▶ 元建物レイヤ:", bld_src.name(), bld_src.crs().authid())
+    print("▶ AOIレイヤ   :", aoi.name(), aoi.crs().authid())
+
+    # --- 建物レイヤを AOI の CRS に再投影 ---
+    if bld_src.crs() != aoi.crs():
+        print("▶ 建物レイヤを AOI の CRS に再投影します...")
+        bld = processing.run(
+            "native:reprojectlayer",
+            {"INPUT": bld_src, "TARGET_CRS": aoi.crs(), "OUTPUT": "memory:bld_2d_6677"}
+        )["OUTPUT"]
+    else:
+        print("▶ 既に同じ CRS なので、そのまま使います")
+        bld = bld_src
+
+    # --- AOI の範囲を全解像度の最小公倍数の格子にそろえる（どの解像度のセルも 1 m のセルをちょうど含む） ---
+    ext = aoi.extent()
+    xmin, ymin, xmax, ymax, cols, rows = aligned_extent(
+        ext.xMinimum(), ext.yMinimum(), ext.xMaximum(), ext.yMaximum(), LEVELS_M, BASE_RES_M)
+    extent_str = f"{xmin},{xmax},{ymin},{ymax} [{aoi.crs().authid()}]"
+    print("▶ AOI:", f"{ext.xMinimum():.2f},{ext.xMaximum():.2f},{ext.yMinimum():.2f},{ext.yMaximum():.2f}")
+    print("▶ 格子にそろえた範囲:", extent_str)
+    print(f"▶ ピクセル数: {cols} 列 × {rows} 行 （解像度={BASE_RES_M}m）")
+
+    # --- 最も細かい解像度で1度だけラスタ化 ---
+    params = {
+        "INPUT": bld,
+        "FIELD": HEIGHT_FIELD,
+        "BURN": 0,
+        "USE_Z": False,
+        "UNITS": 0,           # 0 = ピクセル数指定（範囲が解像度で割り切れるので、セルはちょうど BASE_RES_M）
+        "WIDTH": cols,
+        "HEIGHT": rows,
+        "EXTENT": extent_str,
+        "NODATA": NODATA,
+        "DATA_TYPE": 5,       # Float32
+        "INIT": None,
+        "INVERT": False,
+        "OPTIONS": "",
+        "EXTRA": "",
+        "OUTPUT": BASE_PATH,
+    }
+    print("▶ ラスタ化を実行中...")
+    base_path = processing.run("gdal:rasterize", params)["OUTPUT"]
+    ds = gdal.Open(base_path)
+    grid = ds.GetRasterBand(1).ReadAsArray()
+    ds = None
+    os.remove(base_path)
+
+    # --- 粗い解像度を作って1ファイルに書き込む ---
+    print(f"▶ {POOL_METHOD} でまとめて各解像度を作成中: {', '.join(f'{r:g}m' for r in LEVELS_M)}")
+    levels = build_levels(grid, LEVELS_M, BASE_RES_M, POOL_METHOD, NODATA)
+    write_pyramid(OUTPUT_PATH, levels, xmin, ymax, NODATA, aoi.crs().postgisSrid(), POOL_METHOD)
+
+    # --- 既存の同名ラスタを削除して、解像度ごとにレイヤとして追加（GDAL のページ指定 GTIFF_DIR:n:パス） ---
+    for page, (res, _) in enumerate(levels, start=1):
+        name = f"bld_height_{res:g}m"
+        for lid, lyr in list(proj.mapLayers().items()):
+            if lyr.name() == name and isinstance(lyr, QgsRasterLayer):
+                proj.removeMapLayer(lid)
+        rast = QgsRasterLayer(f"GTIFF_DIR:{page}:{OUTPUT_PATH}", name)
+        if rast.isValid():
+            proj.addMapLayer(rast)
+            print(f"   {name}: {rast.width()} × {rast.height()}")
+        else:
+            print(f"⚠ {name} のページを開けませんでした")
+
+    print("✅ 完了: 建物高さピラミッドを作成しました")
+    print("   パス:", OUTPUT_PATH)
+
+except Exception as e:
+    print("❌ エラーが発生しました:", e)
+""")
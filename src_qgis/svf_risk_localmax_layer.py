@@ -18,7 +18,10 @@ height_layer = layers[0]
 
 # 元ファイルのパスとフォルダ
 height_path = height_layer.dataProvider().dataSourceUri().split('|')[0]
-base_dir = os.path.dirname(height_path)
+height_file = height_path
+if height_file.startswith("GTIFF_DIR:"):   # bld_height_pyramid.tif のページ (GTIFF_DIR:n:パス)
+    height_file = height_file.split(":", 2)[2]   # 出力先フォルダを決めるためだけに外す (入力はページ指定のまま)
+base_dir = os.path.dirname(height_file)
 
 print(f"▶ 使用建物高さラスタ: {height_path}")
 print(f"▶ CRS: {height_layer.crs().authid()}")
@@ -40,7 +43,7 @@ localmax_path = os.path.join(base_dir, "bld_height_5m_localmax.tif")
 
 print("[*] GRASS r.neighbors で局所最大高さを計算中...")
 params_neighbors = {
-    "input": height_path,
+    "input": height_layer,   # ファイルパスではなくレイヤを渡す (ピラミッドのページ指定を保つ)
     "selection": None,
     "method": 6,      # 6 = maximum
     "size": kernel_size,
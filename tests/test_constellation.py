@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.constellation import subset_dop
+from common.dop import batched_dop
+from common.status_store import StatusStore
+from common.synth_log import write_synthetic_log
+
+
+def _subset_dop(tmp_path, dual_freq):
+    path = tmp_path / f"S01_dual{int(dual_freq)}.txt"
+    write_synthetic_log(path, dual_freq=dual_freq, seed=3)
+    return subset_dop(StatusStore.from_log(path)).set_index('subset')
+
+
+def test_subset_dop_counts_satellites_not_signals(tmp_path):
+    single = _subset_dop(tmp_path, dual_freq=False)
+    dual = _subset_dop(tmp_path, dual_freq=True)
+    np.testing.assert_allclose(dual['n_sats_mean'], single['n_sats_mean'])
+    np.testing.assert_allclose(dual['hdop_median'], single['hdop_median'], equal_nan=True)
+
+
+def test_batched_dop_rejects_duplicated_geometry():
+    # 3 機の視線を2回ずつ並べると衛星数の条件は通るが、幾何は特異
+    az = np.array([[10.0, 130.0, 250.0] * 2])
+    el = np.array([[30.0, 50.0, 70.0] * 2])
+    assert np.isnan(batched_dop(az, el)['hdop'][0])
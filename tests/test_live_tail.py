@@ -0,0 +1,58 @@
+import sys
+import importlib.util
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / 'src'))
+
+from common.geo import get_transformer
+from common.synth_log import write_synthetic_log
+
+_spec = importlib.util.spec_from_file_location('live_tail', PROJECT_ROOT / 'src' / '04_field_tools' / 'live_tail.py')
+live_tail = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(live_tail)
+
+
+def _follow(path, skip_lines):
+    """skip_lines 行目までを既存の内容として --from-end で追い始め、残りを追記として読ませる"""
+    data = path.read_bytes()
+    lines = data.split(b"\n")
+    head = b"\n".join(lines[:skip_lines]) + b"\n"
+    path.write_bytes(head)
+    state = live_tail.SiteState("S01", path)
+    state.skip_to_end()
+    assert state.offset == len(head)
+
+    path.write_bytes(data)
+    appended, state.offset, _ = live_tail.read_appended(path, state.offset)
+    state.feed(appended, get_transformer())
+    state.flush_epoch()
+    return state, data[len(head):]
+
+
+def test_from_end_reads_header(tmp_path):
+    path = tmp_path / "S01_gnss_log.txt"
+    write_synthetic_log(path, duration_s=300.0, n_sats=12, seed=1)
+
+    state, tail = _follow(path, 200)
+
+    assert state.fix_idx and state.status_idx
+    assert state.n_fix == sum(1 for line in tail.split(b"\n") if line.startswith(b"Fix"))
+    assert state.n_fix > 0 and state.n_status_epochs > 0
+    assert state.qc_failure() != "Parse Error: Missing Header"
+
+
+def test_from_end_matches_full_read_after_header(tmp_path):
+    path = tmp_path / "S01_gnss_log.txt"
+    write_synthetic_log(path, duration_s=300.0, n_sats=12, seed=2)
+    full = live_tail.SiteState("S01", path)
+    full.feed(path.read_bytes(), get_transformer())
+    full.flush_epoch()
+
+    # コメント行の直後から追い始めれば、先頭から読んだのと同じ件数になる
+    n_header = next(i for i, line in enumerate(path.read_bytes().split(b"\n")) if not line.startswith(b"#"))
+    state, _ = _follow(path, n_header)
+
+    assert state.n_fix == full.n_fix
+    assert state.n_status_epochs == full.n_status_epochs
+    assert state.qc_failure() is None